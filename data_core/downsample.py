@@ -0,0 +1,68 @@
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: índices de n_out puntos que preservan la
+    forma visual de la serie (picos y valles) para graficar en la App.
+
+    Args:
+        x, y: serie (x creciente: tiempo en ns o número de trade).
+        n_out: presupuesto de puntos (>= 3).
+
+    Returns:
+        np.ndarray de índices ordenados (incluye primero y último).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets entre el primer y el último punto
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], max(edges[b + 1], edges[b] + 1)
+        # Promedio del bucket siguiente (el último usa el punto final)
+        nlo = edges[b + 1]
+        nhi = edges[b + 2] if b + 2 < len(edges) else n
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        idx[b + 1] = a
+    return idx
+
+
+def ohlc_buckets(opens, highs, lows, closes, n_out):
+    """
+    Re-muestreo OHLC: agrupa velas consecutivas en <= n_out barras
+    (open del primero, high máx., low mín., close del último).
+
+    Returns:
+        (starts, open, high, low, close): starts son los índices de la primera
+        vela de cada barra (para tomar su tiempo). Sin reducción si n <= n_out.
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    n = len(highs)
+    if n == 0:
+        empty = np.empty(0)
+        return np.empty(0, dtype=np.int64), empty, empty, empty, empty
+
+    step = max(1, -(-n // max(int(n_out), 1)))  # ceil(n / n_out)
+    starts = np.arange(0, n, step, dtype=np.int64)
+    ends = np.append(starts[1:], n) - 1
+    return (
+        starts,
+        np.asarray(opens, dtype=np.float64)[starts],
+        np.maximum.reduceat(highs, starts),
+        np.minimum.reduceat(lows, starts),
+        np.asarray(closes, dtype=np.float64)[ends],
+    )
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FRAMES_DIR = os.path.join(ROOT, "data_core", "datasets", ".frames")
+
+# Código que define las columnas de indicadores: parte de la huella del frame
+# y de toda clave aguas abajo (etapas del pipeline, checkpoint del backtester)
+INDICATOR_CODE = ["data_core/indicators.py", "data_core/liquidity.py", "data_core/session_calendar.py"]
+
+# Adaptador único de columnas (Infraestructura -> Lógica)
+NQ_COLUMNS = {
+    "nq_open": "open",
+    "nq_high": "high",
+    "nq_low": "low",
+    "nq_close": "close",
+    "nq_vol": "volume",
+}
+
+
+class ContentHasher:
+    """
+    SHA-256 de archivos con índice (ruta, tamaño, mtime) -> hash:
+    un CSV de varios GB solo se re-hashea si cambió en disco.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.index = {}
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, "r") as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                self.index = {}
+
+    def file_hash(self, path):
+        abspath = os.path.abspath(path)
+        st = os.stat(abspath)
+        cached = self.index.get(abspath)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+
+        h = hashlib.sha256()
+        with open(abspath, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.index[abspath] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def code_hash(self, paths):
+        return hashlib.sha256(
+            "".join(self.file_hash(os.path.join(ROOT, p)) for p in paths).encode()
+        ).hexdigest()
+
+    def save(self):
+        # Escritura atómica: varios procesos pueden compartir el índice
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+
+def load_sync_csv(path):
+    """Lee un SYNC_DATA_*.csv y normaliza las columnas del NQ a open/high/low/close"""
+    df = pd.read_csv(path, index_col="time", parse_dates=True)
+    df.rename(columns=NQ_COLUMNS, inplace=True)
+    return df
+
+
+# --- ALMACÉN COLUMNAR (.npy por columna, memory-mapped) ---
+def save_frame(df, path):
+    """Guarda un DataFrame numérico como columnas .npy + meta.json (escritura atómica)"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+
+    idx = df.index
+    tz = str(idx.tz) if getattr(idx, "tz", None) is not None else None
+    if tz is not None:
+        idx = idx.tz_convert("UTC").tz_localize(None)
+    np.save(os.path.join(tmp, "__index__.npy"), idx.values.astype("datetime64[ns]").astype(np.int64))
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        values = df[col].to_numpy()
+        if values.dtype == object:
+            values = values.astype(np.float64)
+        np.save(os.path.join(tmp, f"c{i}.npy"), np.ascontiguousarray(values))
+        columns.append(col)
+
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"columns": columns, "tz": tz, "rows": len(df)}, f)
+
+    if os.path.exists(path):
+        # Otro proceso ganó la carrera: el contenido es idéntico (misma clave)
+        shutil.rmtree(tmp, ignore_errors=True)
+    else:
+        os.replace(tmp, path)
+
+
+def open_frame_arrays(path):
+    """
+    Abre un frame guardado como dict {columna: np.memmap} + '__index__' (epoch ns UTC).
+    No copia nada a memoria: ideal para consumidores que solo leen columnas.
+    """
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    arrays = {"__index__": np.load(os.path.join(path, "__index__.npy"), mmap_mode="r")}
+    for i, col in enumerate(meta["columns"]):
+        arrays[col] = np.load(os.path.join(path, f"c{i}.npy"), mmap_mode="r")
+    arrays["__meta__"] = meta
+    return arrays
+
+
+def load_frame(path, columns=None, rows=None):
+    """
+    Reconstruye el DataFrame (índice tz-aware igual al original).
+    rows=(inicio, fin) copia solo ese tramo de filas (lectura por bloques).
+    """
+    arrays = open_frame_arrays(path)
+    meta = arrays["__meta__"]
+    window = slice(*rows) if rows else slice(None)
+    index = pd.DatetimeIndex(
+        np.asarray(arrays["__index__"][window]).astype("datetime64[ns]"), name="time"
+    )
+    if meta["tz"] is not None:
+        index = index.tz_localize("UTC").tz_convert(meta["tz"])
+    cols = columns or meta["columns"]
+    return pd.DataFrame({c: np.array(arrays[c][window]) for c in cols}, index=index)
+
+
+# --- CACHE DE FRAMES DE INDICADORES ---
+_lock = threading.Lock()
+
+
+def indicator_fingerprint(csv_path, indicators=None, cache_root=FRAMES_DIR):
+    """Huella = contenido del CSV + parámetros de indicadores + versión del código"""
+    from data_core.indicators import Indicators
+
+    indicators = indicators or Indicators()
+    hasher = ContentHasher(os.path.join(cache_root, "hash_index.json"))
+    payload = {
+        "data": hasher.file_hash(csv_path),
+        "params": indicators.params(),
+        "code": hasher.code_hash(INDICATOR_CODE),
+    }
+    hasher.save()
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def ensure_indicator_frame(csv_path, cache_root=FRAMES_DIR, indicators=None):
+    """
+    Devuelve la ruta del frame de indicadores del CSV, calculándolo solo si no existe.
+    Todos los consumidores (backtester, dataset, labeler, demo) leen estas columnas.
+    """
+    from data_core.indicators import Indicators
+
+    indicators = indicators or Indicators()
+    key = indicator_fingerprint(csv_path, indicators, cache_root)
+    path = os.path.join(cache_root, key)
+
+    with _lock:
+        if os.path.exists(os.path.join(path, "meta.json")):
+            return path
+
+        print(f"⚙️ Calculando frame de indicadores (cache {key})...")
+        df = indicators.add_all_features(load_sync_csv(csv_path))
+        save_frame(df, path)
+        return path
+
+
+def get_indicator_frame(csv_path, cache_root=FRAMES_DIR, columns=None):
+    """DataFrame con OHLC + indicadores, desde la cache compartida"""
+    return load_frame(ensure_indicator_frame(csv_path, cache_root), columns)
+
+
+def get_indicator_arrays(csv_path, cache_root=FRAMES_DIR):
+    """Columnas memory-mapped desde la cache compartida (sin copiar a RAM)"""
+    return open_frame_arrays(ensure_indicator_frame(csv_path, cache_root))
+
+
+# --- CALENDARIO DE SESIÓN (uno por dataset, junto a su frame) ---
+def ensure_calendar(frame_dir):
+    """
+    SessionCalendar del frame (hora NY, días, midnight open), memory-mapped.
+    Se calcula una sola vez por frame: la huella del frame ya cubre los datos,
+    DATA_TZ y la zona de sesión.
+    """
+    from data_core.session_calendar import SessionCalendar
+
+    cal_dir = os.path.join(frame_dir, "calendar")
+    with _lock:
+        if not os.path.exists(os.path.join(cal_dir, "meta.json")):
+            calendar = SessionCalendar.from_utc_ns(np.asarray(open_frame_arrays(frame_dir)["__index__"]))
+            tmp = f"{cal_dir}.{os.getpid()}.tmp"
+            os.makedirs(tmp, exist_ok=True)
+            for name in SessionCalendar.FIELDS:
+                np.save(os.path.join(tmp, f"{name}.npy"), calendar.arrays[name])
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"session_tz": calendar.session_tz, "rows": len(calendar)}, f)
+            if os.path.exists(cal_dir):
+                shutil.rmtree(tmp, ignore_errors=True)
+            else:
+                os.replace(tmp, cal_dir)
+
+    with open(os.path.join(cal_dir, "meta.json"), "r") as f:
+        meta = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(cal_dir, f"{name}.npy"), mmap_mode="r") for name in SessionCalendar.FIELDS
+    }
+    return SessionCalendar(arrays, meta["session_tz"])
+
+
+def get_indicator_calendar(csv_path, cache_root=FRAMES_DIR):
+    """Calendario de sesión alineado con get_indicator_frame / get_indicator_arrays"""
+    return ensure_calendar(ensure_indicator_frame(csv_path, cache_root))
@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+from data_core.indicators import Indicators
+from data_core.liquidity import POOL_COLUMNS, LiquidityPoolIndex
+from data_core.session_calendar import DATA_TZ, SessionCalendar, localize_index
+
+
+class IndicatorStream:
+    """
+    Frame de indicadores de una ventana móvil de velas en vivo, actualizado solo
+    con las velas nuevas (la última fila es la vela en formación):
+    - La primera ventana (o una que no encaja con la anterior: hueco, velas
+      cerradas revisadas) se calcula completa con Indicators.add_all_features.
+    - Luego, por tick: EMA/ATR siguen su recursión desde el último valor,
+      fractales y liquidez proyectada se rehacen en la cola (window // 2 filas
+      provisionales), midnight open sigue el día NY y los pools avanzan un
+      LiquidityPoolIndex persistente (la vela en formación se evalúa en una copia).
+    Las filas cerradas ya calculadas no se tocan: el costo por tick depende de
+    las velas nuevas, no del largo de la ventana. Determinista: el replay
+    (live_replay.py) reconstruye exactamente los mismos frames con la misma
+    secuencia de velas.
+    """
+
+    MIN_ROWS = 50  # Igual que add_all_features: con menos no hay indicadores
+
+    def __init__(self, indicators: Indicators = None, data_tz: str = DATA_TZ):
+        self.indicators = indicators or Indicators()
+        self.data_tz = data_tz
+        p = self.indicators.params()
+        self.atr_length = p["atr_length"]
+        self.window = p["fractal_window"]
+        self.lag = self.window // 2
+        self.ema_lengths = p["ema_lengths"]
+        self.reset()
+
+    def reset(self):
+        self.raw = None  # Última ventana de velas recibida
+        self.frame = None  # Su frame de indicadores
+        self._pools = None  # Índice de pools tras la última vela CERRADA
+        self._bar0 = 0  # Barra absoluta de la fila 0 (numeración del índice de pools)
+        self.full_updates = 0
+        self.incremental_updates = 0
+
+    # --- ENTRADA ---
+    def update(self, raw: pd.DataFrame) -> pd.DataFrame:
+        """Frame de indicadores de 'raw' (no se modifica). Reutiliza lo ya calculado."""
+        if raw is None or len(raw) < self.MIN_ROWS:
+            self.reset()
+            return raw
+        raw = raw.set_axis(localize_index(raw.index, self.data_tz), axis=0)
+        shift = self._overlap(raw)
+        if shift is None:
+            frame = self._full(raw)
+        else:
+            frame = self._extend(raw, shift)
+        self.raw, self.frame = raw, frame
+        return frame
+
+    def _overlap(self, raw):
+        """
+        Filas que la ventana nueva descartó al frente, si encaja con la anterior:
+        mismas columnas y mismas velas cerradas (solo cambian la cola y la vela
+        en formación). None = recalcular completo.
+        """
+        old = self.raw
+        if old is None or list(old.columns) != list(raw.columns):
+            return None
+        shift = int(old.index.searchsorted(raw.index[0]))
+        closed = len(old) - 1 - shift  # Velas cerradas de la ventana vieja que siguen
+        if shift >= len(old) or old.index[shift] != raw.index[0] or closed < 2 * self.window:
+            return None
+        if len(raw) <= closed or not raw.index[:closed].equals(old.index[shift : shift + closed]):
+            return None
+        for col in ("open", "high", "low", "close"):
+            if not np.array_equal(raw[col].to_numpy()[:closed], old[col].to_numpy()[shift : shift + closed]):
+                return None
+        # Sin semilla de EMA/ATR todavía: la ventana aún es corta, recalcular completo
+        last = self.frame.iloc[len(old) - 2]
+        if any(pd.isna(last[col]) for col in (self._atr_col, *(f"ema_{n}" for n in self.ema_lengths))):
+            return None
+        return shift
+
+    @property
+    def _atr_col(self):
+        return f"ATRr_{self.atr_length}"
+
+    # --- VENTANA COMPLETA ---
+    def _full(self, raw):
+        frame = self.indicators.add_all_features(raw.copy())
+        # Índice de pools con las velas cerradas (los swings que confirman son definitivos)
+        closed = len(frame) - 1
+        high = frame["high"].to_numpy(dtype=float)
+        low = frame["low"].to_numpy(dtype=float)
+        swing_high = frame["is_swing_high"].to_numpy(dtype=bool)
+        swing_low = frame["is_swing_low"].to_numpy(dtype=bool)
+        self._pools = LiquidityPoolIndex(self.indicators.pool_max_age)
+        self._bar0 = 0
+        for t in range(closed):
+            j = t - self.lag
+            self._pools.step(
+                t,
+                high[t],
+                low[t],
+                high[j] if j >= 0 and swing_high[j] else None,
+                low[j] if j >= 0 and swing_low[j] else None,
+            )
+        self.full_updates += 1
+        return frame
+
+    # --- EXTENSIÓN INCREMENTAL ---
+    def _extend(self, raw, shift):
+        old = self.frame
+        keep = len(old) - 1 - shift  # Filas cerradas reutilizadas (0..keep-1 en la ventana nueva)
+        m = len(raw) - keep  # Filas nuevas: velas que cerraron + la vela en formación
+        prev = old.iloc[len(old) - 2]  # Última fila cerrada ya calculada
+        new = raw.iloc[keep:]
+
+        high = raw["high"].to_numpy(dtype=float)
+        low = raw["low"].to_numpy(dtype=float)
+        close = raw["close"].to_numpy(dtype=float)
+
+        cols = {}
+        # 1. ATR (True Range + RMA) y EMAs: recursión desde el último valor
+        prev_close = close[keep - 1 : len(raw) - 1]
+        tr = np.maximum.reduce(
+            [high[keep:] - low[keep:], np.abs(high[keep:] - prev_close), np.abs(low[keep:] - prev_close)]
+        )
+        cols[self._atr_col] = _continue_ewm(prev[self._atr_col], tr, alpha=1.0 / self.atr_length)
+        for length in self.ema_lengths:
+            cols[f"ema_{length}"] = _continue_ewm(prev[f"ema_{length}"], close[keep:], alpha=2.0 / (length + 1))
+
+        # 2. Fractales: las últimas 'lag' filas cerradas eran provisionales
+        start = keep - self.lag  # Primera fila a rehacer
+        seg = slice(start - self.lag, len(raw))
+        roll_max = pd.Series(high[seg]).rolling(window=self.window, center=True).max().to_numpy()
+        roll_min = pd.Series(low[seg]).rolling(window=self.window, center=True).min().to_numpy()
+        swing_high = np.concatenate(
+            [old["is_swing_high"].to_numpy(dtype=bool)[shift : shift + start], (high[seg] == roll_max)[self.lag :]]
+        )
+        swing_low = np.concatenate(
+            [old["is_swing_low"].to_numpy(dtype=bool)[shift : shift + start], (low[seg] == roll_min)[self.lag :]]
+        )
+
+        # Liquidez proyectada: último swing confirmado (shift(lag).ffill()) desde el valor previo
+        conf = slice(keep - self.lag, len(raw) - self.lag)
+        cols["target_liquidity_high"] = _ffill_from(
+            prev["target_liquidity_high"], np.where(swing_high[conf], high[conf], np.nan)
+        )
+        cols["target_liquidity_low"] = _ffill_from(
+            prev["target_liquidity_low"], np.where(swing_low[conf], low[conf], np.nan)
+        )
+
+        # 3. Pools: el índice avanza por las velas que cerraron; la vela en formación, en una copia
+        pools = {name: np.zeros(m, dtype=old[name].dtype) for name in POOL_COLUMNS}
+        pools["pool_high_swept"][:] = np.nan
+        pools["pool_low_swept"][:] = np.nan
+        self._bar0 += shift
+        for k in range(m):
+            t = keep + k
+            j = t - self.lag
+            index = self._pools if k < m - 1 else self._pools.copy()
+            taken_highs, taken_lows = index.step(
+                self._bar0 + t,
+                high[t],
+                low[t],
+                high[j] if swing_high[j] else None,
+                low[j] if swing_low[j] else None,
+            )
+            if taken_highs:
+                pools["pool_high_swept"][k] = taken_highs[-1]
+                pools["pool_high_swept_n"][k] = len(taken_highs)
+            if taken_lows:
+                pools["pool_low_swept"][k] = taken_lows[-1]
+                pools["pool_low_swept_n"][k] = len(taken_lows)
+        cols.update(pools)
+
+        # 4. Midnight open: mismo día NY que la última fila cerrada => mismo valor
+        calendar = SessionCalendar.from_times(
+            raw.index[keep - 1 :], session_tz=str(self.indicators.ny_timezone)
+        )
+        opens = raw["open"].to_numpy()[keep - 1 :]
+        day_start = calendar.day_start[1:]
+        cols["midnight_open"] = np.where(day_start == 0, prev["midnight_open"], opens[day_start])
+
+        # 5. Ensamblar: filas viejas + nuevas, mismas columnas y orden que add_all_features
+        data = {}
+        for name in old.columns:
+            if name == "is_swing_high":
+                data[name] = swing_high
+            elif name == "is_swing_low":
+                data[name] = swing_low
+            elif name in cols:
+                data[name] = np.concatenate([old[name].to_numpy()[shift : shift + keep], cols[name]])
+            else:
+                data[name] = np.concatenate([old[name].to_numpy()[shift : shift + keep], new[name].to_numpy()])
+        self.incremental_updates += 1
+        return pd.DataFrame(data, index=raw.index)
+
+
+def _continue_ewm(prev, values, alpha):
+    """EWM (adjust=False) que sigue desde 'prev': misma aritmética que pandas / pandas_ta"""
+    series = pd.Series(np.concatenate([[float(prev)], np.asarray(values, dtype=float)]))
+    return series.ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+
+def _ffill_from(prev, values):
+    """ffill de 'values' arrancando con 'prev' (valor vigente antes del tramo)"""
+    series = pd.Series(np.concatenate([[prev], values]))
+    return series.ffill().to_numpy()[1:]
@@ -3,6 +3,9 @@ import pandas_ta as ta
 import pytz
 import numpy as np
 
+from data_core.liquidity import POOL_MAX_AGE, pool_sweep_columns
+from data_core.session_calendar import DATA_TZ, calendar_for, localize_index
+
 
 class Indicators:
     """
@@ -11,8 +14,33 @@ class Indicators:
     - Optimiza el acceso a datos mediante ffill (O(1) access en Logic Engine).
     """
 
-    def __init__(self):
+    def __init__(self, pool_max_age: int = POOL_MAX_AGE):
         self.ny_timezone = pytz.timezone("America/New_York")
+        self.pool_max_age = pool_max_age
+
+    def params(self) -> dict:
+        """Parámetros que definen las columnas generadas (clave de la cache de frames)"""
+        return {
+            "atr_length": 14,
+            "fractal_window": 5,
+            "pool_max_age": self.pool_max_age,
+            "ema_lengths": [50, 200],
+            "session_tz": str(self.ny_timezone),
+            "data_tz": DATA_TZ,
+        }
+
+    def warmup_rows(self) -> int:
+        """
+        Velas previas necesarias para recalcular los indicadores de un tramo
+        aislado con los mismos valores que una pasada completa:
+        - EMA/ATR son recursivas: tras 20 x longitud velas la semilla pesa
+          (1 - 2/201)^4000 ~ 1e-17, por debajo de la resolución del float64.
+        - Midnight open necesita la primera vela del día NY (1440 velas M1).
+        - Fractales: retraso de confirmación (window // 2) + ventana.
+        - Pools de liquidez: un nivel sigue vivo pool_max_age velas tras confirmarse.
+        """
+        p = self.params()
+        return max(max(p["ema_lengths"]) * 20, 1440, p["pool_max_age"]) + p["fractal_window"]
 
     def add_all_features(self, df: pd.DataFrame) -> pd.DataFrame:
         if len(df) < 50:
@@ -24,6 +52,7 @@ class Indicators:
 
         # 2. Estructura y Liquidez (Swings)
         df = self.calculate_fractals(df)
+        df = self.calculate_liquidity_pools(df)
 
         # 3. Contexto Temporal
         df = self.calculate_midnight_open(df)
@@ -71,19 +100,32 @@ class Indicators:
 
         return df
 
+    def calculate_liquidity_pools(self, df: pd.DataFrame, window: int = 5) -> pd.DataFrame:
+        """
+        Todos los swings sin tomar (no solo el último), vivos pool_max_age velas.
+        Por vela: nivel más extremo que su rango barrió y cuántos niveles tomó
+        (pool_high_swept / _n, pool_low_swept / _n). Requiere calculate_fractals.
+        """
+        pools = pool_sweep_columns(
+            df["high"].to_numpy(),
+            df["low"].to_numpy(),
+            df["is_swing_high"].to_numpy(dtype=bool),
+            df["is_swing_low"].to_numpy(dtype=bool),
+            lag=window // 2,
+            max_age=self.pool_max_age,
+        )
+        for name, values in pools.items():
+            df[name] = values
+        return df
+
     def calculate_midnight_open(self, df: pd.DataFrame) -> pd.DataFrame:
         if df.index.tz is None:
-            df = df.tz_localize("UTC")
-        # Convertir a NY para obtener la apertura real de sesión
-        df_ny = df.tz_convert(self.ny_timezone)
-
-        # Extraer fecha y calcular Open diario
-        # Optimizamos agrupando solo lo necesario
-        midnight_opens = df_ny.groupby(df_ny.index.date)["open"].first()
+            # Timestamps naive = hora de DATA_TZ (servidor MT5)
+            df = df.set_axis(localize_index(df.index, DATA_TZ), axis=0)
 
-        # Mapear de vuelta al dataframe original usando la fecha del índice
-        df["midnight_open"] = df_ny.index.date
-        df["midnight_open"] = df["midnight_open"].map(midnight_opens)
+        # Primera vela del día NY de cada vela (DST incluido), sin agrupar por fecha
+        calendar = calendar_for(df.index, session_tz=str(self.ny_timezone))
+        df["midnight_open"] = df["open"].to_numpy()[calendar.day_start]
 
         return df
 
@@ -0,0 +1,219 @@
+import heapq
+import os
+from bisect import bisect_left, bisect_right, insort
+
+import numpy as np
+
+# Velas que un nivel sin tomar sigue vivo tras confirmarse (1 día de M1).
+# Acotarlo mantiene el escaneo por bloques con halo idéntico a la pasada única.
+# Entra en Indicators.params(): cambiarlo invalida frames, etapas y checkpoints.
+POOL_MAX_AGE = int(os.getenv("POOL_MAX_AGE", "1440"))
+
+# Columnas por vela: nivel más extremo tomado (NaN si ninguno) y cuántos
+POOL_COLUMNS = ("pool_high_swept", "pool_high_swept_n", "pool_low_swept", "pool_low_swept_n")
+
+_INF = float("inf")
+
+
+class LiquidityPoolIndex:
+    """
+    Todos los niveles de liquidez sin tomar (swing highs = buy-side, swing lows
+    = sell-side), en una lista ordenada por lado.
+    - Cada lado se ordena de modo que lo que una vela puede tomar queda al
+      final: highs por -precio (toma los menores que su high), lows por precio
+      (toma los mayores que su low). take() = bisect + recorte de la cola:
+      O(log n + k).
+    - Un nivel vive max_age velas desde su confirmación; la expiración es
+      perezosa con un heap (sin recorrer las listas).
+    - Entradas (clave, barra): dos niveles al mismo precio son distintos.
+    """
+
+    def __init__(self, max_age: int = POOL_MAX_AGE):
+        self.max_age = max_age
+        self._highs = []  # (-precio, barra), ascendente
+        self._lows = []  # (precio, barra), ascendente
+        self._expiry = []  # (expira_después_de, lado, entrada)
+
+    def __len__(self):
+        return len(self._highs) + len(self._lows)
+
+    def add_high(self, price: float, bar: int):
+        entry = (-price, bar)
+        insort(self._highs, entry)
+        heapq.heappush(self._expiry, (bar + self.max_age, 0, entry))
+
+    def add_low(self, price: float, bar: int):
+        entry = (price, bar)
+        insort(self._lows, entry)
+        heapq.heappush(self._expiry, (bar + self.max_age, 1, entry))
+
+    def expire(self, bar: int):
+        """Descarta los niveles cuya vida terminó antes de 'bar'"""
+        while self._expiry and self._expiry[0][0] < bar:
+            _, side, entry = heapq.heappop(self._expiry)
+            levels = self._lows if side else self._highs
+            pos = bisect_left(levels, entry)
+            # Si ya fue tomado no está
+            if pos < len(levels) and levels[pos] == entry:
+                del levels[pos]
+
+    def take(self, high: float, low: float):
+        """
+        Niveles que toma una vela [low, high] (estricto, como el sweep del
+        detector) y que salen del índice.
+        Returns:
+            (highs_tomados, lows_tomados), cada uno ordenado del más cercano al más extremo.
+        """
+        pos = bisect_right(self._highs, (-high, _INF))
+        taken_highs = [-key for key, _ in reversed(self._highs[pos:])]
+        del self._highs[pos:]
+
+        pos = bisect_right(self._lows, (low, _INF))
+        taken_lows = [key for key, _ in reversed(self._lows[pos:])]
+        del self._lows[pos:]
+        return taken_highs, taken_lows
+
+    def step(self, bar: int, high: float, low: float, confirmed_high=None, confirmed_low=None):
+        """
+        Una vela: expira, agrega los swings que se confirman en ella (precio o
+        None) y toma lo que barre su rango. Devuelve lo mismo que take().
+        """
+        self.expire(bar)
+        if confirmed_high is not None:
+            self.add_high(confirmed_high, bar)
+        if confirmed_low is not None:
+            self.add_low(confirmed_low, bar)
+        return self.take(high, low)
+
+    def copy(self):
+        """Copia independiente (para evaluar la vela en formación sin tocar el estado)"""
+        clone = LiquidityPoolIndex(self.max_age)
+        clone._highs = list(self._highs)
+        clone._lows = list(self._lows)
+        clone._expiry = list(self._expiry)
+        return clone
+
+    def levels(self):
+        """Niveles vivos: highs ascendentes (el más cercano primero), lows descendentes"""
+        return {
+            "highs": [-key for key, _ in reversed(self._highs)],
+            "lows": [key for key, _ in reversed(self._lows)],
+        }
+
+    @classmethod
+    def scan(cls, high, low, swing_high, swing_low, lag: int, max_age: int = POOL_MAX_AGE):
+        """
+        Recorrido incremental vela a vela (mismo resultado que pool_sweep_columns).
+        Para frames sin las columnas de pools; O(N log n + tomas totales).
+        """
+        high = np.asarray(high, dtype=float)
+        low = np.asarray(low, dtype=float)
+        swing_high = np.asarray(swing_high, dtype=bool)
+        swing_low = np.asarray(swing_low, dtype=bool)
+        n = len(high)
+        out = _empty_columns(n)
+        index = cls(max_age)
+        for t in range(n):
+            j = t - lag  # Swing que se confirma en esta vela
+            taken_highs, taken_lows = index.step(
+                t,
+                high[t],
+                low[t],
+                high[j] if j >= 0 and swing_high[j] else None,
+                low[j] if j >= 0 and swing_low[j] else None,
+            )
+            if taken_highs:
+                out["pool_high_swept"][t] = taken_highs[-1]
+                out["pool_high_swept_n"][t] = len(taken_highs)
+            if taken_lows:
+                out["pool_low_swept"][t] = taken_lows[-1]
+                out["pool_low_swept_n"][t] = len(taken_lows)
+        return out
+
+
+def _empty_columns(n):
+    return {
+        "pool_high_swept": np.full(n, np.nan),
+        "pool_high_swept_n": np.zeros(n, dtype=np.int32),
+        "pool_low_swept": np.full(n, np.nan),
+        "pool_low_swept_n": np.zeros(n, dtype=np.int32),
+    }
+
+
+def first_exceeding(values, starts, ends, thresholds, block: int = 1 << 16):
+    """
+    Para cada consulta, primera posición t en [start, end] con values[t] > threshold
+    (-1 si no hay). Búsqueda binaria sobre una sparse table de máximos,
+    construida por bloques de consultas para acotar memoria:
+    O((N + Q) log H), H = end - start máximo.
+    """
+    values = np.asarray(values, dtype=float)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.minimum(np.asarray(ends, dtype=np.int64), len(values) - 1)
+    thresholds = np.asarray(thresholds, dtype=float)
+    result = np.full(len(starts), -1, dtype=np.int64)
+    if len(starts) == 0:
+        return result
+
+    horizon = int((ends - starts).max()) + 1
+    levels = max(horizon.bit_length(), 1)
+    order = np.argsort(starts, kind="stable")
+    for b in range(0, len(order), block):
+        q = order[b : b + block]
+        lo = int(starts[q].min())
+        hi = min(int(ends[q].max()), len(values) - 1) + 1
+        seg = values[lo:hi]
+        # table[k][t] = max(seg[t : t + 2^k]); fuera de rango = +inf (nunca se salta)
+        table = [seg]
+        for k in range(1, levels):
+            prev, step = table[-1], 1 << (k - 1)
+            cur = np.full(len(seg), np.inf)
+            cur[: len(seg) - step] = np.maximum(prev[: len(seg) - step], prev[step:])
+            table.append(cur)
+
+        pos = starts[q] - lo
+        end = ends[q] - lo
+        thr = thresholds[q]
+        last = len(seg) - 1
+        # Mayor prefijo [start, pos) con todo <= threshold
+        for k in range(levels - 1, -1, -1):
+            step = 1 << k
+            ok = (pos + step - 1 <= end) & (table[k][np.minimum(pos, last)] <= thr)
+            pos = np.where(ok, pos + step, pos)
+        hit = (pos <= end) & (seg[np.minimum(pos, last)] > thr)
+        result[q] = np.where(hit, pos + lo, -1)
+    return result
+
+
+def pool_sweep_columns(high, low, swing_high, swing_low, lag: int, max_age: int = POOL_MAX_AGE):
+    """
+    Versión vectorizada de LiquidityPoolIndex.scan para historiales completos.
+    Cada nivel (swing en j, confirmado en c = j + lag) se toma en la primera vela
+    t en [c, c + max_age] que lo supera: una consulta first_exceeding por nivel,
+    sin re-escanear ventanas. Las tomas se agregan por vela.
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    n = len(high)
+    out = _empty_columns(n)
+
+    for side, values, swings in (("high", high, swing_high), ("low", low, swing_low)):
+        bars = np.flatnonzero(np.asarray(swings, dtype=bool)[: max(n - lag, 0)])
+        if len(bars) == 0:
+            continue
+        starts = bars + lag
+        prices = values[bars]
+        if side == "high":
+            taken_at = first_exceeding(high, starts, starts + max_age, prices)
+        else:
+            # low[t] < precio  <=>  -low[t] > -precio
+            taken_at = first_exceeding(-low, starts, starts + max_age, -prices)
+        hit = taken_at >= 0
+        t, p = taken_at[hit], prices[hit]
+
+        counts = np.bincount(t, minlength=n).astype(np.int32)
+        extreme = np.full(n, -np.inf if side == "high" else np.inf)
+        (np.maximum if side == "high" else np.minimum).at(extreme, t, p)
+        out[f"pool_{side}_swept"] = np.where(counts > 0, extreme, np.nan)
+        out[f"pool_{side}_swept_n"] = counts
+    return out
@@ -1,10 +1,14 @@
 import MetaTrader5 as mt5
 import pandas as pd
 import os
+import sys
 from datetime import datetime
 import pytz
 from dotenv import load_dotenv
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from data_core.session_calendar import DATA_TZ, localize_index
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -67,11 +71,11 @@ def get_data(symbol, timeframe_str, n=N_CANDLES):
     return df
 
 
-def sync_and_save_data():
+def sync_and_save_data(output_dir=None):
     """Orquestador principal: Descarga, Sincroniza y Guarda"""
 
     # Crear carpeta de salida si no existe
-    output_dir = os.path.join(os.path.dirname(__file__), "datasets")
+    output_dir = output_dir or os.path.join(os.path.dirname(__file__), "datasets")
     os.makedirs(output_dir, exist_ok=True)
 
     print(f"🚀 Iniciando minería de datos ({N_CANDLES} velas)...")
@@ -97,12 +101,11 @@ def sync_and_save_data():
         # El Inner Join alinea los índices (tiempo). Si falta una vela en uno, se borra en ambos.
         df_merged = df_nq_clean.join(df_es_clean, how="inner")
 
-        # 4. Conversión de Zona Horaria (A New York - EST/EDT)
-        # Asumimos que MT5 viene en UTC (o ajusta según tu broker).
-        # La mayoría de brokers de CFDs usan UTC+2/UTC+3.
-        # Aquí convertimos a 'US/Eastern' para que la lógica de las 09:30 funcione.
-        # NOTA: Ajustar 'tz_localize' según la hora de TU servidor MT5.
-        # Para MVP asumimos que el índice ya es datetime naive y lo tratamos como raw.
+        # 4. Conversión de Zona Horaria (hora del servidor MT5 -> UTC explícito)
+        # MT5 entrega la hora de SU servidor sin zona; la mayoría de brokers de
+        # CFDs usan UTC+2/UTC+3. DATA_TZ (.env) dice cuál es; el CSV se guarda en
+        # UTC con offset, y la hora NY (EST/EDT) la resuelve SessionCalendar.
+        df_merged.index = localize_index(df_merged.index, DATA_TZ).tz_convert("UTC")
 
         # 5. Guardar CSV
         filename = f"SYNC_DATA_{tf_name}.csv"
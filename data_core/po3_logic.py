@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from data_core.liquidity import POOL_COLUMNS, POOL_MAX_AGE, LiquidityPoolIndex
+
 class PO3Detector:
     """
     v3.0 - Motor PO3 Institucional + SMT Divergence
@@ -9,6 +11,35 @@ class PO3Detector:
     def __init__(self, df: pd.DataFrame, df_correlated: pd.DataFrame = None):
         self.df = df
         self.df_corr = df_correlated # Data del ES (S&P 500)
+        self._pools = None
+
+    def _pool_columns(self):
+        """
+        Tomas de liquidez por vela. Si el frame no trae las columnas
+        (Indicators.calculate_liquidity_pools) se reconstruyen una vez con el
+        índice incremental a partir de los fractales.
+        """
+        if self._pools is None:
+            if all(c in self.df.columns for c in POOL_COLUMNS):
+                self._pools = {c: self.df[c].to_numpy() for c in POOL_COLUMNS}
+            else:
+                self._pools = LiquidityPoolIndex.scan(
+                    self.df["high"].to_numpy(),
+                    self.df["low"].to_numpy(),
+                    self.df["is_swing_high"].to_numpy(dtype=bool),
+                    self.df["is_swing_low"].to_numpy(dtype=bool),
+                    lag=2,
+                    max_age=POOL_MAX_AGE,
+                )
+        return self._pools
+
+    def _first_pool_sweep(self, start, end, side):
+        """Primera vela de [start, end) que barrió algún pool de 'side' -> nivel más extremo tomado"""
+        taken = self._pool_columns()[f"pool_{side}_swept_n"][start:end]
+        hits = np.flatnonzero(taken)
+        if len(hits) == 0:
+            return None
+        return self._pools[f"pool_{side}_swept"][start + hits[0]]
 
     def scan_for_signals(self, i: int):
         if i < 20: return None
@@ -28,12 +59,11 @@ class PO3Detector:
         if fvg_type == "BEARISH":
             # --- BUSCAR SWEEP EN NQ ---
             window_df = self.df.iloc[i - scan_window : i]
-            # ¿Superamos un High previo?
-            sweeps = window_df[window_df["high"] > window_df["target_liquidity_high"]]
+            # ¿Tomamos algún High previo sin mitigar?
+            level_broken = self._first_pool_sweep(i - scan_window, i, "high")
 
-            if not sweeps.empty:
+            if level_broken is not None:
                 highest_point = window_df["high"].max()
-                level_broken = sweeps.iloc[0]["target_liquidity_high"]
                 
                 # Validación de Desplazamiento (Cierre abajo del nivel roto)
                 if row["close"] < level_broken:
@@ -51,11 +81,10 @@ class PO3Detector:
         elif fvg_type == "BULLISH":
             # --- BUSCAR SWEEP EN NQ ---
             window_df = self.df.iloc[i - scan_window : i]
-            sweeps = window_df[window_df["low"] < window_df["target_liquidity_low"]]
+            level_broken = self._first_pool_sweep(i - scan_window, i, "low")
 
-            if not sweeps.empty:
+            if level_broken is not None:
                 lowest_point = window_df["low"].min()
-                level_broken = sweeps.iloc[0]["target_liquidity_low"]
 
                 if row["close"] > level_broken:
                     sweep_detected = True
@@ -79,6 +108,7 @@ class PO3Detector:
             "entry_price": fvg_price,
             "stop_loss": stop_loss_level,
             "take_profit": self._calculate_tp(fvg_price, stop_loss_level, fvg_type),
+            "sweep_level": level_broken, # Liquidez barrida (para graficar)
             "atr_context": row["ATRr_14"],
             "smt_divergence": smt_confirmed # Nueva etiqueta valiosa
         }
@@ -115,6 +145,9 @@ class PO3Detector:
                 # Para MVP: Verificamos si el ES High de la ventana superó su propio fractal reciente
                 # Asumimos que df_corr tiene las columnas 'target_liquidity_high' calculadas
                 
+                if 'pool_high_swept_n' in es_window.columns:
+                    # ES no tomó ningún pool de highs en la ventana => divergencia
+                    return not es_window['pool_high_swept_n'].any()
                 if 'target_liquidity_high' in es_window.columns:
                     # Si ES NO rompió su liquidez, es divergencia.
                     # NQ rompió (Fuerza/Manipulación), ES no rompió (Debilidad real).
@@ -128,6 +161,8 @@ class PO3Detector:
             elif direction == "BULLISH":
                 # NQ hizo Lower Low.
                 # SMT Bullish = ES hizo Higher Low (Fortaleza).
+                if 'pool_low_swept_n' in es_window.columns:
+                    return not es_window['pool_low_swept_n'].any()
                 if 'target_liquidity_low' in es_window.columns:
                     broken_liquidity = es_window[es_window['low'] < es_window['target_liquidity_low']]
                     
@@ -0,0 +1,178 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+# Zona de los timestamps naive (CSV viejos, velas de MT5 = hora del servidor
+# del broker). UTC por defecto; p.ej. "Etc/GMT-2" o "Europe/Athens".
+DATA_TZ = os.getenv("DATA_TZ", "UTC")
+SESSION_TZ = "America/New_York"
+
+MINUTE_NS = 60 * 1_000_000_000
+DAY_MINUTES = 24 * 60
+
+# Calendarios recientes en memoria (el bot reevalúa el mismo frame varias veces)
+CALENDAR_CACHE_SIZE = 8
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def localize_index(index, data_tz: str = DATA_TZ) -> pd.DatetimeIndex:
+    """
+    DatetimeIndex tz-aware: los naive se interpretan en data_tz. Con DST, la
+    hora repetida se infiere por el orden de las velas (si no se puede, se toma
+    la hora estándar) y la inexistente se corre hacia adelante.
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        return index
+    if data_tz == "UTC":
+        return index.tz_localize("UTC")
+    try:
+        return index.tz_localize(data_tz, ambiguous="infer", nonexistent="shift_forward")
+    except ValueError:
+        # pytz.AmbiguousTimeError hereda de ValueError
+        return index.tz_localize(data_tz, ambiguous=np.zeros(len(index), dtype=bool), nonexistent="shift_forward")
+
+
+def to_utc_ns(times, data_tz: str = DATA_TZ) -> np.ndarray:
+    """Epoch ns UTC (int64). Un array entero ya es epoch UTC (columnas de frame_cache)."""
+    if isinstance(times, np.ndarray) and np.issubdtype(times.dtype, np.integer):
+        return times.astype(np.int64, copy=False)
+    index = localize_index(times, data_tz).tz_convert("UTC").tz_localize(None)
+    return index.values.astype("datetime64[ns]").astype(np.int64)
+
+
+def server_time_to_utc(ts: float, data_tz: str = DATA_TZ) -> float:
+    """
+    Epoch de MT5 (deal.time, velas): es la hora de pared del servidor del broker
+    codificada como si fuera UTC. Devuelve el epoch UTC real.
+    """
+    if data_tz == "UTC":
+        return float(ts)
+    wall = pd.Timestamp(float(ts), unit="s")
+    return localize_index([wall], data_tz)[0].timestamp()
+
+
+def utc_to_server_time(ts: float, data_tz: str = DATA_TZ) -> float:
+    """Inversa de server_time_to_utc: epoch UTC real -> epoch en hora del servidor (filtros de MT5)"""
+    if data_tz == "UTC":
+        return float(ts)
+    wall = pd.Timestamp(float(ts), unit="s", tz="UTC").tz_convert(data_tz).tz_localize(None)
+    return (wall - pd.Timestamp(0)).total_seconds()
+
+
+def session_hour(ts, data_tz: str = DATA_TZ, session_tz: str = SESSION_TZ) -> int:
+    """Hora NY de un timestamp suelto (naive = data_tz)"""
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is None:
+        ts = localize_index([ts], data_tz)[0]
+    return ts.tz_convert(session_tz).hour
+
+
+class SessionCalendar:
+    """
+    Calendario de sesión precalculado para un índice de velas (todo vectorizado):
+    - offset_min: desplazamiento NY - UTC de cada vela (sigue los cambios de DST).
+    - minute_of_day: minuto local NY [0, 1440).
+    - day_id: día local NY (días desde epoch); cambia a medianoche NY, no UTC.
+    - day_start: posición de la primera vela del día NY (midnight open).
+    Derivados (se calculan una vez, al pedirlos): hour, hour_frac,
+    is_ny_session, is_cash_session.
+    """
+
+    FIELDS = ("offset_min", "minute_of_day", "day_id", "day_start")
+
+    def __init__(self, arrays: dict, session_tz: str = SESSION_TZ):
+        self.arrays = arrays
+        self.session_tz = session_tz
+        for name in self.FIELDS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.day_id)
+
+    @classmethod
+    def from_times(cls, times, data_tz: str = DATA_TZ, session_tz: str = SESSION_TZ):
+        return cls.from_utc_ns(to_utc_ns(times, data_tz), session_tz)
+
+    @classmethod
+    def from_utc_ns(cls, utc_ns, session_tz: str = SESSION_TZ):
+        utc_ns = np.asarray(utc_ns, dtype=np.int64)
+        # tz_convert usa la tabla de transiciones de la zona: DST correcto y sin bucles
+        local = pd.DatetimeIndex(utc_ns.view("datetime64[ns]"), tz="UTC").tz_convert(session_tz)
+        local_ns = local.tz_localize(None).values.astype("datetime64[ns]").astype(np.int64)
+
+        local_min = local_ns // MINUTE_NS
+        day_id = local_min // DAY_MINUTES
+        arrays = {
+            "offset_min": ((local_ns - utc_ns) // MINUTE_NS).astype(np.int16),
+            "minute_of_day": (local_min - day_id * DAY_MINUTES).astype(np.int16),
+            "day_id": day_id.astype(np.int32),
+            "day_start": _day_starts(day_id),
+        }
+        return cls(arrays, session_tz)
+
+    def slice(self, start: int, stop: int):
+        """Tramo [start, stop); day_start queda relativo al tramo (negativo = el día empezó antes)"""
+        arrays = {name: np.asarray(arr[start:stop]) for name, arr in self.arrays.items()}
+        arrays["day_start"] = arrays["day_start"] - start
+        return SessionCalendar(arrays, self.session_tz)
+
+    # --- DERIVADOS ---
+    @cached_property
+    def hour(self):
+        return (self.minute_of_day // 60).astype(np.int32)
+
+    @cached_property
+    def hour_frac(self):
+        """Hora NY con minutos (9.5 = 09:30)"""
+        return self.minute_of_day / 60.0
+
+    @cached_property
+    def is_ny_session(self):
+        """Definición del modelo: 09:00 <= hora NY < 16:00"""
+        hour = self.hour
+        return (hour >= 9) & (hour < 16)
+
+    @cached_property
+    def is_cash_session(self):
+        """Sesión de contado NY: 09:30 a 16:00 inclusive"""
+        return (self.minute_of_day >= 9 * 60 + 30) & (self.minute_of_day <= 16 * 60)
+
+
+def _day_starts(day_id):
+    """Posición de la primera vela de cada día (mismo criterio que groupby(fecha).first())"""
+    n = len(day_id)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if n == 1 or np.all(day_id[1:] >= day_id[:-1]):
+        # Índice ordenado: el día cambia donde cambia day_id
+        new_day = np.empty(n, dtype=bool)
+        new_day[0] = True
+        new_day[1:] = day_id[1:] != day_id[:-1]
+        return np.maximum.accumulate(np.where(new_day, np.arange(n), 0)).astype(np.int64)
+    _, first, inverse = np.unique(day_id, return_index=True, return_inverse=True)
+    return first[inverse].astype(np.int64)
+
+
+def calendar_for(times, data_tz: str = DATA_TZ, session_tz: str = SESSION_TZ) -> SessionCalendar:
+    """SessionCalendar del índice, reutilizando uno ya calculado para el mismo contenido"""
+    utc_ns = to_utc_ns(times, data_tz)
+    digest = hashlib.blake2b(np.ascontiguousarray(utc_ns).tobytes(), digest_size=16).digest()
+    key = (len(utc_ns), digest, session_tz)
+    with _cache_lock:
+        calendar = _cache.get(key)
+        if calendar is not None:
+            _cache.move_to_end(key)
+            return calendar
+    calendar = SessionCalendar.from_utc_ns(utc_ns, session_tz)
+    with _cache_lock:
+        _cache[key] = calendar
+        while len(_cache) > CALENDAR_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return calendar
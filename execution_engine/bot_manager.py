@@ -7,13 +7,41 @@ import sys
 import pytz
 import pytz
 import random
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 
 # Imports relativos
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from data_core.indicators import Indicators
 from data_core.po3_logic import PO3Detector
+from data_core.session_calendar import DATA_TZ
+from execution_engine.log_store import LogStore
+from execution_engine.market_recorder import (
+    FEATURES,
+    ORDER,
+    PROB,
+    SIGNAL,
+    MarketRecorder,
+    file_sha256,
+)
+from execution_engine.metrics import (
+    AI_DECISIONS,
+    CANDLES_PROCESSED,
+    INFERENCE_SECONDS,
+    ORDERS,
+    SIGNALS_DETECTED,
+)
 from execution_engine.mt5_driver import MT5Driver
+from execution_engine.trade_journal import TradeJournal
+from execution_engine.reconciler import DealReconciler
+from execution_engine.replay_engine import ReplayEngine
+from execution_engine.strategy_runner import (
+    CandleCache,
+    MultiStrategyRunner,
+    parse_instruments,
+    signal_key_of,
+)
 
 try:
     from quant_lab.features import build_features
@@ -29,7 +57,8 @@ class BotManager:
         # El driver maneja la conexión a MT5
         self.driver = MT5Driver()
 
-        self.logs = []
+        # Log estructurado (ring buffer + writer a disco en segundo plano)
+        self.log_store = LogStore()
         self.latest_status = "IDLE"
         self.ny_tz = pytz.timezone("America/New_York")
 
@@ -37,12 +66,44 @@ class BotManager:
         self.model = xgb.XGBClassifier()
         self.threshold = 0.70
         self.indicators = Indicators()
+        # Ventana en vivo = calentamiento de los indicadores (EMAs, pools vivos
+        # pool_max_age velas): con menos, el frame en vivo difiere del de entrenamiento.
+        # Se descarga completa una vez; luego la CandleCache solo pide la cola y
+        # actualiza los indicadores de forma incremental (IndicatorStream)
+        self.n_candles = self.indicators.warmup_rows()
+        self._model_lock = threading.Lock()
+
+        # --- Multi-Instrumento: N pares (principal, correlacionado) sobre una terminal ---
+        # INSTRUMENTS="USTEC:US500,DE40:STOXX50"; por defecto el par NQ/ES del driver
+        self.instruments = parse_instruments(
+            os.getenv("INSTRUMENTS", ""), self.driver.symbol, self.driver.symbol_es
+        )
+        for sym, corr in self.instruments:
+            self.driver.ensure_symbol(sym)
+            if corr:
+                self.driver.ensure_symbol(corr)
+        # Grabación de cada sesión en vivo para replay offline (RECORD_MARKET=0 la apaga)
+        self.recorder = MarketRecorder() if os.getenv("RECORD_MARKET", "1") == "1" else None
+        self.candles = CandleCache(self.driver, recorder=self.recorder, indicators=self.indicators)
+        self.runner = None
+
+        # Modo Demo: replay desde cache precalculada (se construye al primer uso)
+        self.replay = ReplayEngine()
 
         # --- NUEVO: Estado Extendido para App ---
-        self.trade_history = []  # Lista de dicts: {price, type, profit, ...}
+        # Diario persistente (SQLite WAL): solo trades REALES
+        self.journal = TradeJournal()
+        # Historial sintético en una base separada en memoria: nunca se mezcla con el real
+        self.demo_journal = TradeJournal(":memory:")
+        # Reconciliación incremental Deals MT5 -> Diario (PnL real)
+        # y alimenta el guard de pérdida diaria del RiskManager
+        self.reconciler = DealReconciler(
+            self.driver, self.journal, risk_manager=self.driver.risk_manager
+        )
         self.auto_trade = True  # Control maestro de ejecución
-        
-        self._inject_institutional_history() # <--- INYECCIÓN DE REALIDAD
+
+        if os.getenv("DEMO_HISTORY", "1") == "1":
+            self._inject_institutional_history() # <--- INYECCIÓN DE REALIDAD
         self._load_brain()
 
     # --- GETTERS & SETTERS (Interfaz App) ---
@@ -61,7 +122,12 @@ class BotManager:
         if self.driver.risk_manager:
             self.driver.risk_manager.risk_percent = risk_percent
         self.auto_trade = auto_trade
-        self.log(f"⚙ AJUSTES: Riesgo {risk_percent}% | AutoTrade: {auto_trade}")
+        self.log(
+            f"⚙ AJUSTES: Riesgo {risk_percent}% | AutoTrade: {auto_trade}",
+            code="SETTINGS",
+            risk=risk_percent,
+            auto_trade=auto_trade,
+        )
 
     def get_settings(self):
         risk = 1.0
@@ -70,34 +136,15 @@ class BotManager:
         return {"risk": risk, "auto_trade": self.auto_trade}
 
     def get_statistics(self):
-        """Calcula KPIs en tiempo real basados en 'Fricción Institucional'"""
-        if not self.trade_history:
-            return {"win_rate": 0.0, "profit_factor": 0.0, "total_pnl": 0.0, "total_trades": 0}
-
-        wins = 0
-        gross_profit = 0.0
-        gross_loss = 0.0
-        total_pnl = 0.0
-
-        for t in self.trade_history:
-            pnl = t.get("pnl", 0.0)
-            total_pnl += pnl
-            if pnl > 0:
-                wins += 1
-                gross_profit += pnl
-            else:
-                gross_loss += abs(pnl)
+        """KPIs en O(1) desde los agregados incrementales del diario real"""
+        return self.journal.get_statistics()
 
-        total = len(self.trade_history)
-        win_rate = (wins / total) if total > 0 else 0.0
-        pf = (gross_profit / gross_loss) if gross_loss > 0 else 99.99
+    def get_demo_statistics(self):
+        """KPIs del historial sintético (separado del real)"""
+        return self.demo_journal.get_statistics()
 
-        return {
-            "win_rate": round(win_rate * 100, 2),
-            "profit_factor": round(pf, 2),
-            "total_pnl": round(total_pnl, 2),
-            "total_trades": total
-        }
+    def get_recent_trades(self, n: int = 20):
+        return self.journal.recent(n)
 
     def _inject_institutional_history(self):
         """
@@ -105,8 +152,7 @@ class BotManager:
         Simula 30 días de operación con Spread, Comisiones y Slippage.
         Objetivo: Bajar el Win Rate teórico de 90% a un realista 58-62%.
         """
-        self.trade_history = []
-        base_time = datetime.now() - timedelta(days=30)
+        base_time = datetime.now(timezone.utc) - timedelta(days=30)
         balance_dummy = 10000.00
         
         # Configuración de Fricción
@@ -156,15 +202,17 @@ class BotManager:
                 "comment": f"Sim_{outcome_type}"
             }
             
-            self.trade_history.append(trade_record)
-        
-        # Ordenar por fecha reciente al final
-        # self.trade_history.sort(key=lambda x: x['time'])
-        self.log(f"🏛 HISTORIAL INSTITUCIONAL INYECTADO: {len(self.trade_history)} trades. Stats calculadas.")
+            self.demo_journal.record_trade(trade_record)
+
+        self.log(
+            f"🏛 HISTORIAL INSTITUCIONAL INYECTADO: {self.demo_journal.count()} trades (DEMO). Stats calculadas.",
+            code="DEMO_HISTORY",
+        )
 
     def _load_brain(self):
         model_path = "quant_lab/models/po3_sniper_v1.json"
         config_path = "quant_lab/models/model_config.json"
+        self.model_path = model_path
 
         if os.path.exists(model_path):
             try:
@@ -173,232 +221,340 @@ class BotManager:
                     with open(config_path, "r") as f:
                         conf = json.load(f)
                         self.threshold = conf.get("threshold", 0.70)
-                self.log(f"🧠 IA Cargada. Umbral: {self.threshold:.2%}")
+                self.log(f"🧠 IA Cargada. Umbral: {self.threshold:.2%}", code="MODEL_LOADED", threshold=self.threshold)
             except Exception as e:
-                self.log(f"❌ Error cargando IA: {e}")
+                self.log(f"❌ Error cargando IA: {e}", level="ERROR", code="MODEL_ERROR")
         else:
-            self.log("⚠ ALERTA: No hay modelo IA. Operando sin filtro inteligente.")
-
-    def log(self, msg):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        fmsg = f"[{timestamp}] {msg}"
-        print(fmsg)
-        self.logs.append(fmsg)
-        if len(self.logs) > 100:
-            self.logs.pop(0)
-        self.latest_status = msg
-
-    async def start_loop(self):
+            self.log("⚠ ALERTA: No hay modelo IA. Operando sin filtro inteligente.", level="WARNING", code="NO_MODEL")
+
+    def log(self, msg, level="INFO", code=None, **fields):
+        """
+        Registro estructurado: queda en el ring con su seq y el writer lo baja a
+        disco/consola en lote. No toca latest_status (ese lo fija cada flujo).
+        """
+        return self.log_store.append(msg, level, code, fields)
+
+    def recent_logs(self, n: int = 15):
+        """Últimas n líneas en el formato de la App ('[HH:MM:SS] msg')"""
+        return self.log_store.lines(n)
+
+    def get_logs(self, since: int = 0, limit: int = 200, level: str = None):
+        """Registros posteriores a 'since' + cursor para la siguiente consulta"""
+        last = self.log_store.last_seq
+        if since > last:
+            since = 0  # Cursor de una sesión anterior del motor (reinicio)
+        records = self.log_store.since(since, limit, level)
+        # Página incompleta = se revisó todo hasta 'last' (aunque el filtro no dejara nada)
+        cursor = records[-1].seq if len(records) >= limit else max(last, since, records[-1].seq if records else 0)
+        return {
+            "last_seq": self.log_store.last_seq,
+            "next_since": cursor,
+            "logs": [rec.to_dict() for rec in records],
+        }
+
+    async def start_loop(self, on_started=None):
+        """
+        Loop principal. 'on_started' se llama con el runner y la grabación listos:
+        es el acuse que esperan /bot/start y el comando 'start' del motor.
+        """
         self.is_running = True
-        self.log(f"🚀 MOTOR INICIADO. Escaneando {self.driver.symbol}...")
+        try:
+            self.runner = MultiStrategyRunner(
+                self.evaluate_instrument,
+                self.instruments,
+                on_error=self._on_instrument_error,
+                lock_wait_fn=self.driver.take_lock_wait,
+            )
+            symbols = ", ".join(sym for sym, _ in self.instruments)
+            self.log(f"🚀 MOTOR INICIADO. Escaneando {symbols}...", code="ENGINE_START")
+
+            if self.recorder is not None:
+                self.candles.clear()  # El primer frame de la sesión se graba completo
+                path = self.recorder.start(
+                    {
+                        "instruments": self.instruments,
+                        "n_candles": self.n_candles,
+                        "data_tz": DATA_TZ,
+                        "indicators": self.indicators.params(),
+                        "threshold": self.threshold,
+                        "model_path": self.model_path,
+                        "model_sha256": file_sha256(self.model_path),
+                    }
+                )
+                self.log(f"🎥 Grabando sesión en {path}", code="RECORDING", path=path)
+        except Exception:
+            self.is_running = False
+            if self.runner is not None:
+                self.runner.shutdown()
+            raise
+        loop = asyncio.get_running_loop()
+        if on_started:
+            on_started()
 
-        while self.is_running:
-            try:
-                # 1. OBTENCIÓN DE DATOS (Delegada al Driver)
-                # El Driver ya nos devuelve un DF con Index=Datetime
-                df = self.driver.get_market_data(n_candles=500)
-
-                if df is not None and len(df) > 100:
-                    # 1.B. Obtención de datos ES (SMT Divergence)
-                    # Necesitamos calcular indicadores también para ES (Fractales)
-                    df_es = self.driver.get_market_data(
-                        symbol=self.driver.symbol_es, n_candles=500
+        try:
+            while self.is_running:
+                try:
+                    # 0. RECONCILIACIÓN (Fills, cierres y expiraciones desde la marca de agua)
+                    recon = await loop.run_in_executor(
+                        self.runner.pool, self.reconciler.poll
                     )
+                    for ticket in recon["closed"]:
+                        trade = self.journal.get_trade(ticket)
+                        self.log(
+                            f"📕 Trade #{ticket} cerrado | PnL: {trade['pnl']:.2f}",
+                            code="TRADE_CLOSED",
+                            ticket=ticket,
+                            pnl=trade["pnl"],
+                        )
+                    for ticket in recon["expired"]:
+                        self.log(f"⌛ Orden #{ticket} retirada sin ejecución", code="ORDER_EXPIRED", ticket=ticket)
 
-                    if df_es is not None and len(df_es) > 100:
-                        df_es = self.indicators.add_all_features(df_es)
+                    # 1. Una evaluación por instrumento, cada una en su worker
+                    self.runner.tick()
+                    self.latest_status = "  ||  ".join(
+                        inst.status for inst in self.runner.instances
+                    )
 
-                    # 2. INDICADORES (NQ)
-                    df = self.indicators.add_all_features(df)
+                except Exception as e:
+                    self.log(f"❌ Error Loop Crítico: {e}", level="ERROR", code="LOOP_ERROR")
+                    import traceback
 
-                    # 3. LÓGICA PO3 (Con SMT)
-                    last_idx = len(df) - 2  # Vela confirmada
-                    # Pasamos df_es al detector para que valide divergencias
-                    detector = PO3Detector(df, df_correlated=df_es)
-                    signal = detector.scan_for_signals(last_idx)
+                    traceback.print_exc()
+                    await asyncio.sleep(5)
 
-                    current_price_nq = df["close"].iloc[-1]
-                    current_price_es = self.driver.get_current_price(
-                        self.driver.symbol_es
-                    )
-                    if not signal:
-                        self.latest_status = f"Escaneando... NQ: {current_price_nq:.2f}  |  ES: {current_price_es:.2f}"
-
-                    if signal:
-                        msg = f"🔎 Patrón {signal['signal_type']} detectado @ {signal['entry_price']}"
-                        if not self.logs or msg not in self.logs[-1]:
-                            self.log(msg)
-
-                        # 4. INTELIGENCIA ARTIFICIAL
-                        should_trade = False
-
-                        if self.model and build_features:
-                            # Contexto de mercado para feature engineering
-                            # Usamos la fila donde ocurrió la señal (last_idx)
-                            row_signal = df.iloc[last_idx]
-
-                            market_ctx = {
-                                "atr": row_signal.get("ATRr_14", 1.0),
-                                "ema_50": row_signal.get("ema_50", 0.0),
-                                "ema_200": row_signal.get("ema_200", 0.0),
-                            }
-
-                            features = build_features(
-                                row_signal, signal["entry_price"], market_ctx
-                            )
-
-                            try:
-                                prob = self.model.predict_proba(features)[0][1]
-                                if prob >= self.threshold:
-                                    self.log(
-                                        f"✅ IA APROBADO ({prob:.1%}). EJECUTANDO SNIPER..."
-                                    )
-                                    should_trade = True
-                                else:
-                                    self.log(
-                                        f"🛡 IA RECHAZADO ({prob:.1%}). (Req: {self.threshold:.1%})"
-                                    )
-                            except Exception as e:
-                                self.log(f"❌ Error IA: {e}")
-                                should_trade = False
-                        else:
-                            # Sin IA o sin módulo features, operamos la señal pura (Fallback)
-                            if not self.model:
-                                self.log("⚠ Operando sin IA (Modelo no cargado).")
-                            should_trade = (
-                                True if signal["smt_divergence"] else False
-                            )  # Solo operamos si hay SMT confirmado
-
-                        # 5. EJECUCIÓN (Respetando AutoTrade)
-                        if should_trade and self.auto_trade:
-                            order = self.driver.place_limit_order(
-                                signal["signal_type"],
-                                signal["entry_price"],
-                                signal["stop_loss"],
-                                signal["take_profit"],
-                            )
-
-                            if order:
-                                self.log(f"🎫 Orden Ticket: {order}")
-                                # Registrar en historial (Mock inicial, lo ideal es leer desde MT5)
-                                self.trade_history.append(
-                                    {
-                                        "ticket": order,
-                                        "symbol": self.driver.symbol,
-                                        "type": signal["signal_type"],
-                                        "price": signal["entry_price"],
-                                        "time": str(datetime.now()),
-                                        "pnl": 0.0,      
-                                        "status": "OPEN", 
-                                        "comment": "Live Trade" 
-                                    }
-                                )
-                                await asyncio.sleep(60)  # Cooldown
+                await asyncio.sleep(5)  # Polling
+        finally:
+            self.runner.shutdown()
+            if self.recorder is not None:
+                self.recorder.stop()
+
+    def evaluate_instrument(self, instance):
+        """
+        Decisión PO3 de una barra para un instrumento (se ejecuta en un worker).
+        El estado vive en 'instance': nada se comparte entre instrumentos salvo
+        la conexión a la terminal y la cache de velas.
+        """
+        # 1. DATOS + INDICADORES (Cache compartida -> Driver, actualización incremental)
+        df, frame_version = self.candles.get_features(instance.symbol, self.n_candles)
+        if df is None or len(df) <= 100:
+            instance.status = f"{instance.symbol}: sin datos"
+            return
+        CANDLES_PROCESSED.labels(instance.symbol).inc()
+
+        # 1.B. Activo correlacionado (SMT Divergence): también con indicadores (Fractales)
+        df_corr, corr_version = None, 0
+        if instance.corr_symbol:
+            df_corr, corr_version = self.candles.get_features(instance.corr_symbol, self.n_candles)
+            if df_corr is None or len(df_corr) <= 100:
+                df_corr = None
+
+        # 3. LÓGICA PO3 (Con SMT)
+        last_idx = len(df) - 2  # Vela confirmada
+        detector = PO3Detector(df, df_correlated=df_corr)
+        signal = detector.scan_for_signals(last_idx)
+
+        rec = self.recorder
+        eval_id = 0
+        if rec is not None and rec.active:
+            # Qué frames (versión grabada) y qué parámetros vio esta decisión
+            eval_id = rec.record_eval(
+                symbol=instance.symbol,
+                corr_symbol=instance.corr_symbol,
+                n=self.n_candles,
+                frame=frame_version,
+                corr_frame=corr_version if df_corr is not None else None,
+                last_idx=last_idx,
+                threshold=self.threshold,
+                auto_trade=self.auto_trade,
+            )
+            if signal:
+                rec.record(SIGNAL, eval_id, signal=signal, new=signal_key_of(signal) != instance.last_signal_key)
+
+        price = df["close"].iloc[-1]
+        if instance.corr_symbol:
+            corr_price = self.driver.get_current_price(instance.corr_symbol)
+            instance.status = f"{instance.symbol}: {price:.2f} | {instance.corr_symbol}: {corr_price:.2f}"
+        else:
+            instance.status = f"{instance.symbol}: {price:.2f}"
+
+        if not signal:
+            return
+
+        signal_key = signal_key_of(signal)
+        if signal_key != instance.last_signal_key:
+            instance.last_signal_key = signal_key
+            SIGNALS_DETECTED.labels(instance.symbol, signal["signal_type"]).inc()
+            self.log(
+                f"🔎 [{instance.symbol}] Patrón {signal['signal_type']} detectado @ {signal['entry_price']}",
+                code="SIGNAL",
+                symbol=instance.symbol,
+                type=signal["signal_type"],
+                price=signal["entry_price"],
+            )
+        else:
+            return  # Misma señal de la barra ya evaluada
+
+        # 4. INTELIGENCIA ARTIFICIAL
+        should_trade = False
+
+        if self.model and build_features:
+            # Contexto de mercado para feature engineering
+            # Usamos la fila donde ocurrió la señal (last_idx)
+            row_signal = df.iloc[last_idx]
+
+            market_ctx = {
+                "atr": row_signal.get("ATRr_14", 1.0),
+                "ema_50": row_signal.get("ema_50", 0.0),
+                "ema_200": row_signal.get("ema_200", 0.0),
+            }
+
+            features = build_features(row_signal, signal["entry_price"], market_ctx)
+            if eval_id:
+                rec.record(
+                    FEATURES, eval_id, columns=list(features.columns), values=features.iloc[0].tolist()
+                )
 
+            try:
+                with INFERENCE_SECONDS.time(), self._model_lock:
+                    prob = self.model.predict_proba(features)[0][1]
+                if eval_id:
+                    rec.record(PROB, eval_id, prob=float(prob), approved=bool(prob >= self.threshold))
+                if prob >= self.threshold:
+                    AI_DECISIONS.labels(instance.symbol, "approved").inc()
+                    self.log(
+                        f"✅ [{instance.symbol}] IA APROBADO ({prob:.1%}). EJECUTANDO SNIPER...",
+                        code="AI_APPROVED",
+                        symbol=instance.symbol,
+                        prob=float(prob),
+                    )
+                    should_trade = True
+                else:
+                    AI_DECISIONS.labels(instance.symbol, "rejected").inc()
+                    self.log(
+                        f"🛡 [{instance.symbol}] IA RECHAZADO ({prob:.1%}). (Req: {self.threshold:.1%})",
+                        code="AI_REJECTED",
+                        symbol=instance.symbol,
+                        prob=float(prob),
+                    )
             except Exception as e:
-                self.log(f"❌ Error Loop Crítico: {e}")
-                import traceback
+                AI_DECISIONS.labels(instance.symbol, "error").inc()
+                self.log(f"❌ Error IA: {e}", level="ERROR", code="AI_ERROR", symbol=instance.symbol)
+                should_trade = False
+        else:
+            # Sin IA o sin módulo features, operamos la señal pura (Fallback)
+            if not self.model:
+                self.log("⚠ Operando sin IA (Modelo no cargado).", level="WARNING", code="NO_MODEL")
+            should_trade = (
+                True if signal["smt_divergence"] else False
+            )  # Solo operamos si hay SMT confirmado
+
+        # 5. EJECUCIÓN (Respetando AutoTrade y el cooldown propio del instrumento)
+        if should_trade and self.auto_trade and time.monotonic() >= instance.cooldown_until:
+            order = self.driver.place_limit_order(
+                signal["signal_type"],
+                signal["entry_price"],
+                signal["stop_loss"],
+                signal["take_profit"],
+                symbol=instance.symbol,
+            )
 
-                traceback.print_exc()
-                await asyncio.sleep(5)
+            ORDERS.labels(instance.symbol, "sent" if order else "failed").inc()
+            if eval_id:
+                rec.record(
+                    ORDER,
+                    eval_id,
+                    symbol=instance.symbol,
+                    type=signal["signal_type"],
+                    entry=signal["entry_price"],
+                    sl=signal["stop_loss"],
+                    tp=signal["take_profit"],
+                    ticket=order,
+                )
+            if order:
+                self.log(f"🎫 [{instance.symbol}] Orden Ticket: {order}", code="ORDER_SENT", symbol=instance.symbol, ticket=order)
+                # Registrar en el diario persistente
+                self.journal.record_trade(
+                    {
+                        "ticket": order,
+                        "symbol": instance.symbol,
+                        "type": signal["signal_type"],
+                        "price": signal["entry_price"],
+                        "sl": signal["stop_loss"],
+                        "tp": signal["take_profit"],
+                        "time": datetime.now(timezone.utc),  # Mismo reloj que close_time del reconciliador
+                        "pnl": 0.0,
+                        "status": "PENDING",  # Límite en el libro; el reconciliador la abre/cierra
+                        "comment": "Live Trade",
+                    }
+                )
+                instance.cooldown_until = time.monotonic() + 60  # Cooldown
 
-            await asyncio.sleep(5)  # Polling
+    def _on_instrument_error(self, instance, error):
+        self.log(f"❌ Error [{instance.symbol}]: {error}", level="ERROR", code="INSTRUMENT_ERROR", symbol=instance.symbol)
+
+    def get_instrument_stats(self):
+        """Latencia de decisión y estado por instrumento"""
+        if self.runner is None:
+            return []
+        return self.runner.get_stats()
+
+    def get_health(self):
+        """Estado de los componentes para /health"""
+        try:
+            self.model.get_booster()
+            model_loaded = True
+        except Exception:
+            model_loaded = False
+        return {
+            "running": self.is_running,
+            "model_loaded": model_loaded,
+            "replay_cache": self.replay.is_ready(),
+            "instruments": len(self.instruments),
+        }
+
+    def warm_replay(self):
+        """Construye/carga la cache del replay con el modelo del bot (bloqueante)"""
+        return self.replay.ensure_ready(self.model)
 
     # _prepare_features_for_ai ELIMINADO en favor de quant_lab.features.build_features
     # Se mantiene limpio para evitar código muerto.
 
     def stop(self):
         self.is_running = False
-        self.log("🛑 Sistema Detenido.")
+        self.latest_status = "IDLE"
+        self.log("🛑 Sistema Detenido.", code="ENGINE_STOP")
 
     def panic(self):
         self.stop()
-        self.driver.close_all_positions()
-        self.log("🚨 PÁNICO EJECUTADO: Todo cerrado.")
+        self.driver.close_all_positions([sym for sym, _ in self.instruments])
+        self.log("🚨 PÁNICO EJECUTADO: Todo cerrado.", level="WARNING", code="PANIC")
 
-    async def simulate_winning_scenario(self):
+    async def simulate_winning_scenario(self, speed: float = 1.0):
         """
         MODO DEMO:
-        1. Escanea el pasado buscando un Trade REAL con alta probabilidad (>80%).
+        1. Toma del índice precalculado un Trade REAL con alta probabilidad (>82%).
         2. Viaja en el tiempo a ese momento.
-        3. Reproduce la secuencia para mostrarla en la App.
+        3. Reproduce la secuencia para mostrarla en la App a 'speed' x.
         """
         self.stop()
-        await asyncio.sleep(1)
+        await asyncio.sleep(1 / speed)
 
         self.is_running = True  # Para que la app muestre "SISTEMA ACTIVO"
         self.log("🎬 INICIANDO SIMULACIÓN DE ESCENARIO GANADOR...")
         self.latest_status = "Modo Demo: Buscando Setup Perfecto..."
-        await asyncio.sleep(1)
-
-        # 1. Cargar el CSV histórico
-        csv_path = "data_core/datasets/SYNC_DATA_M1.csv"
-        if not os.path.exists(csv_path):
-            self.log("❌ Error Demo: No hay datos históricos.")
-            self.is_running = False
-            return
-
-        df_full = pd.read_csv(csv_path, index_col="time", parse_dates=True)
-        df_full.rename(
-            columns={
-                "nq_open": "open",
-                "nq_high": "high",
-                "nq_low": "low",
-                "nq_close": "close",
-                "nq_vol": "volume",
-            },
-            inplace=True,
-        )
 
-        # 2. Calcular Indicadores
-        df_full = self.indicators.add_all_features(df_full)
-        detector = PO3Detector(df_full)
+        # 1. Cache de replay (indicadores + señales + probabilidades precalculadas)
+        # Si está fría se construye en un thread: el event loop sigue atendiendo.
+        if not self.replay.is_ready():
+            ready = await asyncio.to_thread(self.replay.ensure_ready, self.model)
+            if not ready:
+                self.log("❌ Error Demo: No hay datos históricos.", level="ERROR", code="DEMO_ERROR")
+                self.is_running = False
+                self.latest_status = "IDLE"
+                return
 
-        # 3. Seleccionar el momento exacto del WIN (Basado en tu test anterior)
-        target_index = -1
-
-        # Empezamos desde el final hacia atrás para encontrar lo más reciente
-        total_candles = len(df_full)
-        scan_range = 10000
-        start_search = max(0, total_candles - scan_range)
-
-        print("🔍 Buscando escenario ganador en las últimas velas...")
-
-        # 4. Bucle de Reproducción
-        for i in range(total_candles - 2, start_search, -1):
-            signal = detector.scan_for_signals(i)
-            if signal:
-                # Verificar con IA
-                # Necesitamos cortar el DF para simular el pasado exacto
-                # (Pequeño truco de optimización: usamos features de la fila ya calculada para ir rápido)
-                row = df_full.iloc[i]
-                atr_val = row["ATRr_14"] if row["ATRr_14"] > 0 else 1.0
-
-                # Construcción CORRECTA de features usando la librería centralizada
-                if build_features:
-                    market_ctx = {
-                        "atr": row.get("ATRr_14", 1.0),
-                        "ema_50": row.get("ema_50", 0.0),
-                        "ema_200": row.get("ema_200", 0.0),
-                    }
-                    features = build_features(row, signal["entry_price"], market_ctx)
-                else:
-                    features = None
-
-                # Preguntar a la IA
-                if self.model:
-                    try:
-                        prob = self.model.predict_proba(features)[0][1]
-                        if (
-                            prob > 0.82
-                        ):  # Buscamos una MUY BUENA (>82%) para asegurar el show
-                            target_index = i
-                            print(
-                                f"✅ ¡Encontrado! Índice {i} con probabilidad {prob:.2%}"
-                            )
-                            break
-                    except:
-                        pass
+        # 2. Seleccionar el momento exacto del WIN desde el índice de setups
+        target_index = self.replay.find_setup(min_prob=0.82)
 
         if target_index == -1:
             self.log(
@@ -406,88 +562,75 @@ class BotManager:
             )
             self.log("💡 Sugerencia: Baja el umbral de búsqueda en el código.")
             self.is_running = False
+            self.latest_status = "IDLE"
             return
 
-        # 4. REPRODUCIR EL SHOW
+        # 3. REPRODUCIR EL SHOW
         # Empezamos 3 velas antes del disparo para generar contexto
         start_replay = target_index - 3
+        target = self.replay.candle(target_index)
 
-        self.log(f"⏪ Viajando al {df_full.index[target_index]}...")
-        await asyncio.sleep(2)
+        self.log(f"⏪ Viajando al {target['time']}...")
+        await asyncio.sleep(2 / speed)
 
-        for i in range(start_replay, target_index + 1):
+        async for candle in self.replay.stream(start_replay, target_index, speed=speed):
             if not self.is_running:
                 break
 
-            current_slice = df_full.iloc[: i + 1]
-            row = current_slice.iloc[-1]
-
             # Simular precio en vivo
-            price_nq = row["close"]
+            price_nq = candle["close"]
             price_es = price_nq * 0.25  # Simulación simple del ES relativa al NQ
             self.latest_status = f"Simulando... NQ: {price_nq:.2f} | ES: {price_es:.2f}"
 
-            # Detectar
-            det = PO3Detector(current_slice)
-            signal = det.scan_for_signals(len(current_slice) - 2)
-
-            if signal:
-                self.log(
-                    f"🔎 Patrón {signal['signal_type']} detectado @ {signal['entry_price']}"
-                )
-                await asyncio.sleep(2)
+            signal = candle["signal"]
+            if not signal:
+                continue
 
-                if self.model and build_features:
-                    market_ctx = {
-                        "atr": row.get("ATRr_14", 1.0),
-                        "ema_50": row.get("ema_50", 0.0),
-                        "ema_200": row.get("ema_200", 0.0),
+            self.log(
+                f"🔎 Patrón {signal['signal_type']} detectado @ {signal['entry_price']}"
+            )
+            await asyncio.sleep(2 / speed)
+
+            prob = signal["prob"]
+            if prob is None:
+                continue
+
+            self.log(f"🤖 Consultando IA... Probabilidad: {prob:.2%}")
+            await asyncio.sleep(2 / speed)
+            demo_threshold = 0.60
+
+            if prob >= demo_threshold:
+                self.log(f"✅ IA APROBADO ({prob:.1%}). EJECUTANDO ORDEN SIMULADA...")
+                await asyncio.sleep(1 / speed)
+
+                balance_inicial = 10000.00
+                riesgo = 100.00
+                ganancia = riesgo * 2.0  # 2R
+                balance_final = balance_inicial + ganancia
+
+                self.log(f"🎫 Orden Enviada (DEMO). Ticket: #DEMO-999")
+                self.log(f"💰 Gestión de Riesgo: 2R (Ganancia Est: +${ganancia:.2f})")
+
+                self.latest_status = json.dumps(
+                    {
+                        "type": "TRADE_WIN",
+                        "data": {
+                            "balance_before": balance_inicial,
+                            "balance_after": balance_final,
+                            "profit": ganancia,
+                            "symbol": "USTEC",
+                            "price": signal["entry_price"],
+                            "type": signal["signal_type"],
+                        },
                     }
-                    features = build_features(row, signal["entry_price"], market_ctx)
-                    prob = self.model.predict_proba(features)[0][1]
-
-                    self.log(f"🤖 Consultando IA... Probabilidad: {prob:.2%}")
-                    await asyncio.sleep(2)
-                    demo_threshold = 0.60
-
-                    if prob >= demo_threshold:
-                        self.log(
-                            f"✅ IA APROBADO ({prob:.1%}). EJECUTANDO ORDEN SIMULADA..."
-                        )
-                        await asyncio.sleep(1)
-
-                        balance_inicial = 10000.00
-                        riesgo = 100.00
-                        ganancia = riesgo * 2.0  # 2R
-                        balance_final = balance_inicial + ganancia
-
-                        self.log(f"🎫 Orden Enviada (DEMO). Ticket: #DEMO-999")
-                        self.log(
-                            f"💰 Gestión de Riesgo: 2R (Ganancia Est: +${ganancia:.2f})"
-                        )
-
-                        self.latest_status = json.dumps(
-                            {
-                                "type": "TRADE_WIN",
-                                "data": {
-                                    "balance_before": balance_inicial,
-                                    "balance_after": balance_final,
-                                    "profit": ganancia,
-                                    "symbol": "USTEC",
-                                    "price": signal["entry_price"],
-                                    "type": signal["signal_type"],
-                                },
-                            }
-                        )
-
-                        await asyncio.sleep(5)
-                        self.latest_status = "✨ TRADE EJECUTADO (DEMO) ✨"
+                )
 
-                        break
-                    else:
-                        self.log(f"🛡 IA Rechazó ({prob:.1%}). Buscando otro...")
+                await asyncio.sleep(5 / speed)
+                self.latest_status = "✨ TRADE EJECUTADO (DEMO) ✨"
 
-            await asyncio.sleep(1.5)
+                break
+            else:
+                self.log(f"🛡 IA Rechazó ({prob:.1%}). Buscando otro...")
 
         self.is_running = False
         self.log("🏁 Demo Finalizada.")
@@ -0,0 +1,139 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from data_core.downsample import ohlc_buckets
+from execution_engine.replay_engine import SIGNAL_NAMES
+
+
+def to_epoch_ns(value):
+    """ISO ('2024-01-05 14:30'), epoch en segundos o None -> epoch ns UTC (naive = UTC)"""
+    if value is None or value == "":
+        return None
+    text = str(value)
+    try:
+        return int(float(text) * 1_000_000_000)
+    except ValueError:
+        pass
+    ts = pd.Timestamp(text)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.tz_convert("UTC").value)
+
+
+class ChartData:
+    """
+    Datos de gráficos servidos desde las columnas memory-mapped del ReplayEngine.
+    - Rango de tiempo -> rango de índices con searchsorted (sin leer el CSV).
+    - Velas re-muestreadas al presupuesto de puntos (barras OHLC agregadas).
+    - Señales PO3 del rango (FVG/entrada, nivel barrido, SL/TP, probabilidad IA).
+    - LRU de rangos recientes: la App pide los mismos zooms una y otra vez.
+    """
+
+    def __init__(self, replay, max_entries: int = 128):
+        self.replay = replay
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key, build):
+        key = (self.replay.key,) + key  # Cache nueva => claves nuevas
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        result = build()
+        with self._lock:
+            self._entries[key] = result
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def _bounds(self, start, end):
+        """[i0, i1) de las velas con start <= time <= end"""
+        times = self.replay.arrays["time"]
+        start_ns, end_ns = to_epoch_ns(start), to_epoch_ns(end)
+        i0 = 0 if start_ns is None else int(np.searchsorted(times, start_ns, side="left"))
+        i1 = len(times) if end_ns is None else int(np.searchsorted(times, end_ns, side="right"))
+        return i0, max(i0, i1)
+
+    @staticmethod
+    def _iso(ns):
+        return str(pd.Timestamp(int(ns), tz="UTC"))
+
+    def candles(self, start=None, end=None, points: int = 800):
+        i0, i1 = self._bounds(start, end)
+        return self._cached(("candles", i0, i1, points), lambda: self._build_candles(i0, i1, points))
+
+    def _build_candles(self, i0, i1, points):
+        a = self.replay.arrays
+        starts, o, h, l, c = ohlc_buckets(
+            a["open"][i0:i1], a["high"][i0:i1], a["low"][i0:i1], a["close"][i0:i1], points
+        )
+        times = a["time"][i0:i1][starts] if len(starts) else []
+        step = int(starts[1] - starts[0]) if len(starts) > 1 else 1
+        return {
+            "from": self._iso(a["time"][i0]) if i1 > i0 else None,
+            "to": self._iso(a["time"][i1 - 1]) if i1 > i0 else None,
+            "total_candles": i1 - i0,
+            "candles_per_bar": step,
+            "points": int(len(starts)),
+            "candles": [
+                {
+                    "time": self._iso(t),
+                    "open": round(float(o[k]), 5),
+                    "high": round(float(h[k]), 5),
+                    "low": round(float(l[k]), 5),
+                    "close": round(float(c[k]), 5),
+                }
+                for k, t in enumerate(times)
+            ],
+        }
+
+    def signals(self, start=None, end=None, min_prob: float = 0.0, limit: int = 500):
+        i0, i1 = self._bounds(start, end)
+        return self._cached(
+            ("signals", i0, i1, min_prob, limit),
+            lambda: self._build_signals(i0, i1, min_prob, limit),
+        )
+
+    def _build_signals(self, i0, i1, min_prob, limit):
+        a = self.replay.arrays
+        idx = i0 + np.flatnonzero(a["signal"][i0:i1])
+        prob = a["prob"][idx]
+        if min_prob > 0:
+            keep = prob >= min_prob  # NaN (sin IA) queda fuera
+            idx, prob = idx[keep], prob[keep]
+
+        total = len(idx)
+        if total > limit:
+            # Presupuesto: las de mayor probabilidad, de vuelta en orden temporal
+            best = np.argsort(np.nan_to_num(prob, nan=-1.0), kind="stable")[-limit:]
+            idx = idx[np.sort(best)]
+
+        def num(v):
+            return None if np.isnan(v) else round(float(v), 5)
+
+        return {
+            "total_signals": total,
+            "points": int(len(idx)),
+            "truncated": total > len(idx),
+            "signals": [
+                {
+                    "index": int(i),
+                    "time": self._iso(a["time"][i]),
+                    "signal_type": SIGNAL_NAMES[int(a["signal"][i])],
+                    "entry_price": num(a["entry"][i]),  # Borde del FVG
+                    "sweep_level": num(a["sweep"][i]),
+                    "stop_loss": num(a["sl"][i]),
+                    "take_profit": num(a["tp"][i]),
+                    "prob": num(a["prob"][i]),
+                }
+                for i in idx
+            ],
+        }
@@ -0,0 +1,560 @@
+import asyncio
+import json
+import os
+import secrets
+import signal
+import struct
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from execution_engine.loop_monitor import LoopMonitor, lag_guard
+from execution_engine.metrics import REGISTRY
+
+# Canal local motor <-> API (ENGINE_MODE=remote en el servidor)
+ENGINE_SHM = os.getenv("ENGINE_SHM", "po3_engine_state")
+ENGINE_SHM_SIZE = int(os.getenv("ENGINE_SHM_SIZE", str(1 << 20)))
+ENGINE_ADDRESS = (os.getenv("ENGINE_HOST", "127.0.0.1"), int(os.getenv("ENGINE_PORT", "6001")))
+# Sin ENGINE_AUTHKEY el motor genera una clave aleatoria en este archivo (0600)
+ENGINE_AUTHKEY_FILE = os.getenv("ENGINE_AUTHKEY_FILE", "execution_engine/data/engine.key")
+PUBLISH_INTERVAL = float(os.getenv("ENGINE_PUBLISH_INTERVAL", "0.5"))
+# Segundos que 'start' espera el acuse del loop (runner + grabación listos)
+START_ACK_TIMEOUT = float(os.getenv("START_ACK_TIMEOUT", "10"))
+
+
+
+def load_authkey(create: bool = False) -> bytes:
+    """
+    Clave del canal de comandos: ENGINE_AUTHKEY o el archivo de clave. El motor
+    (create=True) lo genera si falta; la API solo lo lee. Nunca una clave fija.
+    """
+    key = os.getenv("ENGINE_AUTHKEY")
+    if key:
+        return key.encode()
+    try:
+        with open(ENGINE_AUTHKEY_FILE, "rb") as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        key = b""
+    if key:
+        return key
+    if not create:
+        raise RuntimeError(f"Sin clave del motor: defina ENGINE_AUTHKEY o arranque el motor ({ENGINE_AUTHKEY_FILE})")
+    os.makedirs(os.path.dirname(ENGINE_AUTHKEY_FILE) or ".", exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    # O_EXCL: si otro proceso la creó primero, usamos la suya
+    try:
+        fd = os.open(ENGINE_AUTHKEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return load_authkey()
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def _send_json(conn, message):
+    # JSON y no pickle: un mensaje del canal nunca ejecuta código al decodificarse
+    conn.send_bytes(json.dumps(message, default=str).encode())
+
+
+def _recv_json(conn):
+    return json.loads(conn.recv_bytes())
+
+
+# Cabecera: [seq u64][length u64][pid del motor dueño u64]; seq impar = escritura en curso
+HEADER = struct.Struct("<QQQ")
+
+# Comandos de control: conexión propia, nunca detrás de una consulta lenta
+CONTROL_COMMANDS = frozenset({"ping", "start", "simulate", "stop", "panic", "settings"})
+
+
+class SharedState:
+    """
+    Snapshot del motor en memoria compartida con un seqlock.
+    Un único escritor (el motor) y N lectores (workers de uvicorn) sin locks:
+    el lector reintenta si la secuencia cambió (o era impar) mientras copiaba.
+    """
+
+    def __init__(self, name=ENGINE_SHM, size=ENGINE_SHM_SIZE, create=False):
+        self.create = create
+        self._seq = 0
+        if create:
+            self.shm = self._claim(name, size)
+            # Segmento nuevo: cabecera en cero. Reutilizado: se conserva el último snapshot
+            _, length, _ = HEADER.unpack_from(self.shm.buf, 0)
+            HEADER.pack_into(self.shm.buf, 0, self._seq, length, os.getpid())
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if os.name == "posix":
+                # El lector no es dueño del segmento: que su resource_tracker no lo borre al salir
+                try:
+                    from multiprocessing import resource_tracker
+
+                    resource_tracker.unregister(self.shm._name, "shared_memory")
+                except Exception:
+                    pass
+        self.capacity = self.shm.size - HEADER.size
+        self._cached_seq = None
+        self._cached = None
+
+    def _claim(self, name, size):
+        """
+        Segmento del motor. Uno previo con el mismo nombre solo se reemplaza si
+        su dueño (pid en la cabecera) ya no existe: con otro motor vivo se falla.
+        """
+        try:
+            old = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return shared_memory.SharedMemory(name=name, create=True, size=size)
+        seq, _, owner = HEADER.unpack_from(old.buf, 0) if old.size >= HEADER.size else (0, 0, 0)
+        if owner and _pid_alive(owner):
+            old.close()
+            raise RuntimeError(f"La memoria '{name}' es del motor pid {owner}, que sigue vivo: ¿otro motor corriendo?")
+        if os.name == "nt":
+            # Windows no tiene unlink: el segmento vive mientras un lector lo tenga abierto; se reutiliza
+            if old.size < size:
+                old.close()
+                raise RuntimeError(f"La memoria '{name}' sigue abierta por lectores con {old.size} bytes (< {size})")
+            self._seq = seq + (seq & 1)  # Seguir la secuencia: los lectores no confunden versiones
+            return old
+        # Restos de un motor anterior que no cerró limpio
+        old.close()
+        old.unlink()
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+    def publish(self, state: dict):
+        payload = json.dumps(state, default=str).encode()
+        if len(payload) > self.capacity:
+            raise ValueError(f"Snapshot de {len(payload)} bytes excede {self.capacity}")
+        buf = self.shm.buf
+        pid = os.getpid()
+        self._seq += 1  # impar: escribiendo
+        HEADER.pack_into(buf, 0, self._seq, 0, pid)
+        buf[HEADER.size : HEADER.size + len(payload)] = payload
+        self._seq += 1  # par: consistente
+        HEADER.pack_into(buf, 0, self._seq, len(payload), pid)
+
+    def read(self, retries: int = 100):
+        """Último snapshot consistente (parseado una sola vez por versión)"""
+        buf = self.shm.buf
+        for _ in range(retries):
+            seq, length, _ = HEADER.unpack_from(buf, 0)
+            if seq & 1:
+                time.sleep(0)
+                continue
+            if seq == self._cached_seq:
+                return self._cached
+            payload = bytes(buf[HEADER.size : HEADER.size + length])
+            if HEADER.unpack_from(buf, 0)[0] != seq:
+                continue  # El motor escribió mientras copiábamos
+            self._cached_seq, self._cached = seq, json.loads(payload) if length else None
+            return self._cached
+        return self._cached
+
+    def close(self):
+        if self.create:
+            # Sin dueño: el próximo motor puede tomar el segmento aunque un lector lo retenga
+            seq, length, _ = HEADER.unpack_from(self.shm.buf, 0)
+            HEADER.pack_into(self.shm.buf, 0, seq, length, 0)
+        self.shm.close()
+        if self.create:
+            self.shm.unlink()
+
+
+def _pid_alive(pid: int) -> bool:
+    """¿Existe el proceso? (os.kill(pid, 0) en Windows lo terminaría: ahí se consulta con OpenProcess)"""
+    if not 0 < pid < 2**31:
+        return False  # Cabecera de otro formato: no es un pid
+    if os.name == "nt":
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Existe, de otro usuario
+    return True
+
+
+# --- MOTOR (proceso propio: python execution_engine/engine_process.py) ---
+def build_snapshot(bot, monitor=None):
+    """Todo lo que la API lee del bot (WebSocket, /health, settings, /metrics/loop)"""
+    return {
+        "loop": monitor.snapshot() if monitor is not None else None,
+        "published_at": time.time(),
+        "running": bot.is_running,
+        "status_text": bot.latest_status,
+        "logs": bot.recent_logs(50),
+        "log_seq": bot.log_store.last_seq,
+        "threshold": bot.threshold,
+        "account": bot.get_balance_equity(),
+        "settings": bot.get_settings(),
+        "statistics": bot.get_statistics(),
+        "recent_trades": bot.get_recent_trades(20),
+        "demo_statistics": bot.get_demo_statistics(),
+        "instruments": bot.get_instrument_stats(),
+        "health": bot.get_health(),
+    }
+
+
+class EngineServer:
+    """
+    Aloja el BotManager: publica snapshots en SharedState y atiende comandos
+    (start/stop/panic/settings/simulate/trades) por multiprocessing.connection.
+    """
+
+    def __init__(self, bot, state: SharedState, address=ENGINE_ADDRESS, authkey=None):
+        self.bot = bot
+        self.state = state
+        self.address = address
+        self.authkey = authkey or load_authkey(create=True)
+        self.loop = None
+        # El loop de trading vive aquí: el watchdog protege a este proceso
+        self.monitor = LoopMonitor(on_lag=lag_guard(lambda: self.bot))
+        # El seqlock admite un solo escritor: loop de publicación y comandos se turnan
+        self._publish_lock = threading.Lock()
+        self._warmup = None
+        self._warmup_lock = threading.Lock()
+        self._start_lock = threading.Lock()  # Dos workers de la API no arrancan dos loops
+
+    def publish(self):
+        snapshot = build_snapshot(self.bot, self.monitor)
+        with self._publish_lock:
+            try:
+                self.state.publish(snapshot)
+            except ValueError as e:
+                print(f"⚠ MOTOR: {e}")
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.monitor.start()
+        listener = Listener(self.address, authkey=self.authkey)
+        threading.Thread(target=self._accept, args=(listener,), name="engine-commands", daemon=True).start()
+        print(f"⚙ MOTOR: comandos en {self.address}, estado en '{self.state.shm.name}'")
+        try:
+            while True:
+                # La foto toca MT5 (cuenta): fuera del loop de trading
+                await asyncio.to_thread(self.publish)
+                await asyncio.sleep(PUBLISH_INTERVAL)
+        finally:
+            self.monitor.stop()
+            listener.close()
+
+    def _accept(self, listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return  # Listener cerrado
+            except Exception as e:
+                print(f"⚠ MOTOR: conexión rechazada ({e})")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = _recv_json(conn)
+                except (EOFError, OSError, ValueError):
+                    return  # Cerrado o mensaje que no es JSON: se corta la conexión
+                try:
+                    cmd = request.get("cmd")
+                    reply = self.handle(cmd, request.get("args", {}))
+                    if cmd in ("stop", "panic", "settings"):
+                        self.publish()  # La API lee su propio cambio en la respuesta siguiente
+                except Exception as e:
+                    reply = {"status": "error", "message": f"{type(e).__name__}: {e}"}
+                try:
+                    _send_json(conn, reply)
+                except OSError:
+                    return
+
+    def handle(self, cmd, args):
+        bot = self.bot
+        if cmd == "ping":
+            return {"status": "ok"}
+        if cmd == "start":
+            with self._start_lock:
+                if bot.is_running:
+                    return {"status": "already_running"}
+                return self._start()
+        if cmd == "simulate":
+            if bot.is_running:
+                return {"status": "error"}
+            asyncio.run_coroutine_threadsafe(bot.simulate_winning_scenario(speed=args["speed"]), self.loop)
+            return {"status": "simulation_started"}
+        if cmd == "stop":
+            bot.stop()
+            return {"status": "stopped"}
+        if cmd == "panic":
+            bot.panic()
+            return {"status": "panic_executed"}
+        if cmd == "settings":
+            bot.update_settings(args["risk"], args["auto_trade"])
+            return {"status": "ok", "settings": bot.get_settings()}
+        if cmd == "trades":
+            journal = bot.demo_journal if args.pop("demo", False) else bot.journal
+            return journal.get_trades(**args)
+        if cmd == "logs":
+            return bot.get_logs(**args)
+        if cmd == "metrics":
+            return {"status": "ok", "text": REGISTRY.expose(skip_empty=True)}
+        if cmd == "warm_replay":
+            return {"status": "ok", "ready": self._warm_replay()}
+        return {"status": "error", "message": f"Comando desconocido: {cmd}"}
+
+    def _start(self):
+        """Arranca el loop y responde recién con su acuse (o con el error que lo tumbó)"""
+        started = threading.Event()
+        future = asyncio.run_coroutine_threadsafe(self.bot.start_loop(on_started=started.set), self.loop)
+        future.add_done_callback(lambda _: started.set())
+        if not started.wait(START_ACK_TIMEOUT):
+            return {"status": "error", "message": f"El loop no confirmó el arranque en {START_ACK_TIMEOUT:g}s"}
+        if future.done():
+            exc = None if future.cancelled() else future.exception()
+            detail = f"{type(exc).__name__}: {exc}" if exc else "terminó sin arrancar"
+            return {"status": "error", "message": f"El loop no arrancó ({detail})"}
+        return {"status": "started"}
+
+    def _warm_replay(self):
+        """
+        La primera construcción del replay tarda decenas de segundos: corre en
+        su propio thread y la API reintenta hasta que is_ready().
+        """
+        with self._warmup_lock:
+            if self.bot.replay.is_ready():
+                return True
+            if self._warmup is None or not self._warmup.is_alive():
+                self._warmup = threading.Thread(target=self.bot.warm_replay, name="replay-warmup", daemon=True)
+                self._warmup.start()
+            return False
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve_engine():
+    from execution_engine.bot_manager import BotManager
+
+    # terminate() / kill del servicio: cerrar igual que con Ctrl+C (libera la memoria compartida)
+    signal.signal(signal.SIGTERM, _interrupt)
+    # Antes de conectar con la terminal: con otro motor vivo, falla aquí
+    state = SharedState(create=True)
+    bot = None
+    try:
+        bot = BotManager()
+        asyncio.run(EngineServer(bot, state).run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if bot is not None:
+            bot.stop()
+        state.close()
+        print("⚙ MOTOR: APAGADO")
+
+
+# --- PROXY (lado API) ---
+class EngineCommandError(RuntimeError):
+    """El motor respondió status=error a un comando (la API no debe fingir éxito)"""
+
+
+class _RemoteJournal:
+    def __init__(self, remote, demo):
+        self.remote = remote
+        self.demo = demo
+
+    def get_trades(self, page=1, page_size=50, symbol=None, status=None, since=None, until=None):
+        return self.remote.call(
+            "trades",
+            demo=self.demo,
+            page=page,
+            page_size=page_size,
+            symbol=symbol,
+            status=status,
+            since=since,
+            until=until,
+        )
+
+
+class RemoteBot:
+    """
+    Misma interfaz que BotManager para server.py, respaldada por el motor remoto:
+    lecturas desde el snapshot compartido (sin tocar la terminal), comandos por
+    el canal. Cada worker de uvicorn tiene el suyo.
+    """
+
+    STALE_SECONDS = 5.0
+    # Snapshot más viejo que esto: ¿el motor se reinició con un segmento nuevo?
+    REATTACH_AGE = max(2 * PUBLISH_INTERVAL, 1.0)
+    REATTACH_INTERVAL = 1.0
+
+    def __init__(self, connect_timeout: float = 30.0):
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                self.state = SharedState()
+                if self.state.read() is not None:
+                    break
+            except FileNotFoundError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Motor no disponible (memoria '{ENGINE_SHM}' sin publicar)")
+            time.sleep(0.2)
+
+        # Un canal por clase de comando: un panic no espera detrás de logs/trades
+        self._channels = {"control": [None, threading.Lock()], "query": [None, threading.Lock()]}
+        self._replay = None
+        self._last_reattach = 0.0
+        self._authkey = load_authkey()
+        self.journal = _RemoteJournal(self, demo=False)
+        self.demo_journal = _RemoteJournal(self, demo=True)
+
+    # --- Canal de comandos ---
+    def call(self, cmd, **args):
+        channel = self._channels["control" if cmd in CONTROL_COMMANDS else "query"]
+        with channel[1]:
+            for attempt in range(2):
+                try:
+                    if channel[0] is None:
+                        channel[0] = Client(ENGINE_ADDRESS, authkey=self._authkey)
+                    _send_json(channel[0], {"cmd": cmd, "args": args})
+                    return _recv_json(channel[0])
+                except (OSError, EOFError):
+                    # Motor reiniciado: reconectar una vez
+                    channel[0] = None
+                    if attempt:
+                        raise
+
+    def command(self, cmd, **args):
+        """Comando de control: EngineCommandError si el motor reporta error"""
+        reply = self.call(cmd, **args)
+        if isinstance(reply, dict) and reply.get("status") == "error":
+            raise EngineCommandError(reply.get("message") or f"El motor rechazó '{cmd}'")
+        return reply
+
+    # --- Lecturas (snapshot) ---
+    @property
+    def snapshot(self):
+        snap = self.state.read()
+        if time.time() - snap["published_at"] > self.REATTACH_AGE:
+            snap = self._reattach(snap)
+        return snap
+
+    def _reattach(self, snap):
+        """
+        Un motor reiniciado borra y recrea el segmento (SharedState(create=True)):
+        el que tenemos mapeado queda congelado para siempre. Si bajo el mismo
+        nombre hay un snapshot más nuevo, pasamos a leer ese.
+        """
+        now = time.monotonic()
+        if now - self._last_reattach < self.REATTACH_INTERVAL:
+            return snap
+        self._last_reattach = now
+        try:
+            fresh = SharedState()
+        except FileNotFoundError:
+            return snap  # Motor caído: seguimos con la última foto (get_health la marca vieja)
+        latest = fresh.read()
+        if latest is None or latest["published_at"] <= snap["published_at"]:
+            return snap  # Mismo segmento (motor lento, no reiniciado)
+        # El segmento viejo no se cierra a mano: otro thread puede estar copiándolo
+        self.state = fresh
+        return latest
+
+    @property
+    def is_running(self):
+        # Foto vieja = no sabemos: que decida el motor (start responde already_running)
+        snap = self.snapshot
+        return snap["running"] and time.time() - snap["published_at"] < self.STALE_SECONDS
+
+    @property
+    def latest_status(self):
+        return self.snapshot["status_text"]
+
+    def recent_logs(self, n: int = 15):
+        return self.snapshot["logs"][-n:]
+
+    def get_logs(self, since: int = 0, limit: int = 200, level: str = None):
+        # El ring vive en el motor: solo viaja lo nuevo desde 'since'
+        return self.call("logs", since=since, limit=limit, level=level)
+
+    @property
+    def threshold(self):
+        return self.snapshot["threshold"]
+
+    def get_balance_equity(self):
+        return self.snapshot["account"]
+
+    def get_settings(self):
+        return self.snapshot["settings"]
+
+    def get_statistics(self):
+        return self.snapshot["statistics"]
+
+    def get_recent_trades(self, n: int = 20):
+        # Orden cronológico (TradeJournal.recent): los más recientes van al final
+        trades = self.snapshot["recent_trades"]
+        return trades[-n:] if n > 0 else []
+
+    def get_demo_statistics(self):
+        return self.snapshot["demo_statistics"]
+
+    def get_instrument_stats(self):
+        return self.snapshot["instruments"]
+
+    def get_health(self):
+        snap = self.snapshot
+        age = time.time() - snap["published_at"]
+        return {**snap["health"], "engine": "remote", "snapshot_age": round(age, 3), "engine_alive": age < self.STALE_SECONDS}
+
+    # --- Comandos ---
+    async def start_loop(self):
+        """Respuesta del motor ya con el loop arrancado; EngineCommandError si no arrancó"""
+        return await asyncio.to_thread(self.command, "start")
+
+    async def simulate_winning_scenario(self, speed: float = 1.0):
+        await asyncio.to_thread(self.command, "simulate", speed=speed)
+
+    def stop(self):
+        self.command("stop")
+
+    def panic(self):
+        self.command("panic")
+
+    def update_settings(self, risk_percent: float, auto_trade: bool):
+        self.command("settings", risk=risk_percent, auto_trade=auto_trade)
+
+    # --- Replay (gráficos): la cache la construye el motor, aquí solo se mapea ---
+    @property
+    def replay(self):
+        if self._replay is None:
+            from execution_engine.replay_engine import ReplayEngine
+
+            self._replay = ReplayEngine()
+        return self._replay
+
+    def warm_replay(self):
+        if not self.call("warm_replay").get("ready"):
+            return False
+        # Solo mapea la cache con probabilidades que construyó el motor
+        return self.replay.ensure_ready(None, with_model=self.snapshot["health"].get("model_loaded", True))
+
+
+if __name__ == "__main__":
+    # Motor de trading en su propio proceso; la API con ENGINE_MODE=remote
+    serve_engine()
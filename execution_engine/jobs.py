@@ -0,0 +1,308 @@
+import asyncio
+import itertools
+import json
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Tipo de job -> última etapa del pipeline de quant_lab
+JOB_KINDS = {
+    "pipeline": None,  # DAG completo
+    "dataset": "labels",
+    "train": "model",
+    "backtest": "backtest",
+}
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "QUEUED", "RUNNING", "DONE", "FAILED", "CANCELLED"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Segundos que un job cancelado tiene para cerrar sus pools antes de matarlo entero
+CANCEL_GRACE = float(os.getenv("JOB_CANCEL_GRACE", "5"))
+
+
+def _watch_cancel(cancel):
+    """
+    Thread del hijo: al cancelar, termina primero sus propios procesos (workers
+    de los ProcessPool de build_dataset / labeler / robustness) y luego sale.
+    """
+    cancel.wait()
+    children = mp.active_children()
+    for child in children:
+        child.terminate()
+    for child in children:
+        child.join(timeout=2)
+    os._exit(1)
+
+
+def _job_main(params, events, cancel):
+    """
+    Proceso hijo: corre el pipeline y reenvía cada evento de etapa por la cola.
+    Los artefactos (datasets, modelo, reporte, corrida en el historial) los
+    escribe este proceso: ni el loop de trading ni el del servidor esperan I/O.
+    En POSIX el job abre su propio grupo de procesos (sus workers lo heredan):
+    si no atiende la cancelación, el servidor mata el grupo entero.
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    threading.Thread(target=_watch_cancel, args=(cancel,), name="job-cancel", daemon=True).start()
+
+    from quant_lab.pipeline import run_pipeline
+
+    def on_event(event):
+        event = {**event, "type": "stage", "ts": time.time()}
+        # Resultado parcial: el resumen del backtest apenas termina su etapa
+        if event["stage"] == "backtest" and event.get("path") and event["status"] in ("RUN", "HIT"):
+            try:
+                with open(os.path.join(event["path"], "backtest_results.json"), "r") as f:
+                    event["summary"] = json.load(f).get("summary")
+            except (OSError, ValueError):
+                pass
+        events.put(event)
+
+    try:
+        report = run_pipeline(
+            until=params["until"],
+            force=set(params["force"]),
+            overrides=params["overrides"],
+            publish=params["publish"],
+            on_event=on_event,
+        )
+        events.put({"type": "result", "report": report, "ts": time.time()})
+    except Exception as e:
+        events.put({"type": "error", "error": f"{type(e).__name__}: {e}", "ts": time.time()})
+
+
+class Job:
+    def __init__(self, job_id, kind, params):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.events = []
+        self.report = None
+        self.error = None
+        self.process = None
+        self.cancel_event = None
+        self.cancel_requested = False
+
+    def to_dict(self, events=True):
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "seconds": round((self.finished or time.time()) - self.started, 3) if self.started else None,
+            "error": self.error,
+            "report": self.report,
+        }
+        if events:
+            data["events"] = self.events
+        return data
+
+
+class JobManager:
+    """
+    Jobs de quant_lab (dataset, entrenamiento, backtest) lanzados desde el servidor.
+    - Un proceso por job y un semáforo que limita cuántos corren a la vez; el
+      resto queda en cola. Cancelar avisa al job (cierra sus pools y sale) y,
+      pasado CANCEL_GRACE, mata su grupo de procesos (o el proceso en Windows).
+    - El progreso llega por una multiprocessing.Queue y se difunde a los
+      suscriptores (WebSocket) como eventos.
+    - Historial acotado en memoria (los artefactos viven en quant_lab/artifacts).
+    - Un pool de procesos compartido (executor) para cálculos cortos que el
+      servidor sirve al momento (robustez): se crea al primer uso y se reutiliza.
+    """
+
+    def __init__(self, max_concurrent: int = None, max_history: int = 50):
+        self.max_concurrent = max_concurrent or int(os.getenv("MAX_JOBS", "1"))
+        self.max_history = max_history
+        # spawn: el hijo no hereda threads ni la conexión MT5 del servidor
+        self._ctx = mp.get_context("spawn")
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._subscribers = set()
+        self._tasks = set()
+        self.compute_workers = int(os.getenv("COMPUTE_WORKERS", "0")) or os.cpu_count() or 1
+        self._executor = None
+
+    # --- API ---
+    def submit(self, kind="backtest", until=None, force=(), overrides=None, publish=True):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Tipo de job desconocido: {kind} (usa {', '.join(JOB_KINDS)})")
+        params = {
+            "until": until or JOB_KINDS[kind],
+            "force": list(force),
+            "overrides": overrides or {},
+            "publish": publish,
+        }
+        job = Job(next(self._ids), kind, params)
+        self._jobs[job.id] = job
+        self._trim_history()
+
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._publish(job, {"type": "status", "status": QUEUED})
+        return job
+
+    def get(self, job_id: int):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return [job.to_dict(events=False) for job in reversed(self._jobs.values())]
+
+    def cancel(self, job_id: int, grace: float = CANCEL_GRACE):
+        """Cancela un job en cola o en curso. False si no existe o ya terminó."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return False
+        job.cancel_requested = True
+        if job.process is not None and job.process.is_alive():
+            job.cancel_event.set()
+            if grace > 0:
+                asyncio.get_running_loop().call_later(grace, self._kill_if_alive, job.process)
+            else:
+                self._kill(job.process)
+        return True
+
+    @property
+    def executor(self):
+        """Pool compartido (spawn, como los jobs) para cálculos bajo demanda del servidor"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.compute_workers, mp_context=self._ctx)
+        return self._executor
+
+    def shutdown(self):
+        for job in self._jobs.values():
+            if job.status not in FINISHED:
+                self.cancel(job.id, grace=0)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # --- SUSCRIPCIONES (WebSocket) ---
+    def subscribe(self):
+        q = asyncio.Queue(maxsize=1000)
+        self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        self._subscribers.discard(q)
+
+    def _publish(self, job, event):
+        event = {"job_id": job.id, "kind": job.kind, **event}
+        for q in list(self._subscribers):
+            try:
+                q.put_nowait(event)
+            except asyncio.QueueFull:
+                pass  # Cliente lento: pierde eventos intermedios, no frena al resto
+
+    # --- EJECUCIÓN ---
+    async def _run(self, job):
+        async with self._slots:
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+                return
+
+            events = self._ctx.Queue()
+            job.cancel_event = self._ctx.Event()
+            proc = self._ctx.Process(
+                target=_job_main, args=(job.params, events, job.cancel_event), name=f"job-{job.id}"
+            )
+            proc.start()
+            job.process, job.status, job.started = proc, RUNNING, time.time()
+            self._publish(job, {"type": "status", "status": RUNNING})
+
+            # Lectura de la cola en un thread: el event loop nunca bloquea
+            while True:
+                event = await asyncio.to_thread(self._next_event, events, proc)
+                if event is None:
+                    break
+                self._on_event(job, event)
+
+            await asyncio.to_thread(proc.join)
+            events.close()
+
+        if job.cancel_requested:
+            self._kill(proc)  # Workers que hayan sobrevivido al job en su grupo
+            self._finish(job, CANCELLED)
+        elif job.error or proc.exitcode != 0 or job.report is None:
+            job.error = job.error or f"El proceso terminó con código {proc.exitcode}"
+            self._finish(job, FAILED)
+        else:
+            self._finish(job, DONE)
+
+    @staticmethod
+    def _kill(proc):
+        """Mata el job y todo su grupo de procesos (POSIX) o solo el proceso (Windows)"""
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass  # Grupo ya vacío
+        elif proc.is_alive():
+            proc.kill()
+
+    @classmethod
+    def _kill_if_alive(cls, proc):
+        """Plazo de gracia vencido: el job no atendió la cancelación"""
+        if proc.is_alive():
+            cls._kill(proc)
+
+    @staticmethod
+    def _next_event(events, proc):
+        """Próximo evento del hijo; None cuando terminó y la cola quedó vacía"""
+        while True:
+            try:
+                return events.get(timeout=0.5)
+            except queue.Empty:
+                if not proc.is_alive():
+                    try:
+                        return events.get_nowait()
+                    except (queue.Empty, OSError, EOFError):
+                        return None
+            except (OSError, EOFError, ValueError):
+                return None  # Cola rota (proceso terminado a mitad de escritura)
+
+    def _on_event(self, job, event):
+        kind = event.pop("type")
+        if kind == "result":
+            job.report = event["report"]
+            failed = [r for r in job.report if r["status"] == "FAILED"]
+            if failed:
+                job.error = next(
+                    (e.get("error") for e in job.events if e.get("status") == "FAILED"),
+                    f"Etapa '{failed[0]['stage']}' falló",
+                )
+            return
+        if kind == "error":
+            job.error = event["error"]
+            return
+        job.events.append(event)
+        self._publish(job, {"type": "stage", **event})
+
+    def _finish(self, job, status):
+        job.status, job.finished, job.process = status, time.time(), None
+        self._publish(job, {"type": "status", "status": status, "error": job.error, "report": job.report})
+
+    def _trim_history(self):
+        while len(self._jobs) > self.max_history:
+            oldest = next((jid for jid, j in self._jobs.items() if j.status in FINISHED), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
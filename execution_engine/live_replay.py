@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from data_core.indicator_stream import IndicatorStream
+from data_core.indicators import Indicators
+from data_core.po3_logic import PO3Detector
+from data_core.session_calendar import DATA_TZ, localize_index
+from execution_engine.market_recorder import (
+    DELTA,
+    EVAL,
+    FEATURES,
+    FRAME,
+    KIND_NAMES,
+    ORDER,
+    PROB,
+    SESSION,
+    SIGNAL,
+    apply_delta,
+    encode_json,
+    file_sha256,
+    iter_records,
+    unpack_columns,
+)
+from execution_engine.strategy_runner import signal_key_of
+
+try:
+    from quant_lab.features import build_features
+except ImportError:
+    build_features = None
+
+STAGES = ("frames", "indicators", "detector", "features", "model")
+
+
+def _normalized(obj):
+    """Misma serialización que al grabar: comparar bit a bit sin tipos pandas/numpy"""
+    return json.loads(encode_json(obj))
+
+
+class LiveReplay:
+    """
+    Post-mortem de una sesión en vivo grabada por MarketRecorder.
+    Reconstruye cada frame (completo + deltas) y vuelve a pasar cada evaluación
+    por Indicators -> PO3Detector -> build_features -> modelo, a máxima
+    velocidad, comparando con lo que el motor registró en su momento.
+    Los indicadores se actualizan como en vivo: un IndicatorStream por
+    (símbolo, n) alimentado con cada frame grabado, en el mismo orden.
+    """
+
+    def __init__(self, path, model_path=None, history: int = 8):
+        self.path = path
+        self.model_path = model_path
+        self.history = history  # Versiones de frame retenidas por (símbolo, n)
+        self.indicators = Indicators()
+        self.session = None
+        self.model = None
+        self.model_mismatch = False
+
+    # --- PASADA 1: decisiones grabadas (registros chicos) ---
+    def _load_decisions(self):
+        decisions = {}
+        counts = {name: 0 for name in KIND_NAMES.values()}
+        for kind, _, payload in iter_records(self.path):
+            name = KIND_NAMES.get(kind, "unknown")
+            counts[name] = counts.get(name, 0) + 1
+            if kind == SESSION:
+                self.session = json.loads(payload)
+            elif kind in (SIGNAL, FEATURES, PROB, ORDER):
+                data = json.loads(payload)
+                decisions.setdefault(data.pop("eval"), {})[KIND_NAMES[kind]] = data
+        return decisions, counts
+
+    def _load_model(self):
+        path = self.model_path or (self.session or {}).get("model_path")
+        if not path or not os.path.exists(path):
+            print("⚠ Sin modelo: se reproducen señales y features, no probabilidades.")
+            return
+        import xgboost as xgb
+
+        self.model = xgb.XGBClassifier()
+        self.model.load_model(path)
+        recorded = (self.session or {}).get("model_sha256")
+        if recorded and file_sha256(path) != recorded:
+            self.model_mismatch = True
+            print(f"⚠ {path} no es el modelo de la sesión: las probabilidades pueden diferir.")
+
+    # --- FRAMES ---
+    def _to_frame(self, meta, cols):
+        # Epoch ns (grabaciones antiguas: datetime64 naive; astype no lo cambia)
+        index = pd.DatetimeIndex(np.asarray(cols["__index__"]).astype("datetime64[ns]"), name=meta.get("index_name"))
+        if meta.get("tz"):
+            index = index.tz_localize("UTC").tz_convert(meta["tz"])
+        else:
+            # Velas naive: hora del servidor según el DATA_TZ de la sesión, no el de este entorno
+            index = localize_index(index, (self.session or {}).get("data_tz", DATA_TZ))
+        return pd.DataFrame({name: arr for name, arr in cols.items() if name != "__index__"}, index=index)
+
+    def _store(self, frames, key, version, cols, meta=None):
+        """meta solo con FRAME (índice/tz); los deltas heredan la del frame completo"""
+        entry = frames.get(key)
+        versions = entry[1] if entry else OrderedDict()
+        frames[key] = (meta or entry[0], versions)
+        versions[version] = cols
+        while len(versions) > self.history:
+            versions.popitem(last=False)
+
+    # --- PASADA 2: reproducir ---
+    def run(self, symbol=None, limit=None, on_result=None):
+        decisions, counts = self._load_decisions()
+        self._load_model()
+        # Mismos parámetros de pools que la sesión grabada (POOL_MAX_AGE puede diferir aquí)
+        recorded = (self.session or {}).get("indicators") or {}
+        if "pool_max_age" in recorded:
+            self.indicators = Indicators(pool_max_age=recorded["pool_max_age"])
+
+        frames = {}  # (símbolo, n) -> (meta del frame completo, {versión: columnas})
+        features = {}  # (símbolo, n) -> {versión: frame con indicadores}
+        streams = {}  # (símbolo, n) -> IndicatorStream (misma secuencia que la CandleCache)
+        data_tz = (self.session or {}).get("data_tz", DATA_TZ)
+        last_keys = {}
+        timings = dict.fromkeys(STAGES, 0.0)
+        stats = {"evals": 0, "signals": 0, "new_signals": 0, "ai": 0, "approved": 0, "orders": 0}
+        mismatches = []
+        t_start = time.perf_counter()
+
+        for kind, _, payload in iter_records(self.path):
+            if kind in (FRAME, DELTA):
+                t0 = time.perf_counter()
+                meta, cols = unpack_columns(payload)
+                key = (meta["symbol"], meta["n"])
+                if kind == FRAME:
+                    self._store(frames, key, meta["version"], cols, meta)
+                else:
+                    base = frames[key][1][meta["base"]]
+                    self._store(frames, key, meta["version"], apply_delta(base, cols, meta["keep"]))
+                frame_meta, versions = frames[key]
+                df = self._to_frame(frame_meta, versions[meta["version"]])
+                t1 = time.perf_counter()
+                timings["frames"] += t1 - t0
+                stream = streams.get(key)
+                if stream is None:
+                    stream = streams[key] = IndicatorStream(self.indicators, data_tz=data_tz)
+                feats = features.setdefault(key, OrderedDict())
+                feats[meta["version"]] = stream.update(df)
+                while len(feats) > self.history:
+                    feats.popitem(last=False)
+                timings["indicators"] += time.perf_counter() - t1
+                continue
+            if kind != EVAL:
+                continue
+
+            ev = json.loads(payload)
+            if symbol and ev["symbol"] != symbol:
+                continue
+            result = self._evaluate(ev, features, last_keys, decisions.get(ev["eval"], {}), timings)
+            stats["evals"] += 1
+            stats["signals"] += result["signal"] is not None
+            stats["new_signals"] += result["new_signal"]
+            stats["ai"] += result["ai"]
+            stats["approved"] += result["approved"]
+            stats["orders"] += result["order"]
+            if result["diffs"]:
+                mismatches.append(result)
+            if on_result:
+                on_result(result)
+            if limit and stats["evals"] >= limit:
+                break
+
+        elapsed = time.perf_counter() - t_start
+        return {
+            "path": self.path,
+            "session": self.session,
+            "records": counts,
+            "model_mismatch": self.model_mismatch,
+            **stats,
+            "mismatches": len(mismatches),
+            "mismatch_details": mismatches[:20],
+            "seconds": elapsed,
+            "evals_per_s": stats["evals"] / elapsed if elapsed else 0.0,
+            "stage_ms": {k: v * 1000 / max(stats["evals"], 1) for k, v in timings.items()},
+        }
+
+    def _evaluate(self, ev, features, last_keys, recorded, timings):
+        """Mismos pasos que BotManager.evaluate_instrument, sin terminal ni órdenes"""
+        result = {
+            "eval": ev["eval"],
+            "symbol": ev["symbol"],
+            "signal": None,
+            "new_signal": False,
+            "ai": False,
+            "approved": False,
+            "order": "order" in recorded,
+            "diffs": [],
+        }
+        diffs = result["diffs"]
+
+        t0 = time.perf_counter()
+        try:
+            df = features[(ev["symbol"], ev["n"])][ev["frame"]]
+            df_corr = None
+            if ev.get("corr_frame") is not None:
+                df_corr = features[(ev["corr_symbol"], ev["n"])][ev["corr_frame"]]
+        except KeyError:
+            diffs.append("frame no disponible (grabación incompleta)")
+            return result
+        t2 = time.perf_counter()
+        timings["frames"] += t2 - t0
+
+        last_idx = len(df) - 2
+        if last_idx != ev["last_idx"]:
+            diffs.append(f"last_idx {last_idx} != {ev['last_idx']}")
+        signal = PO3Detector(df, df_correlated=df_corr).scan_for_signals(last_idx)
+        timings["detector"] += time.perf_counter() - t2
+
+        rec_signal = recorded.get("signal")
+        if signal:
+            result["signal"] = signal["signal_type"]
+        if bool(signal) != bool(rec_signal):
+            diffs.append(f"señal {bool(signal)} != grabada {bool(rec_signal)}")
+            return result
+        if not signal:
+            return result
+        if _normalized(signal) != rec_signal["signal"]:
+            diffs.append("señal distinta a la grabada")
+
+        key = signal_key_of(signal)
+        result["new_signal"] = key != last_keys.get(ev["symbol"])
+        last_keys[ev["symbol"]] = key
+        if result["new_signal"] != rec_signal["new"]:
+            diffs.append(f"new {result['new_signal']} != grabado {rec_signal['new']}")
+        if not result["new_signal"] or build_features is None:
+            return result
+
+        t3 = time.perf_counter()
+        row_signal = df.iloc[last_idx]
+        market_ctx = {
+            "atr": row_signal.get("ATRr_14", 1.0),
+            "ema_50": row_signal.get("ema_50", 0.0),
+            "ema_200": row_signal.get("ema_200", 0.0),
+        }
+        features = build_features(row_signal, signal["entry_price"], market_ctx)
+        t4 = time.perf_counter()
+        timings["features"] += t4 - t3
+
+        rec_features = recorded.get("features")
+        if rec_features is not None:
+            got = _normalized({"columns": list(features.columns), "values": features.iloc[0].tolist()})
+            if got != rec_features:
+                diffs.append("features distintas a las grabadas")
+
+        if self.model is None:
+            return result
+        prob = float(self.model.predict_proba(features)[0][1])
+        timings["model"] += time.perf_counter() - t4
+        result["ai"] = True
+        result["prob"] = prob
+        result["approved"] = prob >= ev["threshold"]
+
+        rec_prob = recorded.get("prob")
+        if rec_prob is None:
+            diffs.append("probabilidad no grabada (¿error de IA en vivo?)")
+        elif prob != rec_prob["prob"]:
+            diffs.append(f"prob {prob!r} != grabada {rec_prob['prob']!r}")
+        if result["order"] and not result["approved"]:
+            diffs.append("orden grabada sin aprobación en el replay")
+        return result
+
+
+def print_report(report, verbose=False):
+    print("\n" + "=" * 60)
+    print(f"🎥 REPLAY: {report['path']}")
+    session = report["session"] or {}
+    print(f"   Sesión {session.get('started', '?')} | instrumentos {session.get('instruments')}")
+    print("-" * 60)
+    print(
+        f"Evaluaciones: {report['evals']} | Señales: {report['signals']} (nuevas {report['new_signals']}) | "
+        f"IA: {report['ai']} (aprobadas {report['approved']}) | Órdenes: {report['orders']}"
+    )
+    print(f"Tiempo: {report['seconds']:.2f}s ({report['evals_per_s']:.1f} evaluaciones/s)")
+    print("ms por evaluación: " + " | ".join(f"{k} {v:.2f}" for k, v in report["stage_ms"].items()))
+    print("-" * 60)
+    if report["mismatches"]:
+        print(f"❌ {report['mismatches']} evaluaciones difieren de lo grabado")
+        for m in report["mismatch_details"][: 20 if verbose else 5]:
+            print(f"   eval {m['eval']} [{m['symbol']}]: {'; '.join(m['diffs'])}")
+    else:
+        print("✅ Replay bit a bit idéntico a la sesión en vivo")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay offline de una sesión grabada (post-mortem / regresión)")
+    parser.add_argument("recording", help="Archivo .po3rec (execution_engine/data/recordings)")
+    parser.add_argument("--model", help="Modelo a usar (por defecto el de la sesión)")
+    parser.add_argument("--symbol", help="Solo este instrumento")
+    parser.add_argument("--limit", type=int, help="Máximo de evaluaciones")
+    parser.add_argument("--json", help="Guardar el reporte en este archivo")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    report = LiveReplay(args.recording, model_path=args.model).run(symbol=args.symbol, limit=args.limit)
+    print_report(report, args.verbose)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4, default=str)
+    sys.exit(1 if report["mismatches"] else 0)
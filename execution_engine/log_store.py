@@ -0,0 +1,204 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from typing import NamedTuple
+
+LOG_PATH = os.getenv("LOG_PATH", "execution_engine/data/bot.log")
+LOG_CAPACITY = int(os.getenv("LOG_CAPACITY", "4096"))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(5 << 20)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "3"))
+# Cada cuánto el writer baja el buffer a disco (y a consola)
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.25"))
+# Eco en consola del writer (el print ya no ocurre en el camino caliente)
+LOG_ECHO = os.getenv("LOG_ECHO", "1") == "1"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+
+class LogRecord(NamedTuple):
+    seq: int
+    ts: float
+    level: str
+    code: str
+    msg: str
+    fields: dict
+
+    def line(self):
+        """Formato legacy de la App: '[HH:MM:SS] mensaje'"""
+        return f"[{time.strftime('%H:%M:%S', time.localtime(self.ts))}] {self.msg}"
+
+    def to_dict(self):
+        return {
+            "seq": self.seq,
+            "ts": self.ts,
+            "level": self.level,
+            "code": self.code,
+            "msg": self.msg,
+            "fields": self.fields,
+        }
+
+
+class LogStore:
+    """
+    Log estructurado sobre un ring buffer de tamaño fijo.
+    - append(): numera (seq monótono), crea la tupla y la deja en su slot
+      (seq % capacity). Un lock de pocas instrucciones, sin formateo, sin I/O.
+    - since(seq): lo posterior a 'seq' que siga en el ring (aritmética de seq,
+      sin recorrer el buffer). La App pide desde su último seq visto.
+    - Un thread writer baja los registros nuevos por lotes a un archivo JSONL
+      rotativo; si el ring da la vuelta entre dos flushes, anota cuántos perdió.
+    """
+
+    def __init__(
+        self,
+        capacity: int = LOG_CAPACITY,
+        path: str = LOG_PATH,
+        max_bytes: int = LOG_MAX_BYTES,
+        backups: int = LOG_BACKUPS,
+        flush_interval: float = LOG_FLUSH_INTERVAL,
+        echo: bool = LOG_ECHO,
+        min_level: str = LOG_LEVEL,
+    ):
+        self.capacity = capacity
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.echo = echo
+        self.min_level = LEVELS.get(min_level, 20)
+
+        self._ring = [None] * capacity
+        self._lock = threading.Lock()
+        self._last = 0  # Último seq publicado
+        self._written = 0  # Último seq bajado a disco
+        self.dropped = 0  # Registros que el ring pisó antes del flush
+
+        self._file = None
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._writer = None
+        if path or echo:
+            self._writer = threading.Thread(target=self._run_writer, name="log-writer", daemon=True)
+            self._writer.start()
+        # Lo que quede en el ring al salir también llega al archivo
+        atexit.register(self.close)
+
+    # --- CAMINO CALIENTE ---
+    def append(self, msg, level="INFO", code="", fields=None):
+        if LEVELS.get(level, 20) < self.min_level:
+            return 0
+        ts = time.time()
+        # Slot escrito antes de publicar el seq: un lector nunca ve un hueco
+        with self._lock:
+            seq = self._last + 1
+            # Tupla cruda (el __new__ de NamedTuple es Python): se tipa al leer
+            self._ring[seq % self.capacity] = (seq, ts, level, code or "", msg, fields or {})
+            self._last = seq
+        return seq
+
+    # --- CONSULTAS ---
+    @property
+    def last_seq(self):
+        return self._last
+
+    def since(self, seq: int = 0, limit: int = 200, level: str = None):
+        """
+        Registros con seq > 'seq', en orden, hasta 'limit'. Si 'seq' ya salió
+        del ring se empieza por el más viejo disponible.
+        """
+        last = self._last
+        first = max(seq + 1, last - self.capacity + 1, 1)
+        min_level = LEVELS.get(level, 0) if level else 0
+        out = []
+        for s in range(first, last + 1):
+            raw = self._ring[s % self.capacity]
+            # Slot ya pisado por un append posterior (el ring dio la vuelta)
+            if raw is None or raw[0] != s:
+                continue
+            if min_level and LEVELS.get(raw[2], 20) < min_level:
+                continue
+            out.append(tuple.__new__(LogRecord, raw))
+            if len(out) >= limit:
+                break
+        return out
+
+    def tail(self, n: int = 15):
+        """Últimos n registros (orden cronológico)"""
+        return self.since(max(0, self._last - n), n)
+
+    def lines(self, n: int = 15):
+        return [rec.line() for rec in self.tail(n)]
+
+    # --- WRITER ---
+    def _run_writer(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Baja a disco lo publicado desde el último flush (un write por lote)"""
+        with self._flush_lock:
+            last = self._last
+            if last <= self._written:
+                return
+            batch = self.since(self._written, limit=last - self._written)
+            lost = (last - self._written) - len(batch)
+            self._written = last
+            if lost > 0:
+                self.dropped += lost
+
+            if self.echo:
+                sys.stdout.write("".join(rec.line() + "\n" for rec in batch))
+                sys.stdout.flush()
+            if not self.path:
+                return
+            chunk = "".join(
+                json.dumps(rec.to_dict(), ensure_ascii=False, default=str) + "\n" for rec in batch
+            )
+            if lost > 0:
+                marker = {"ts": time.time(), "level": "WARNING", "code": "LOG_DROPPED", "fields": {"count": lost}}
+                chunk += json.dumps(marker) + "\n"
+            try:
+                self._write(chunk.encode())
+            except OSError as e:
+                print(f"⚠ LogStore: no se pudo escribir {self.path} ({e})")
+
+    def _write(self, data: bytes):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "ab")
+        if self._file.tell() + len(data) > self.max_bytes and self._file.tell() > 0:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+
+    def _rotate(self):
+        """bot.log -> bot.log.1 -> ... -> bot.log.N (el más viejo se descarta)"""
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+        else:
+            self.flush()
+        # Con el lock: nunca cerrar el archivo en medio de un lote del writer
+        with self._flush_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
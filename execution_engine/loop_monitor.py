@@ -0,0 +1,190 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Un callback que retiene el loop más que esto queda registrado con su stack
+BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.25"))
+# Lag a partir del cual actúa el watchdog (alerta y, si se pide, pausa auto_trade)
+LAG_LIMIT = float(os.getenv("LOOP_LAG_LIMIT", "2.0"))
+# alert | pause
+LAG_ACTION = os.getenv("LOOP_LAG_ACTION", "alert")
+
+
+class LoopMonitor:
+    """
+    Salud del event loop.
+    - Sampler (tarea del propio loop): cada 'interval' mide cuánto tarde despertó
+      (lag) y cuántas tareas hay vivas.
+    - Watchdog (thread aparte): si el sampler deja de latir más de
+      block_threshold, el loop está bloqueado; captura el stack del thread del
+      loop en ese momento (sys._current_frames) y, pasado lag_limit, dispara
+      on_lag una vez por bloqueo.
+    - Backlog de envíos por WebSocket (envíos en vuelo y su duración).
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        block_threshold: float = BLOCK_THRESHOLD,
+        lag_limit: float = LAG_LIMIT,
+        on_lag=None,
+        history: int = 600,
+    ):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.lag_limit = lag_limit
+        self.on_lag = on_lag
+
+        self.lags = deque(maxlen=history)  # (ts, lag_s)
+        self.blocks = deque(maxlen=20)  # Bloqueos recientes con stack
+        self.max_lag = 0.0
+        self.lag_alerts = 0
+        self.tasks = 0
+        self.max_tasks = 0
+
+        self._loop = None
+        self._loop_thread = None
+        self._beat = time.monotonic()
+        self._sampler = None
+        self._stop = threading.Event()
+        self._clients = {}  # client_id -> stats de envío
+
+    # --- CICLO DE VIDA ---
+    def start(self):
+        """Llamar desde el loop a monitorear (lifespan)"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._sampler = self._loop.create_task(self._sample())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.cancel()
+
+    async def _sample(self):
+        loop = self._loop
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - t0 - self.interval)
+            self._beat = time.monotonic()
+            self.lags.append((time.time(), lag))
+            self.max_lag = max(self.max_lag, lag)
+            self.tasks = len(asyncio.all_tasks(loop))
+            self.max_tasks = max(self.max_tasks, self.tasks)
+
+    def _watch(self):
+        block = None  # Bloqueo en curso
+        while not self._stop.wait(self.block_threshold / 2):
+            stalled = time.monotonic() - self._beat - self.interval
+            if stalled < self.block_threshold:
+                if block is not None:
+                    block["seconds"] = round(block["seconds"], 3)
+                    block["ongoing"] = False
+                    block = None
+                continue
+
+            if block is None:
+                block = {
+                    "started": time.time() - stalled,
+                    "seconds": stalled,
+                    "ongoing": True,
+                    "stack": self._loop_stack(),
+                }
+                self.blocks.append(block)
+            block["seconds"] = stalled
+
+            if stalled >= self.lag_limit and not block.get("alerted"):
+                block["alerted"] = True
+                self.lag_alerts += 1
+                if self.on_lag is not None:
+                    try:
+                        self.on_lag(stalled, block["stack"])
+                    except Exception as e:
+                        print(f"⚠ LoopMonitor: on_lag falló ({e})")
+
+    def _loop_stack(self, limit: int = 12):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return []
+        return [line.rstrip() for line in traceback.format_stack(frame, limit=limit)]
+
+    # --- WEBSOCKETS ---
+    @asynccontextmanager
+    async def track_send(self, client_id):
+        """Envuelve cada envío: un send que no retorna es backlog del cliente"""
+        stats = self._clients.setdefault(
+            client_id, {"in_flight": 0, "sent": 0, "last_ms": 0.0, "max_ms": 0.0}
+        )
+        stats["in_flight"] += 1
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            stats["in_flight"] -= 1
+            stats["sent"] += 1
+            stats["last_ms"] = round(ms, 3)
+            stats["max_ms"] = round(max(stats["max_ms"], ms), 3)
+
+    def forget_client(self, client_id):
+        self._clients.pop(client_id, None)
+
+    # --- MÉTRICAS ---
+    def snapshot(self):
+        lags = sorted(lag for _, lag in self.lags)
+
+        def pct(p):
+            return round(lags[min(len(lags) - 1, int(p * len(lags)))] * 1000, 3) if lags else 0.0
+
+        return {
+            "lag_ms": {
+                "last": round(self.lags[-1][1] * 1000, 3) if self.lags else 0.0,
+                "p50": pct(0.50),
+                "p99": pct(0.99),
+                "max": round(self.max_lag * 1000, 3),
+            },
+            "stalled_ms": round(max(0.0, time.monotonic() - self._beat - self.interval) * 1000, 3),
+            "block_threshold_ms": self.block_threshold * 1000,
+            "lag_limit_ms": self.lag_limit * 1000,
+            "lag_alerts": self.lag_alerts,
+            "tasks": self.tasks,
+            "max_tasks": self.max_tasks,
+            "blocks": [
+                {k: (round(v, 3) if k == "seconds" else v) for k, v in b.items()} for b in self.blocks
+            ],
+            "websockets": {
+                "clients": len(self._clients),
+                "backlog": sum(s["in_flight"] for s in self._clients.values()),
+                "per_client": dict(self._clients),
+            },
+        }
+
+
+def lag_guard(get_bot, action: str = LAG_ACTION):
+    """
+    on_lag estándar: alerta en el log del bot y, con action='pause', apaga
+    auto_trade (un loop congelado decide con datos viejos). Se reactiva a mano.
+    """
+
+    def on_lag(seconds, stack):
+        bot = get_bot()
+        where = stack[-1].strip().splitlines()[0] if stack else "?"
+        msg = f"🐢 WATCHDOG: event loop bloqueado {seconds:.1f}s en {where}"
+        if action == "pause" and bot is not None and bot.auto_trade:
+            bot.auto_trade = False
+            msg += " -> AutoTrade PAUSADO"
+        if bot is not None:
+            bot.log(msg, level="WARNING", code="LOOP_LAG", seconds=round(seconds, 3), where=where)
+        else:
+            print(msg)
+
+    return on_lag
@@ -0,0 +1,357 @@
+import atexit
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+RECORDER_DIR = os.getenv("RECORDER_DIR", "execution_engine/data/recordings")
+RECORDER_FLUSH_INTERVAL = float(os.getenv("RECORDER_FLUSH_INTERVAL", "0.5"))
+# Disco acotado (0 = sin límite): tope por sesión (al llegar se deja de grabar),
+# presupuesto total de RECORDER_DIR y antigüedad máxima (se purgan al abrir sesión)
+RECORDER_SESSION_MAX_MB = float(os.getenv("RECORDER_SESSION_MAX_MB", "512"))
+RECORDER_MAX_MB = float(os.getenv("RECORDER_MAX_MB", "4096"))
+RECORDER_KEEP_DAYS = float(os.getenv("RECORDER_KEEP_DAYS", "14"))
+
+# Formato: MAGIC + registros [kind u8][len u32][ts_ns u64][payload]
+MAGIC = b"PO3REC\x00\x01"
+RECORD = struct.Struct("<BIQ")
+META_LEN = struct.Struct("<I")
+
+SESSION, FRAME, DELTA, EVAL, SIGNAL, FEATURES, PROB, ORDER = range(1, 9)
+KIND_NAMES = {
+    SESSION: "session",
+    FRAME: "frame",
+    DELTA: "delta",
+    EVAL: "eval",
+    SIGNAL: "signal",
+    FEATURES: "features",
+    PROB: "prob",
+    ORDER: "order",
+}
+
+
+def _jsonable(obj):
+    """Escalares numpy / Timestamps -> nativos (mismo criterio al grabar y al comparar)"""
+    if hasattr(obj, "item"):
+        return obj.item()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+
+def encode_json(data) -> bytes:
+    return json.dumps(data, default=_jsonable, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def file_sha256(path):
+    if not path or not os.path.exists(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def prune_recordings(directory, max_bytes=0, keep_days=0, reserve=0):
+    """
+    Borra grabaciones viejas de 'directory': las de más de 'keep_days' días y,
+    de la más vieja a la más nueva, las que hagan falta para que lo que queda
+    más 'reserve' (la sesión que se abre) quepa en 'max_bytes'. Devuelve las borradas.
+    """
+    if not os.path.isdir(directory):
+        return []
+    files = []
+    for name in os.listdir(directory):
+        if name.startswith("session_") and name.endswith(".po3rec"):
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+    files.sort()
+
+    removed = []
+    total = sum(size for _, size, _ in files)
+    cutoff = time.time() - keep_days * 86400 if keep_days else None
+    for mtime, size, path in files:
+        too_old = cutoff is not None and mtime < cutoff
+        over_budget = max_bytes and total + reserve > max_bytes
+        if not (too_old or over_budget):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed.append(path)
+    return removed
+
+
+# --- COLUMNAS (frames de la terminal: índice datetime + columnas numéricas) ---
+def _index_ns(index):
+    """
+    Índice temporal -> int64 ns (UTC si es tz-aware). to_numpy() de un índice
+    tz-aware da Timestamps (dtype object): sus bytes serían punteros.
+    """
+    if hasattr(index, "as_unit"):
+        index = index.as_unit("ns")
+    if hasattr(index, "asi8"):
+        return index.asi8
+    return np.asarray(index).astype("datetime64[ns]").view(np.int64)
+
+
+def frame_columns(df):
+    """DataFrame -> {nombre: ndarray}; '__index__' lleva el índice temporal (epoch ns)"""
+    cols = {"__index__": _index_ns(df.index)}
+    for name in df.columns:
+        cols[name] = df[name].to_numpy()
+    return cols
+
+
+def pack_columns(meta: dict, cols: dict, start: int = 0) -> bytes:
+    """Cabecera JSON (nombres, dtypes, filas) + bytes crudos de cada columna desde 'start'"""
+    meta = dict(meta)
+    meta["columns"] = [[name, arr.dtype.str] for name, arr in cols.items()]
+    meta["rows"] = len(cols["__index__"]) - start
+    head = encode_json(meta)
+    body = b"".join(np.ascontiguousarray(arr[start:]).tobytes() for arr in cols.values())
+    return META_LEN.pack(len(head)) + head + body
+
+
+def unpack_columns(payload: bytes):
+    """Inversa de pack_columns -> (meta, {nombre: ndarray})"""
+    (head_len,) = META_LEN.unpack_from(payload, 0)
+    meta = json.loads(payload[META_LEN.size : META_LEN.size + head_len])
+    offset = META_LEN.size + head_len
+    rows = meta["rows"]
+    cols = {}
+    for name, dtype in meta["columns"]:
+        dt = np.dtype(dtype)
+        cols[name] = np.frombuffer(payload, dtype=dt, count=rows, offset=offset)
+        offset += dt.itemsize * rows
+    return meta, cols
+
+
+def _same_schema(a: dict, b: dict):
+    return a.keys() == b.keys() and all(a[k].dtype == b[k].dtype for k in a)
+
+
+def delta_start(prev: dict, new: dict):
+    """
+    Posición en 'new' de la última vela de 'prev' si todo lo anterior coincide
+    bit a bit (las velas cerradas no cambian; la última sí, es la vela en
+    formación). None => hace falta un frame completo (hueco o historia revisada).
+    """
+    if prev is None or not _same_schema(prev, new):
+        return None
+    p_time, n_time = prev["__index__"], new["__index__"]
+    if len(p_time) == 0 or len(n_time) == 0:
+        return None
+    k = int(np.searchsorted(n_time, p_time[-1]))
+    if k >= len(n_time) or n_time[k] != p_time[-1] or k > len(p_time) - 1:
+        return None
+    base = len(p_time) - 1 - k
+    for name, arr in new.items():
+        if arr[:k].tobytes() != prev[name][base : base + k].tobytes():
+            return None
+    return k
+
+
+def apply_delta(prev: dict, tail: dict, keep: int):
+    """Reconstruye el frame: 'keep' velas de prev (antes de su última) + la cola nueva"""
+    base = len(prev["__index__"]) - 1 - keep
+    return {name: np.concatenate([prev[name][base : base + keep], tail[name]]) for name in prev}
+
+
+class MarketRecorder:
+    """
+    Grabación append-only de lo que vio y decidió el motor en vivo, para
+    reproducirlo offline (execution_engine/live_replay.py).
+    - Frames de velas: completo la primera vez por (símbolo, n) y luego solo el
+      delta (vela en formación + nuevas), en binario crudo por columna.
+    - Evaluaciones, señales, features, probabilidades y órdenes: JSON compacto
+      ligado a la evaluación por 'eval'.
+    - El thread que decide solo encola (los frames por referencia: columnas y
+      delta los calcula el writer, que baja todo en lote). Un archivo por
+      sesión (start_loop -> stop).
+    - Disco acotado: al abrir sesión se purgan grabaciones viejas (antigüedad y
+      presupuesto del directorio); una sesión que llega a su tope deja de grabar
+      (no rota: el replay necesita la secuencia completa de frames desde el inicio).
+    """
+
+    def __init__(
+        self,
+        directory: str = RECORDER_DIR,
+        flush_interval: float = RECORDER_FLUSH_INTERVAL,
+        session_max_mb: float = RECORDER_SESSION_MAX_MB,
+        max_mb: float = RECORDER_MAX_MB,
+        keep_days: float = RECORDER_KEEP_DAYS,
+    ):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.session_max_bytes = int(session_max_mb * 1024 * 1024)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.keep_days = keep_days
+        self.truncated = False  # La sesión llegó a su tope
+        self.path = None
+        self.records = 0
+        self.bytes_written = 0
+
+        self._file = None
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._frames = {}  # (symbol, n) -> (version, cols); solo lo toca el writer
+        self._version = 0
+        self._eval_id = 0
+        self._stop = threading.Event()
+        self._writer = None
+        atexit.register(self.stop)
+
+    @property
+    def active(self):
+        return self._file is not None
+
+    # --- SESIÓN ---
+    def start(self, meta: dict):
+        """Abre una grabación nueva (cierra la anterior si seguía abierta)"""
+        self.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        removed = prune_recordings(self.directory, self.max_bytes, self.keep_days, reserve=self.session_max_bytes)
+        if removed:
+            print(f"🧹 Grabaciones purgadas: {len(removed)} (RECORDER_MAX_MB / RECORDER_KEEP_DAYS)")
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.path = os.path.join(self.directory, f"session_{stamp}_{os.getpid()}.po3rec")
+        with self._lock:
+            self._frames.clear()
+            self._version = 0
+            self._eval_id = 0
+            self._pending.clear()  # Restos encolados tras el stop anterior
+        self._file = open(self.path, "wb")
+        self._file.write(MAGIC)
+        self.records = 0
+        self.bytes_written = len(MAGIC)
+        self.truncated = False
+        self._emit(SESSION, encode_json({"format": 1, "started": datetime.now().isoformat(), **meta}))
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._run_writer, name="market-recorder", daemon=True)
+        self._writer.start()
+        return self.path
+
+    def stop(self):
+        if self._file is None:
+            return
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+        self._flush()
+        with self._flush_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # --- REGISTROS (camino caliente) ---
+    def _emit(self, kind, payload: bytes):
+        # deque.append es atómico: los workers no se esperan entre sí
+        self._pending.append(RECORD.pack(kind, len(payload), time.time_ns()) + payload)
+
+    def record_frame(self, symbol: str, n_candles: int, df):
+        """
+        Registra el frame descargado; devuelve su versión (0 si no graba).
+        Solo encola la referencia: la cache no muta sus frames (cada evaluación
+        trabaja sobre una copia). Las descargas de un mismo (símbolo, n) ya van
+        serializadas por el lock de la CandleCache, así que llegan en orden.
+        """
+        if self._file is None or df is None:
+            return 0
+        with self._lock:
+            self._version += 1
+            version = self._version
+        self._pending.append((time.time_ns(), symbol, n_candles, version, df))
+        return version
+
+    def _encode_frame(self, ts_ns, symbol, n_candles, version, df):
+        """Frame completo o delta contra la versión anterior del mismo (símbolo, n)"""
+        cols = frame_columns(df)
+        key = (symbol, n_candles)
+        prev_version, prev = self._frames.get(key, (0, None))
+        k = delta_start(prev, cols)
+        meta = {"symbol": symbol, "n": n_candles, "version": version}
+        if k is None:
+            tz = getattr(df.index, "tz", None)
+            meta.update(index_name=df.index.name, tz=str(tz) if tz is not None else None)
+            kind, payload = FRAME, pack_columns(meta, cols)
+        else:
+            meta.update(base=prev_version, keep=k)
+            kind, payload = DELTA, pack_columns(meta, cols, start=k)
+        self._frames[key] = (version, cols)
+        return RECORD.pack(kind, len(payload), ts_ns) + payload
+
+    def record_eval(self, **fields):
+        """Una evaluación (barra) de un instrumento; devuelve el id que liga lo demás"""
+        if self._file is None:
+            return 0
+        with self._lock:
+            self._eval_id += 1
+            eval_id = self._eval_id
+        self._emit(EVAL, encode_json({"eval": eval_id, **fields}))
+        return eval_id
+
+    def record(self, kind: int, eval_id: int, **fields):
+        """SIGNAL / FEATURES / PROB / ORDER de la evaluación 'eval_id'"""
+        if self._file is None:
+            return
+        self._emit(kind, encode_json({"eval": eval_id, **fields}))
+
+    # --- WRITER ---
+    def _run_writer(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush()
+
+    def _flush(self):
+        # Lock propio: el I/O nunca frena a los workers que graban
+        with self._flush_lock:
+            if not self._pending or self._file is None:
+                return
+            batch = []
+            while self._pending:
+                item = self._pending.popleft()
+                batch.append(item if isinstance(item, bytes) else self._encode_frame(*item))
+            chunk = b"".join(batch)
+            self._file.write(chunk)
+            self._file.flush()
+            self.records += len(batch)
+            self.bytes_written += len(chunk)
+            if self.session_max_bytes and self.bytes_written >= self.session_max_bytes:
+                # Tope de la sesión: se cierra lo grabado (reproducible hasta aquí)
+                print(f"⚠ Grabación {self.path} llegó a RECORDER_SESSION_MAX_MB: se deja de grabar.")
+                self.truncated = True
+                self._stop.set()
+                self._file.close()
+                self._file = None
+                self._pending.clear()
+
+
+# --- LECTURA ---
+def iter_records(path):
+    """(kind, ts_ns, payload) en orden de grabación; tolera una cola truncada (crash)"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} no es una grabación PO3")
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+            kind, length, ts_ns = RECORD.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            yield kind, ts_ns, payload
@@ -0,0 +1,270 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Buckets de latencia (segundos): de llamadas a la terminal a inferencias lentas
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _fmt(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    """
+    Base con shards por thread: cada thread escribe solo en su propio dict
+    (sin locks en el camino caliente); el lock solo se toma la primera vez que
+    un thread toca la métrica y al exponer, que suma todos los shards.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def labels(self, *values):
+        """Vista ligada a unos valores de etiqueta (cacheada)"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera etiquetas {self.labelnames}")
+            child = self._children.setdefault(key, _Child(self, key))
+        return child
+
+    def _merged(self):
+        """{label_values: valor agregado} sumando los shards"""
+        with self._lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            for key, value in shard.copy().items():
+                merged[key] = self._merge(merged.get(key), value)
+        return merged
+
+    def _label_str(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def expose(self):
+        raise NotImplementedError
+
+    def has_samples(self):
+        return bool(self._merged())
+
+
+class _Child:
+    __slots__ = ("metric", "key")
+
+    def __init__(self, metric, key):
+        self.metric = metric
+        self.key = key
+
+    def inc(self, amount=1.0):
+        self.metric._add(self.key, amount)
+
+    def dec(self, amount=1.0):
+        self.metric._add(self.key, -amount)
+
+    def observe(self, value):
+        self.metric._observe(self.key, value)
+
+    def time(self):
+        return self.metric._time(self.key)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0):
+        self._add((), amount)
+
+    def _add(self, key, amount):
+        shard = self._shard()
+        shard[key] = shard.get(key, 0.0) + amount
+
+    @staticmethod
+    def _merge(total, value):
+        return (total or 0.0) + value
+
+    def expose(self):
+        merged = self._merged() or ({(): 0.0} if not self.labelnames else {})
+        return [f"{self.name}{self._label_str(k)} {_fmt(v)}" for k, v in sorted(merged.items())]
+
+
+class Gauge(Counter):
+    """
+    Gauge: inc()/dec() por shard (conexiones, en vuelo) o set_function()
+    para valores que se leen al exponer (tamaños, estados).
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def dec(self, amount=1.0):
+        self._add((), -amount)
+
+    def set_function(self, fn):
+        self._function = fn
+
+    def _merged(self):
+        if self._function is not None:
+            return {(): float(self._function())}
+        return super()._merged()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value):
+        self._observe((), value)
+
+    def time(self):
+        return self._time(())
+
+    def _observe(self, key, value):
+        shard = self._shard()
+        state = shard.get(key)
+        if state is None:
+            # [conteo por bucket..., +Inf, suma]
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    @contextmanager
+    def _time(self, key):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(key, time.perf_counter() - t0)
+
+    @staticmethod
+    def _merge(total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+    def expose(self):
+        lines = []
+        for key, state in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._label_str(key, [('le', _fmt(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {_fmt(state[-1])}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing  # Re-import del módulo: misma métrica
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self, skip_empty=False):
+        """Formato de texto de Prometheus (0.0.4)"""
+        out = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            if skip_empty and not metric.has_samples():
+                continue
+            out.append(f"# HELP {metric.name} {metric.documentation}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.expose())
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- MÉTRICAS DEL SISTEMA ---
+# Trading (BotManager)
+CANDLES_PROCESSED = REGISTRY.counter(
+    "po3_candles_processed_total", "Barras evaluadas por la estrategia", ["symbol"]
+)
+SIGNALS_DETECTED = REGISTRY.counter(
+    "po3_signals_detected_total", "Patrones PO3 nuevos detectados", ["symbol", "type"]
+)
+AI_DECISIONS = REGISTRY.counter(
+    "po3_ai_decisions_total", "Veredictos del filtro IA", ["symbol", "decision"]
+)
+INFERENCE_SECONDS = REGISTRY.histogram(
+    "po3_inference_seconds", "Latencia de predict_proba por señal"
+)
+ORDERS = REGISTRY.counter(
+    "po3_orders_total", "Órdenes límite enviadas a la terminal", ["symbol", "result"]
+)
+# Terminal (MT5Driver)
+TERMINAL_CALL_SECONDS = REGISTRY.histogram(
+    "po3_terminal_call_seconds", "Latencia de llamadas a MT5 (incluye espera del lock)", ["call"]
+)
+TERMINAL_ERRORS = REGISTRY.counter(
+    "po3_terminal_errors_total", "Excepciones en llamadas a MT5", ["call"]
+)
+TERMINAL_LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    "po3_terminal_lock_wait_seconds", "Espera del lock de la terminal antes de cada llamada", ["call"]
+)
+TERMINAL_LOCK_TIMEOUTS = REGISTRY.counter(
+    "po3_terminal_lock_timeouts_total", "Llamadas abandonadas por no obtener el lock a tiempo", ["call"]
+)
+# Servidor
+WS_CLIENTS = REGISTRY.gauge("po3_ws_clients", "Clientes WebSocket conectados", ["channel"])
+WS_BYTES_SENT = REGISTRY.counter(
+    "po3_ws_bytes_sent_total", "Bytes enviados por WebSocket", ["channel"]
+)
+WS_MESSAGES_SENT = REGISTRY.counter(
+    "po3_ws_messages_sent_total", "Mensajes enviados por WebSocket", ["channel"]
+)
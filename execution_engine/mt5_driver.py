@@ -1,14 +1,85 @@
 import MetaTrader5 as mt5
+import functools
 import os
+import threading
+import time
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from execution_engine.metrics import (
+    TERMINAL_CALL_SECONDS,
+    TERMINAL_ERRORS,
+    TERMINAL_LOCK_TIMEOUTS,
+    TERMINAL_LOCK_WAIT_SECONDS,
+)
 from execution_engine.risk import RiskManager
 
+# Traducción de estados de orden MT5 -> Diario
+ORDER_STATES = {
+    mt5.ORDER_STATE_FILLED: "FILLED",
+    mt5.ORDER_STATE_PARTIAL: "PARTIAL",
+    mt5.ORDER_STATE_CANCELED: "CANCELED",
+    mt5.ORDER_STATE_EXPIRED: "EXPIRED",
+    mt5.ORDER_STATE_REJECTED: "REJECTED",
+}
+
+
+# Espera máxima por el lock de la terminal (segundos); <= 0 espera sin límite
+TERMINAL_LOCK_TIMEOUT = float(os.getenv("TERMINAL_LOCK_TIMEOUT", "10"))
+
+
+class TerminalBusy(TimeoutError):
+    """La terminal siguió ocupada por otra llamada más de TERMINAL_LOCK_TIMEOUT"""
+
+
+def serialized(method):
+    """
+    La API Python de MT5 es una única conexión global y no es thread-safe:
+    todas las llamadas a la terminal pasan por el mismo lock del driver.
+    Limitación: no hay locks por tipo de llamada (todas comparten la conexión)
+    y una llamada en curso no se puede interrumpir, así que una llamada lenta
+    demora a todos los instrumentos. Lo que sí se acota es la espera: pasado
+    TERMINAL_LOCK_TIMEOUT la llamada falla con TerminalBusy (el instrumento
+    pierde esa barra) en vez de encolarse detrás de la terminal trabada.
+    Mismo punto de paso para medir latencia (espera del lock incluida), la
+    espera sola (por llamada y, vía take_lock_wait, por instrumento) y errores.
+    """
+    name = method.__name__
+    latency = TERMINAL_CALL_SECONDS.labels(name)
+    lock_wait = TERMINAL_LOCK_WAIT_SECONDS.labels(name)
+    timeouts = TERMINAL_LOCK_TIMEOUTS.labels(name)
+    errors = TERMINAL_ERRORS.labels(name)
+    timeout = TERMINAL_LOCK_TIMEOUT if TERMINAL_LOCK_TIMEOUT > 0 else -1
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with latency.time():
+            try:
+                t0 = time.perf_counter()
+                acquired = self.terminal_lock.acquire(timeout=timeout)
+                waited = time.perf_counter() - t0
+                lock_wait.observe(waited)
+                self._waits.seconds = getattr(self._waits, "seconds", 0.0) + waited
+                if not acquired:
+                    timeouts.inc()
+                    raise TerminalBusy(f"{name}: terminal ocupada más de {TERMINAL_LOCK_TIMEOUT:.1f}s")
+                try:
+                    return method(self, *args, **kwargs)
+                finally:
+                    self.terminal_lock.release()
+            except Exception:
+                errors.inc()
+                raise
+
+    return wrapper
+
 
 class MT5Driver:
     def __init__(self, symbol: str = None):
         load_dotenv()
+        # Una sola conexión compartida por todas las estrategias
+        self.terminal_lock = threading.RLock()
+        self._waits = threading.local()  # Espera acumulada del lock por thread (take_lock_wait)
         self.symbol = symbol if symbol else os.getenv("SYMBOL_NQ", "USTEC")
         # --- NUEVO: Cargamos también el nombre del SP500 ---
         self.symbol_es = os.getenv("SYMBOL_ES", "US500")
@@ -27,6 +98,21 @@ class MT5Driver:
         self.risk_manager = RiskManager()
         print(f"🚜 MT5 Driver Activo | NQ: {self.symbol} | ES: {self.symbol_es}")
 
+    def take_lock_wait(self) -> float:
+        """Segundos que el thread actual esperó el lock desde la última consulta (y reinicia)"""
+        seconds = getattr(self._waits, "seconds", 0.0)
+        self._waits.seconds = 0.0
+        return seconds
+
+    @serialized
+    def ensure_symbol(self, symbol):
+        """Agrega el símbolo al Market Watch (necesario para operar/descargar)"""
+        if mt5.terminal_info() and not mt5.symbol_select(symbol, True):
+            print(f"❌ Error: Símbolo '{symbol}' no encontrado en Market Watch.")
+            return False
+        return True
+
+    @serialized
     def get_market_data(self, symbol=None, timeframe=mt5.TIMEFRAME_M1, n_candles=500):
         """Descarga velas para el NQ (Principal) o ES"""
         if not mt5.terminal_info() and not mt5.initialize():
@@ -44,6 +130,7 @@ class MT5Driver:
             df.rename(columns={"tick_volume": "volume"}, inplace=True)
         return df
 
+    @serialized
     def get_current_price(self, symbol):
         """Obtiene el precio actual (Bid) de cualquier símbolo"""
         if not mt5.terminal_info() and not mt5.initialize():
@@ -51,16 +138,58 @@ class MT5Driver:
         tick = mt5.symbol_info_tick(symbol)
         return tick.bid if tick else 0.0
 
+    @serialized
     def get_account_info(self):
         """Devuelve objeto AccountInfo o None"""
         if not mt5.initialize(): return None
         return mt5.account_info()
 
-    def place_limit_order(self, signal_type, entry, sl, tp, expiration_minutes=45):
-        # ... (El código de órdenes se mantiene igual que antes) ...
-        # Copia el método place_limit_order de tu versión anterior si lo necesitas,
-        # o usa el del mensaje anterior. Aquí lo resumo para brevedad.
-        lot = self.risk_manager.calculate_lot_size(entry, sl, self.symbol)
+    # --- HISTORIAL / ESTADO DE CUENTA (Reconciliación) ---
+    @serialized
+    def get_deals(self, from_ts: float, to_ts: float = None):
+        """Deals ejecutados entre dos epoch (segundos). Tupla vacía si falla."""
+        if not mt5.terminal_info() and not mt5.initialize():
+            return ()
+        date_from = datetime.fromtimestamp(from_ts, tz=timezone.utc)
+        date_to = datetime.fromtimestamp(
+            to_ts if to_ts else datetime.now(timezone.utc).timestamp() + 86400,
+            tz=timezone.utc,
+        )
+        deals = mt5.history_deals_get(date_from, date_to)
+        return deals if deals else ()
+
+    @serialized
+    def get_open_positions(self, symbol=None):
+        if not mt5.terminal_info() and not mt5.initialize():
+            return ()
+        positions = mt5.positions_get(symbol=symbol) if symbol else mt5.positions_get()
+        return positions if positions else ()
+
+    @serialized
+    def get_pending_orders(self, symbol=None):
+        if not mt5.terminal_info() and not mt5.initialize():
+            return ()
+        orders = mt5.orders_get(symbol=symbol) if symbol else mt5.orders_get()
+        return orders if orders else ()
+
+    @serialized
+    def get_order_state(self, ticket: int):
+        """Estado final de una orden ya retirada del libro: FILLED, EXPIRED, CANCELED..."""
+        orders = mt5.history_orders_get(ticket=ticket)
+        if not orders:
+            return None
+        return ORDER_STATES.get(orders[0].state, "UNKNOWN")
+
+    @serialized
+    def place_limit_order(self, signal_type, entry, sl, tp, expiration_minutes=45, symbol=None):
+        symbol = symbol if symbol else self.symbol
+
+        # Kill-Switch diario: O(1) antes de cualquier envío
+        if not self.risk_manager.check_daily_drawdown():
+            print("🛑 Orden bloqueada por el guard diario (límite alcanzado o balance desconocido).")
+            return None
+
+        lot = self.risk_manager.get_lot_size(entry, sl, symbol)
         if lot == 0.0:
             return None
 
@@ -75,7 +204,7 @@ class MT5Driver:
 
         request = {
             "action": mt5.TRADE_ACTION_PENDING,
-            "symbol": self.symbol,
+            "symbol": symbol,
             "volume": lot,
             "type": order_type,
             "price": entry,
@@ -92,15 +221,16 @@ class MT5Driver:
         if res.retcode != mt5.TRADE_RETCODE_DONE:
             print(f"❌ Error MT5: {res.comment}")
             return None
-        print(f"✅ ORDEN: {signal_type} {lot} lots")
+        print(f"✅ ORDEN: {symbol} {signal_type} {lot} lots")
         return res.order
 
-    def close_all_positions(self):
-        # ... (Igual que antes) ...
+    @serialized
+    def close_all_positions(self, symbols=None):
         if not mt5.initialize():
             return
-        # Cerrar todo para NQ
-        self._close_symbol(self.symbol)
+        # Cerrar todo para el NQ (o cada instrumento operado)
+        for sym in symbols or [self.symbol]:
+            self._close_symbol(sym)
 
     def _close_symbol(self, sym):
         # Helper para cerrar
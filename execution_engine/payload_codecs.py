@@ -0,0 +1,138 @@
+import json
+import os
+import zlib
+from typing import NamedTuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Mensajes más chicos que esto viajan sin comprimir (el costo no compensa)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Nivel bajo: la foto del WebSocket sale cada segundo por cliente
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "1"))
+
+# Prefijo de cada mensaje binario cuando se negoció compresión
+FRAME_RAW, FRAME_DEFLATE = b"\x00", b"\x01"
+
+
+def _to_builtin(obj):
+    """Tipos de numpy/pandas/datetime -> nativos (fallback de los encoders)"""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()  # np.ndarray y escalares numpy
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+
+class JsonCodec:
+    """JSON de la stdlib (referencia)"""
+
+    name = "json"
+    media_type = "application/json"
+    binary = False
+
+    def encode(self, obj) -> bytes:
+        return json.dumps(obj, default=_to_builtin, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class OrjsonCodec(JsonCodec):
+    """Mismo JSON en el cable, serializado en Rust (numpy nativo, NaN -> null)"""
+
+    _options = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def encode(self, obj) -> bytes:
+        return orjson.dumps(obj, default=_to_builtin, option=self._options)
+
+
+class MsgpackCodec:
+    """MessagePack: floats en 9 bytes binarios en vez de ~18 caracteres"""
+
+    name = "msgpack"
+    media_type = "application/msgpack"
+    binary = True
+
+    def encode(self, obj) -> bytes:
+        return msgpack.packb(obj, default=_to_builtin, use_bin_type=True)
+
+
+# Codecs disponibles: "json" usa el encoder más rápido instalado
+CODECS = {"json": OrjsonCodec() if orjson is not None else JsonCodec()}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+
+class WireFormat(NamedTuple):
+    codec: object
+    compress: bool = False
+
+    def encode(self, obj):
+        """
+        Returns:
+            (payload, binary): bytes a enviar; binary=False => frame de texto
+            (JSON sin compresión). Con compresión el 1er byte es 0 = crudo,
+            1 = zlib/deflate.
+        """
+        data = self.codec.encode(obj)
+        if not self.compress:
+            return data, self.codec.binary
+        if len(data) < COMPRESS_MIN_BYTES:
+            return FRAME_RAW + data, True
+        return FRAME_DEFLATE + zlib.compress(data, COMPRESS_LEVEL), True
+
+
+DEFAULT_FORMAT = WireFormat(CODECS["json"])
+
+
+def parse_format(spec: str):
+    """'msgpack+deflate' / 'json' -> WireFormat (None si el codec no está disponible)"""
+    name, _, extra = (spec or "").strip().lower().partition("+")
+    codec = CODECS.get(name or "json")
+    if codec is None or extra not in ("", "deflate"):
+        return None
+    return WireFormat(codec, extra == "deflate")
+
+
+def negotiate_websocket(websocket):
+    """
+    Formato del cliente en el handshake:
+    1. Sec-WebSocket-Protocol: 'po3.msgpack+deflate', 'po3.json', ... (el primero soportado).
+    2. Query: ?codec=msgpack&compress=1 (clientes sin subprotocolos).
+    Returns:
+        (WireFormat, subprotocolo aceptado o None).
+    """
+    for proto in websocket.scope.get("subprotocols") or []:
+        if proto.startswith("po3."):
+            fmt = parse_format(proto[4:])
+            if fmt is not None:
+                return fmt, proto
+
+    params = websocket.query_params
+    spec = params.get("codec", "json")
+    if params.get("compress") in ("1", "true", "deflate"):
+        spec += "+deflate"
+    return parse_format(spec) or DEFAULT_FORMAT, None
+
+
+async def send_payload(websocket, fmt: WireFormat, obj):
+    """Envía obj en el formato negociado; devuelve los bytes enviados"""
+    payload, binary = fmt.encode(obj)
+    if binary:
+        await websocket.send_bytes(payload)
+    else:
+        await websocket.send_text(payload.decode())
+    return len(payload)
+
+
+def negotiate_http(request):
+    """Codec por header Accept (application/msgpack); JSON por defecto"""
+    accept = request.headers.get("accept", "")
+    if "msgpack" in accept and "msgpack" in CODECS:
+        return CODECS["msgpack"]
+    return CODECS["json"]
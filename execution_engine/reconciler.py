@@ -0,0 +1,162 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from data_core.session_calendar import server_time_to_utc, utc_to_server_time
+
+
+# Constantes de MT5 (ENUM_DEAL_ENTRY). Se replican aquí para que el reconciliador
+# funcione igual con el driver real o con una terminal simulada.
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+DEAL_ENTRY_INOUT = 2
+DEAL_ENTRY_OUT_BY = 3  # OUT, INOUT y OUT_BY se tratan como salidas de la posición
+
+
+class DealReconciler:
+    """
+    Reconciliación incremental del flujo de Deals -> Diario.
+    - Lee history_deals_get solo desde la marca de agua (último time_msc + ticket).
+    - Aplica fills, fills parciales, cierres parciales/totales y expiraciones.
+    - El coste por poll depende de los deals NUEVOS y de las órdenes activas,
+      nunca del largo del historial de la cuenta.
+    - Los tiempos de MT5 vienen en hora del servidor (DATA_TZ); el guard diario
+      y el diario (close_time) solo reciben UTC real, el mismo reloj que "ahora".
+    - Idempotente: la marca de agua se persiste en la misma transacción que el
+      efecto de cada deal; un reinicio a mitad de poll no re-aplica nada.
+    """
+
+    HWM_TIME_KEY = "recon_last_deal_msc"
+    HWM_TICKET_KEY = "recon_last_deal_ticket"
+
+    def __init__(self, driver, journal, risk_manager=None, lookback_seconds: int = 86400):
+        self.driver = driver
+        self.journal = journal
+        # Opcional: alimenta el guard diario con realizados y marcas a mercado
+        self.risk_manager = risk_manager
+        self.lookback_seconds = lookback_seconds
+
+        # Marca de agua persistida en el propio diario (sobrevive reinicios)
+        self.last_deal_msc = int(self.journal.get_meta(self.HWM_TIME_KEY, 0))
+        self.last_deal_ticket = int(self.journal.get_meta(self.HWM_TICKET_KEY, 0))
+
+        self.unrealized_pnl = 0.0
+
+    def poll(self):
+        """
+        Un ciclo de reconciliación. Devuelve un resumen con el PnL realizado
+        en este ciclo y el flotante actual de las posiciones del diario.
+        """
+        summary = {"deals": 0, "realized_pnl": 0.0, "closed": [], "expired": []}
+
+        # 1. Deals nuevos desde la marca de agua (1s de solape: MT5 filtra por segundos)
+        if self.last_deal_msc:
+            from_ts = self.last_deal_msc / 1000.0 - 1
+        else:
+            # Arranque en frío: "ahora" en el reloj del servidor, que es el que filtra MT5
+            from_ts = utc_to_server_time(time.time()) - self.lookback_seconds
+
+        deals = sorted(
+            self.driver.get_deals(from_ts),
+            key=lambda d: (d.time_msc, d.ticket),
+        )
+        for deal in deals:
+            if (deal.time_msc, deal.ticket) <= (self.last_deal_msc, self.last_deal_ticket):
+                continue
+            hwm = {self.HWM_TIME_KEY: deal.time_msc, self.HWM_TICKET_KEY: deal.ticket}
+            realized, closed_ticket = self._apply_deal(deal, hwm)
+            if closed_ticket is not None:
+                summary["closed"].append(closed_ticket)
+            summary["deals"] += 1
+            summary["realized_pnl"] += realized
+            if self.risk_manager and realized:
+                self.risk_manager.on_realized_pnl(realized, server_time_to_utc(deal.time))
+            self.last_deal_msc, self.last_deal_ticket = deal.time_msc, deal.ticket
+
+        # 2. Estado de los trades activos del diario (conjunto acotado)
+        active = self.journal.get_by_status("PENDING", "OPEN")
+        if active:
+            positions = {p.ticket: p for p in self.driver.get_open_positions()}
+            orders = {o.ticket for o in self.driver.get_pending_orders()}
+            self.unrealized_pnl = 0.0
+
+            for trade in active:
+                ticket = trade["ticket"]
+                if trade["status"] == "OPEN":
+                    # El cierre lo marca el deal OUT; aquí solo valoramos a mercado
+                    if ticket in positions:
+                        pos = positions[ticket]
+                        self.unrealized_pnl += pos.profit + getattr(pos, "swap", 0.0)
+
+                elif trade["status"] == "PENDING" and ticket not in orders:
+                    if ticket in positions:
+                        continue  # Fill aún no visto en deals, llegará en el próximo poll
+                    state = self.driver.get_order_state(ticket)
+                    if state in ("EXPIRED", "CANCELED", "REJECTED"):
+                        self.journal.update_trade(ticket, status=state)
+                        summary["expired"].append(ticket)
+        else:
+            self.unrealized_pnl = 0.0
+
+        summary["unrealized_pnl"] = self.unrealized_pnl
+        if self.risk_manager:
+            self.risk_manager.update_unrealized(self.unrealized_pnl, time.time())
+        return summary
+
+    def _apply_deal(self, deal, hwm):
+        """
+        Aplica un deal al diario junto con su marca de agua 'hwm' (una transacción).
+        Retorna (PnL realizado que aporta, ticket cerrado o None).
+        """
+        realized = (
+            deal.profit
+            + deal.commission
+            + deal.swap
+            + getattr(deal, "fee", 0.0)
+        )
+
+        if deal.entry == DEAL_ENTRY_IN:
+            # Fill (total o parcial) de nuestra orden límite: ticket de diario = orden
+            trade = self.journal.get_trade(deal.order)
+            if trade is None:
+                self.journal.set_meta_many(hwm)  # Deal ajeno: solo avanza la marca
+                return 0.0, None
+            prev_volume = trade["volume"] if trade["status"] == "OPEN" else 0.0
+            new_volume = prev_volume + deal.volume
+            avg_price = (
+                (trade["price"] * prev_volume + deal.price * deal.volume) / new_volume
+                if prev_volume
+                else deal.price
+            )
+            self.journal.update_trade(
+                deal.order,
+                status="OPEN",
+                volume=round(new_volume, 8),
+                price=avg_price,
+                pnl=(trade["pnl"] or 0.0) + realized,
+                meta=hwm,
+            )
+            return realized, None
+
+        # OUT / INOUT / OUT_BY: la posición se identifica por position_id
+        trade = self.journal.get_trade(deal.position_id)
+        if trade is None or trade["status"] != "OPEN":
+            self.journal.set_meta_many(hwm)
+            return 0.0, None
+
+        pnl = (trade["pnl"] or 0.0) + realized
+        remaining = round((trade["volume"] or 0.0) - deal.volume, 8)
+        if remaining > 0:
+            # Cierre parcial: acumulamos PnL realizado, la posición sigue abierta
+            self.journal.update_trade(deal.position_id, volume=remaining, pnl=pnl, meta=hwm)
+            return realized, None
+
+        self.journal.update_trade(
+            deal.position_id,
+            status="CLOSED",
+            pnl=round(pnl, 2),
+            close_time=time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(server_time_to_utc(deal.time))),
+            meta=hwm,
+        )
+        return realized, deal.position_id
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from data_core.frame_cache import (
+    INDICATOR_CODE,
+    ContentHasher,
+    get_indicator_calendar,
+    get_indicator_frame,
+    indicator_fingerprint,
+)
+from data_core.po3_logic import PO3Detector
+
+try:
+    from quant_lab.features import build_features
+except ImportError:
+    build_features = None
+
+
+# Subir esta versión invalida las caches si cambia la lógica de precálculo
+ENGINE_VERSION = 4
+
+# Código que decide señales y probabilidades (además de INDICATOR_CODE, vía el frame)
+REPLAY_CODE = ["data_core/po3_logic.py", "quant_lab/features.py", "execution_engine/replay_engine.py"]
+
+SIGNAL_CODES = {"BULLISH": 1, "BEARISH": -1}
+SIGNAL_NAMES = {1: "BULLISH", -1: "BEARISH"}
+
+
+def _usable_model(model):
+    """Modelo presente y entrenado (un XGBClassifier sin load_model no predice)"""
+    if model is None:
+        return False
+    try:
+        model.get_booster()
+    except AttributeError:
+        return True  # Otro estimador con predict_proba
+    except Exception:
+        return False
+    return True
+
+
+class ReplayEngine:
+    """
+    Motor de Replay para el Modo Demo.
+    - Precalcula UNA vez indicadores, señales PO3 y probabilidades IA de todo el CSV.
+    - Guarda columnas .npy (memory-mapped al reutilizar) indexadas por huella de
+      frame de indicadores + código + modelo: un demo con cache caliente arranca
+      en milisegundos y un cambio de detector o de modelo nunca sirve lo viejo.
+    - Indexa por adelantado los setups de alta probabilidad.
+    """
+
+    COLUMNS = ["time", "open", "high", "low", "close", "signal", "entry", "sl", "tp", "sweep", "prob"]
+
+    def __init__(
+        self,
+        csv_path="data_core/datasets/SYNC_DATA_M1.csv",
+        model_path="quant_lab/models/po3_sniper_v1.json",
+        cache_dir="execution_engine/data/replay_cache",
+    ):
+        self.csv_path = csv_path
+        self.model_path = model_path
+        self.cache_dir = cache_dir
+        self.arrays = None
+        self.key = None
+        self.with_model = False
+        self._build_lock = threading.Lock()
+        self._stamp = None  # (metadatos de las entradas, huella) de la última huella
+
+    # --- CACHE ---
+    def fingerprint(self, with_model: bool = True):
+        """
+        Huella = frame de indicadores (contenido del CSV, Indicators().params(),
+        INDICATOR_CODE) + REPLAY_CODE + contenido del modelo + si hay modelo.
+        Los hashes se recalculan solo si cambian los metadatos de las entradas.
+        """
+        paths = [self.csv_path, self.model_path, *INDICATOR_CODE, *REPLAY_CODE]
+        stamp = [with_model]
+        for path in paths:
+            st = os.stat(path) if os.path.exists(path) else None
+            stamp.append((path, st.st_size, st.st_mtime_ns) if st else (path, None))
+        if self._stamp is not None and self._stamp[0] == stamp:
+            return self._stamp[1]
+        if not os.path.exists(self.csv_path):
+            return None
+
+        hasher = ContentHasher(os.path.join(self.cache_dir, "hash_index.json"))
+        has_model_file = with_model and os.path.exists(self.model_path)
+        payload = {
+            "version": ENGINE_VERSION,
+            "frame": indicator_fingerprint(self.csv_path),
+            "code": hasher.code_hash(REPLAY_CODE),
+            "with_model": with_model,
+            "model": hasher.file_hash(self.model_path) if has_model_file else None,
+        }
+        hasher.save()
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:20]
+        self._stamp = (stamp, key)
+        return key
+
+    def is_ready(self):
+        return self.arrays is not None and self.key == self.fingerprint(self.with_model)
+
+    def ensure_ready(self, model=None, with_model=None):
+        """
+        Carga la cache (mmap) o la construye. Bloqueante: llamar desde un thread.
+        with_model=True sin modelo solo mapea una cache ya construida con modelo
+        (la API remota lee la del motor); nunca construye una sin probabilidades
+        bajo esa clave.
+        """
+        if with_model is None:
+            with_model = _usable_model(model)
+        key = self.fingerprint(with_model)
+        if key is None:
+            return False
+        if self.arrays is not None and self.key == key:
+            return True
+
+        with self._build_lock:
+            path = os.path.join(self.cache_dir, key)
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                if with_model and not _usable_model(model):
+                    return False
+                self._build(path, model if with_model else None)
+
+            arrays = {
+                c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode="r")
+                for c in self.COLUMNS
+            }
+            arrays["setups"] = np.load(os.path.join(path, "setups.npy"))
+            self.arrays, self.key, self.with_model = arrays, key, with_model
+        return True
+
+    def _build(self, path, model):
+        print("🎞 ReplayEngine: precalculando indicadores, señales y probabilidades...")
+        df = get_indicator_frame(self.csv_path)
+        session_hours = get_indicator_calendar(self.csv_path).hour
+        n = len(df)
+
+        signal = np.zeros(n, dtype=np.int8)
+        entry = np.full(n, np.nan)
+        sl = np.full(n, np.nan)
+        tp = np.full(n, np.nan)
+        sweep = np.full(n, np.nan)
+        prob = np.full(n, np.nan)
+
+        # 1. Escaneo único de todo el historial
+        detector = PO3Detector(df)
+        hits, feature_rows = [], []
+        for i in range(50, n):
+            sig = detector.scan_for_signals(i)
+            if not sig:
+                continue
+            signal[i] = SIGNAL_CODES[sig["signal_type"]]
+            entry[i], sl[i], tp[i] = sig["entry_price"], sig["stop_loss"], sig["take_profit"]
+            sweep[i] = sig["sweep_level"]
+            if build_features is not None:
+                row = df.iloc[i]
+                market_ctx = {
+                    "atr": row.get("ATRr_14", 1.0),
+                    "ema_50": row.get("ema_50", 0.0),
+                    "ema_200": row.get("ema_200", 0.0),
+                }
+                feature_rows.append(build_features(row, sig["entry_price"], market_ctx, session_hours[i]))
+                hits.append(i)
+
+        # 2. Inferencia en un solo batch (en vez de predict_proba por vela)
+        if model is not None and feature_rows:
+            try:
+                probs = model.predict_proba(pd.concat(feature_rows, ignore_index=True))[:, 1]
+                prob[np.array(hits)] = probs
+            except Exception as e:
+                print(f"⚠ ReplayEngine: IA no disponible para el precálculo ({e})")
+
+        # 3. Índice de setups (ordenado por tiempo)
+        setups = np.flatnonzero(~np.isnan(prob))
+
+        # Tiempo como epoch ns UTC (independiente de la resolución del índice)
+        idx = df.index
+        if idx.tz is not None:
+            idx = idx.tz_convert("UTC").tz_localize(None)
+        times = idx.values.astype("datetime64[ns]").astype(np.int64)
+
+        os.makedirs(path, exist_ok=True)
+        data = {
+            "time": times,
+            "open": df["open"].to_numpy(np.float64),
+            "high": df["high"].to_numpy(np.float64),
+            "low": df["low"].to_numpy(np.float64),
+            "close": df["close"].to_numpy(np.float64),
+            "signal": signal,
+            "entry": entry,
+            "sl": sl,
+            "tp": tp,
+            "sweep": sweep,
+            "prob": prob,
+        }
+        for name, arr in data.items():
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(arr))
+        np.save(os.path.join(path, "setups.npy"), setups)
+
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"rows": n, "signals": int((signal != 0).sum()), "setups": len(setups)}, f)
+        print(f"💾 ReplayEngine: cache lista ({n} velas, {len(setups)} setups con IA)")
+
+    # --- CONSULTAS ---
+    def find_setup(self, min_prob=0.82):
+        """Índice del setup más reciente con probabilidad > min_prob (o -1)"""
+        setups = self.arrays["setups"]
+        probs = self.arrays["prob"][setups]
+        good = setups[probs > min_prob]
+        return int(good[-1]) if len(good) else -1
+
+    def candle(self, i):
+        a = self.arrays
+        code = int(a["signal"][i])
+        data = {
+            "index": i,
+            "time": str(pd.Timestamp(int(a["time"][i]), tz="UTC")),
+            "open": float(a["open"][i]),
+            "high": float(a["high"][i]),
+            "low": float(a["low"][i]),
+            "close": float(a["close"][i]),
+            "signal": None,
+        }
+        if code:
+            data["signal"] = {
+                "signal_type": SIGNAL_NAMES[code],
+                "entry_price": float(a["entry"][i]),
+                "stop_loss": float(a["sl"][i]),
+                "take_profit": float(a["tp"][i]),
+                "sweep_level": float(a["sweep"][i]),
+                "prob": None if np.isnan(a["prob"][i]) else float(a["prob"][i]),
+            }
+        return data
+
+    async def stream(self, start, end, speed=1.0, candle_seconds=1.5):
+        """Emite velas [start, end] a 'speed' x (candle_seconds por vela a 1x)"""
+        delay = candle_seconds / max(speed, 1e-6)
+        for i in range(max(start, 0), end + 1):
+            yield self.candle(i)
+            await asyncio.sleep(delay)
+
+
+if __name__ == "__main__":
+    # Precalentar la cache offline: python execution_engine/replay_engine.py
+    import xgboost as xgb
+
+    engine = ReplayEngine()
+    clf = None
+    if os.path.exists(engine.model_path):
+        clf = xgb.XGBClassifier()
+        clf.load_model(engine.model_path)
+    engine.ensure_ready(clf)
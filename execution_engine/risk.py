@@ -1,5 +1,29 @@
-import MetaTrader5 as mt5
-import math
+import numpy as np
+import pytz
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    # Backtester / terminal simulada: el guard diario no necesita MT5
+    mt5 = None
+
+
+class ContractSpec(NamedTuple):
+    """Especificación del contrato (snapshot de mt5.symbol_info) para sizing offline"""
+
+    symbol: str
+    tick_value: float
+    tick_size: float
+    volume_step: float
+    volume_min: float
+    volume_max: float
+
+    @property
+    def point_value(self):
+        # Valor monetario de mover 1.00 de precio con 1 lote
+        return self.tick_value / self.tick_size if self.tick_size else 0.0
 
 
 class RiskManager:
@@ -8,71 +32,229 @@ class RiskManager:
     Calcula el tamaño de posición dinámico basado en % de balance y volatilidad (SL).
     """
 
-    def __init__(self, risk_percent=1.0, max_daily_loss=3.0):
+    def __init__(
+        self,
+        risk_percent=1.0,
+        max_daily_loss=3.0,
+        session_tz="America/New_York",
+        session_reset_hour=0,
+    ):
         self.risk_percent = risk_percent
         self.max_daily_loss = max_daily_loss
 
+        # --- Guard de Drawdown Diario (Kill-Switch) ---
+        # La sesión se reinicia en session_reset_hour (hora local de session_tz).
+        self.session_tz = pytz.timezone(session_tz)
+        self.session_reset_hour = session_reset_hour
+        self._next_reset_ts = None  # Epoch del próximo corte de sesión
+        self._day_start_balance = None
+        self._realized_today = 0.0
+        self._unrealized = 0.0
+        self._unrealized_at_start = 0.0
+        self._halted = False
+        self._warned_no_balance = False  # El aviso de balance desconocido se imprime una vez
+
+        # Cache de especificaciones de contrato por símbolo
+        self._spec_cache = {}
+
     def get_lot_size(self, entry_price, sl_price, symbol):
         """
         Calcula lotaje para arriesgar exactamente X% de la cuenta.
         Fórmula: Riesgo_Dinero / (Distancia_Precio * Valor_1_Punto)
         """
         # 1. Obtener Balance
+        if mt5 is None:
+            return 0.01
         account_info = mt5.account_info()
         if account_info is None:
             print("❌ RiskManager: No se pudo obtener info de cuenta")
             return 0.01  # Retorno seguro por defecto
 
         balance = account_info.balance
-        risk_amount = balance * (self.risk_percent / 100)
 
         # 2. Calcular Geometría del Trade
         dist_price = abs(entry_price - sl_price)
         if dist_price == 0:
             return 0.0
 
-        # 3. Obtener Datos del Contrato (Tick Value)
-        symbol_info = mt5.symbol_info(symbol)
-        if symbol_info is None:
+        # 3. Obtener Datos del Contrato (cacheados)
+        spec = self.get_contract_spec(symbol)
+        if spec is None:
             print(f"❌ RiskManager: No info para {symbol}")
             return 0.01
 
-        tick_value = symbol_info.trade_tick_value  # Valor de un tick ($)
-        tick_size = symbol_info.trade_tick_size  # Tamaño de un tick (puntos)
-
-        if tick_size == 0:
+        if spec.tick_size == 0 or spec.point_value == 0 or spec.volume_step == 0:
             return 0.01
 
-        # Valor monetario de mover 1.00 de precio completo
-        # Ej NQ: Si 0.25 pts valen $5, entonces 1.00 pts valen $20.
-        point_value = tick_value * (1.0 / tick_size)
+        # 4. Misma matemática que el sizing vectorizado (una sola fuente de verdad)
+        lots, _ = self.get_lot_sizes([entry_price], [sl_price], [balance], spec)
+        return float(lots[0])
 
-        if point_value == 0:
-            return 0.01
+    def get_contract_spec(self, symbol, refresh=False):
+        """ContractSpec cacheado; solo consulta la terminal la primera vez"""
+        if not refresh and symbol in self._spec_cache:
+            return self._spec_cache[symbol]
+        if mt5 is None:
+            return None
 
-        # 4. Cálculo del lote crudo
-        # Fórmula: Dinero_Riesgo / (Distancia_Puntos * Valor_Por_Punto)
-        raw_lot_size = risk_amount / (dist_price * point_value)
+        symbol_info = mt5.symbol_info(symbol)
+        if symbol_info is None:
+            return None
 
-        # 5. Normalización (Institutional Grade)
-        step = symbol_info.volume_step
-        if step == 0:
-            return 0.01
+        spec = ContractSpec(
+            symbol=symbol,
+            tick_value=symbol_info.trade_tick_value,
+            tick_size=symbol_info.trade_tick_size,
+            volume_step=symbol_info.volume_step,
+            volume_min=symbol_info.volume_min,
+            volume_max=symbol_info.volume_max,
+        )
+        self._spec_cache[symbol] = spec
+        return spec
+
+    def get_lot_sizes(self, entries, stops, balances, spec: ContractSpec, risk_percent=None):
+        """
+        Sizing vectorizado (Backtests / Sweeps).
+        Fórmula por fila: floor((Balance * Riesgo%) / (Distancia * Valor_Punto) / step) * step,
+        acotado a [volume_min, volume_max] del broker.
+
+        Returns:
+            (lots, risk_money): arrays con el lotaje y el dinero realmente arriesgado.
+        """
+        risk_percent = self.risk_percent if risk_percent is None else risk_percent
+        entries = np.asarray(entries, dtype=np.float64)
+        stops = np.asarray(stops, dtype=np.float64)
+        balances = np.broadcast_to(np.asarray(balances, dtype=np.float64), entries.shape)
+
+        dist = np.abs(entries - stops)
+        risk_amount = balances * (risk_percent / 100)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            raw_lots = risk_amount / (dist * spec.point_value)
+            # Redondeo hacia ABAJO para nunca exceder el riesgo
+            lots = np.round(np.floor(raw_lots / spec.volume_step) * spec.volume_step, 2)
+
+        # Límites del Broker (igual que el cálculo unitario)
+        lots = np.clip(lots, spec.volume_min, spec.volume_max)
+        # Sin distancia o sin valor de punto (spec incompleta) no hay tamaño posible
+        lots = np.where((dist > 0) & (spec.point_value > 0), lots, 0.0)
+
+        risk_money = lots * dist * spec.point_value
+        return lots, risk_money
 
-        # Redondeo hacia ABAJO (math.floor) para nunca exceder el riesgo
-        # Matemáticamente: (1.237 / 0.01) = 123.7 -> floor -> 123 -> * 0.01 -> 1.23
-        lot_size = math.floor(raw_lot_size / step) * step
-        lot_size = round(lot_size, 2)  # Limpieza final de decimales flotantes
+    # --- GUARD DIARIO ---
+    def start_session(self, balance, ts=None):
+        """Fija el balance de referencia de la sesión que contiene ts"""
+        ts = self._to_epoch(ts)
+        self._next_reset_ts = self._next_boundary(ts)
+        self._day_start_balance = balance
+        self._realized_today = 0.0
+        self._unrealized_at_start = self._unrealized
+        self._halted = False
 
-        # 6. Límites del Broker
-        lot_size = max(lot_size, symbol_info.volume_min)
-        lot_size = min(lot_size, symbol_info.volume_max)
+    def on_realized_pnl(self, pnl, ts=None):
+        """PnL realizado (deal de cierre, comisión, swap) imputado a la sesión de ts"""
+        self._roll_session(self._to_epoch(ts))
+        self._realized_today += pnl
+
+    def update_unrealized(self, unrealized, ts=None):
+        """Marca a mercado del flotante total de las posiciones abiertas"""
+        self._roll_session(self._to_epoch(ts))
+        self._unrealized = unrealized
+
+    @property
+    def daily_pnl(self):
+        return self._realized_today + (self._unrealized - self._unrealized_at_start)
+
+    def check_daily_drawdown(self, ts=None):
+        """
+        ¿Puedo operar? O(1): compara el PnL diario corriente (realizado + flotante)
+        contra max_daily_loss % del balance de inicio de sesión.
+        Una vez disparado, bloquea hasta el próximo corte de sesión. Sin balance
+        de inicio (ni start_session ni cuenta en la terminal) también bloquea.
+        """
+        self._roll_session(self._to_epoch(ts))
 
-        # Debug Log (Opcional, para ver qué calcula)
-        # print(f"Risk calc: ${risk_amount:.2f} risk / ({dist_price:.2f} dist * ${point_value} val) = {lot_size} lots")
+        if self._day_start_balance is None:
+            balance = self._live_balance()
+            if balance is None:
+                # Sin referencia no se puede medir la pérdida: fail-closed, no se opera
+                if not self._warned_no_balance:
+                    print("🛑 RiskManager: Balance de inicio de sesión desconocido. Trading bloqueado hasta obtenerlo.")
+                    self._warned_no_balance = True
+                return False
+            self._warned_no_balance = False
+            self._day_start_balance = balance - self._realized_today
 
-        return lot_size
+        if self._halted:
+            return False
 
-    def check_daily_drawdown(self):
-        # TODO: Implementar en v2 leyendo historial de deals del día
+        limit = self._day_start_balance * (self.max_daily_loss / 100)
+        if self.daily_pnl <= -limit:
+            self._halted = True
+            print(
+                f"🛑 RiskManager: Pérdida diaria {self.daily_pnl:.2f} alcanzó el límite "
+                f"-{limit:.2f} ({self.max_daily_loss}%). Trading bloqueado hasta nueva sesión."
+            )
+            return False
         return True
+
+    def get_state(self):
+        """Estado del guard diario serializable (checkpoints del backtester)"""
+        return {
+            "next_reset_ts": self._next_reset_ts,
+            "day_start_balance": self._day_start_balance,
+            "realized_today": self._realized_today,
+            "unrealized": self._unrealized,
+            "unrealized_at_start": self._unrealized_at_start,
+            "halted": self._halted,
+        }
+
+    def set_state(self, state):
+        self._next_reset_ts = state["next_reset_ts"]
+        self._day_start_balance = state["day_start_balance"]
+        self._realized_today = state["realized_today"]
+        self._unrealized = state["unrealized"]
+        self._unrealized_at_start = state["unrealized_at_start"]
+        self._halted = state["halted"]
+
+    def _roll_session(self, ts):
+        if self._next_reset_ts is None:
+            self._next_reset_ts = self._next_boundary(ts)
+            return
+        if ts < self._next_reset_ts:
+            return
+
+        # Nueva sesión: el balance de referencia absorbe lo realizado
+        if self._day_start_balance is not None:
+            self._day_start_balance += self._realized_today
+        self._realized_today = 0.0
+        self._unrealized_at_start = self._unrealized
+        self._halted = False
+        self._next_reset_ts = self._next_boundary(ts)
+
+    def _next_boundary(self, ts):
+        """Epoch del próximo corte (DST-aware vía localize)"""
+        local = datetime.fromtimestamp(ts, self.session_tz)
+        naive = datetime(local.year, local.month, local.day, self.session_reset_hour)
+        boundary = self.session_tz.localize(naive)
+        if local >= boundary:
+            boundary = self.session_tz.localize(naive + timedelta(days=1))
+        return boundary.timestamp()
+
+    def _live_balance(self):
+        if mt5 is None:
+            return None
+        account_info = mt5.account_info()
+        return account_info.balance if account_info else None
+
+    @staticmethod
+    def _to_epoch(ts):
+        """Acepta None (ahora), epoch o datetime/Timestamp (naive = UTC)"""
+        if ts is None:
+            return datetime.now(pytz.utc).timestamp()
+        if isinstance(ts, (int, float)):
+            return float(ts)
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=pytz.utc)
+        return ts.timestamp()
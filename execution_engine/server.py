@@ -1,7 +1,13 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 import asyncio
+import hashlib
+import threading
+import time
 import uvicorn
 import os
 import sys
@@ -9,20 +15,215 @@ import json  # <--- NUEVO: Necesario para leer el reporte de backtest
 from pydantic import BaseModel
 from typing import Optional
 
-# Importar nuestro Cerebro Real
+# Importar nuestro Cerebro Real (de forma perezosa: ver Runtime)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from execution_engine.bot_manager import BotManager
+from execution_engine.engine_process import START_ACK_TIMEOUT, EngineCommandError
+from execution_engine.loop_monitor import LoopMonitor, lag_guard
+from execution_engine.metrics import CONTENT_TYPE, REGISTRY, WS_BYTES_SENT, WS_CLIENTS, WS_MESSAGES_SENT
+from execution_engine.payload_codecs import negotiate_http, negotiate_websocket, send_payload
 
-# Instancia Global del Bot
-bot = BotManager()
+# Mismo path que quant_lab/robustness.py (sin importar numpy al arrancar)
+RESULTS_PATH = "execution_engine/backtest_results.json"
+
+# Segundos que un endpoint espera al bot antes de responder 503
+BOOT_WAIT = float(os.getenv("BOOT_WAIT", "30"))
+
+# inprocess: el bot vive en este proceso (un solo worker).
+# remote: el motor corre aparte (execution_engine/engine_process.py) y este
+# proceso solo lee su snapshot compartido; admite varios workers de uvicorn.
+ENGINE_MODE = os.getenv("ENGINE_MODE", "inprocess")
+
+
+class BotNotReady(Exception):
+    pass
+
+
+class Runtime:
+    """
+    Componentes pesados cargados bajo demanda.
+    Importar este módulo no toca pandas, xgboost ni MT5: el BotManager (terminal,
+    historial demo, modelo) se construye en un thread al arrancar el lifespan,
+    o en el primer uso; con ENGINE_MODE=remote se conecta un RemoteBot al motor.
+    El estado se publica en /health.
+    """
+
+    def __init__(self):
+        self.bot = None  # None hasta que el arranque termine
+        self.error = None
+        self.boot_seconds = None
+        self.started_at = time.time()
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._booting = False
+        self._results_store = None
+        self._chart_data = None
+        self._jobs = None
+        # Lag del loop de la API; en modo remoto el motor vigila el suyo
+        self.monitor = LoopMonitor(on_lag=lag_guard(lambda: self.bot if ENGINE_MODE != "remote" else None))
+
+    def start(self):
+        """Lanza la carga del bot en segundo plano (idempotente)"""
+        with self._lock:
+            if self._booting:
+                return
+            self._booting = True
+        threading.Thread(target=self._boot, name="bot-boot", daemon=True).start()
+
+    def _boot(self):
+        t0 = time.perf_counter()
+        try:
+            if ENGINE_MODE == "remote":
+                from execution_engine.engine_process import RemoteBot
+
+                self.bot = RemoteBot(connect_timeout=BOOT_WAIT)
+            else:
+                from execution_engine.bot_manager import BotManager
+
+                self.bot = BotManager()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"❌ SERVIDOR API: el bot no pudo arrancar ({self.error})")
+        finally:
+            self.boot_seconds = round(time.perf_counter() - t0, 3)
+            self._ready.set()
+        if self.bot is not None:
+            print(f"🧠 SERVIDOR API: bot listo en {self.boot_seconds:.2f}s")
+
+    @property
+    def ready(self):
+        return self.bot is not None
+
+    def get_bot(self, timeout: float = BOOT_WAIT):
+        """Bot listo (bloqueante hasta timeout); BotNotReady si sigue arrancando o falló"""
+        if self.bot is not None:
+            return self.bot
+        self.start()
+        if not self._ready.wait(timeout):
+            raise BotNotReady("El motor está arrancando, reintenta en unos segundos")
+        if self.bot is None:
+            raise BotNotReady(f"El motor no pudo arrancar: {self.error}")
+        return self.bot
+
+    async def aget_bot(self, timeout: float = BOOT_WAIT):
+        if self.bot is not None:
+            return self.bot
+        return await asyncio.to_thread(self.get_bot, timeout)
+
+    @property
+    def results_store(self):
+        # Historial completo de backtests (SQLite)
+        if self._results_store is None:
+            with self._lock:
+                if self._results_store is None:
+                    from quant_lab.results_store import ResultsStore
+
+                    self._results_store = ResultsStore()
+        return self._results_store
+
+    @property
+    def jobs(self):
+        # Backtests / entrenamiento / datasets en procesos aparte
+        if self._jobs is None:
+            from execution_engine.jobs import JobManager
+
+            self._jobs = JobManager()
+        return self._jobs
+
+    def chart_data(self, bot):
+        # Gráficos (velas / señales) desde la cache memory-mapped del replay
+        if self._chart_data is None:
+            with self._lock:
+                if self._chart_data is None:
+                    from execution_engine.chart_data import ChartData
+
+                    self._chart_data = ChartData(bot.replay)
+        return self._chart_data
+
+    def health(self):
+        status = "ready" if self.ready else ("error" if self._ready.is_set() else "starting")
+        data = {
+            "status": status,
+            "ready": self.ready,
+            "uptime": round(time.time() - self.started_at, 3),
+            "boot_seconds": self.boot_seconds,
+            "error": self.error,
+        }
+        if self.bot is not None:
+            data["components"] = self.bot.get_health()
+        return data
+
+
+runtime = Runtime()
+
+
+class ResponseCache:
+    """
+    Respuestas ya serializadas (JSON o MessagePack según Accept), invalidadas
+    por el mtime de sus archivos fuente. Cada entrada lleva su ETag: la App
+    revalida con If-None-Match y recibe 304 sin cuerpo si nada cambió.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (stamp, body, etag)
+        # Endpoints sync = threadpool: el OrderedDict se comparte entre threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(sources):
+        # SQLite en WAL escribe primero en el -wal: ambos cuentan
+        stamp = []
+        for path in sources:
+            for p in (path, f"{path}-wal"):
+                stamp.append(os.stat(p).st_mtime_ns if os.path.exists(p) else 0)
+        return tuple(stamp)
+
+    def respond(self, request: Request, key, sources, build):
+        codec = negotiate_http(request)
+        key = (codec.name,) + tuple(key)
+        stamp = self._stamp(sources)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+        if entry is None or entry[0] != stamp:
+            # Construir fuera del lock: una consulta lenta no frena al resto
+            body = codec.encode(build())
+            entry = (stamp, body, f'"{hashlib.sha1(body).hexdigest()[:20]}"')
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        headers = {"ETag": entry[2], "Cache-Control": "no-cache", "Vary": "Accept"}
+        if request.headers.get("if-none-match") == entry[2]:
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry[1], media_type=codec.media_type, headers=headers)
+
+
+response_cache = ResponseCache()
+
+
+def encoded_response(request: Request, data):
+    """Respuesta grande sin cache en el codec que pidió el cliente"""
+    codec = negotiate_http(request)
+    return Response(content=codec.encode(data), media_type=codec.media_type, headers={"Vary": "Accept"})
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🔌 SERVIDOR API: INICIADO")
+    # El puerto ya escucha: el motor (MT5, IA, historial) carga en segundo plano
+    runtime.start()
+    runtime.monitor.start()
     yield
     print("🔌 SERVIDOR API: APAGADO")
-    if bot.is_running:
-        bot.stop()
+    runtime.monitor.stop()
+    if runtime._jobs is not None:
+        runtime._jobs.shutdown()
+    # En modo remoto el motor sigue operando aunque la API se reinicie
+    if ENGINE_MODE != "remote" and runtime.bot is not None and runtime.bot.is_running:
+        runtime.bot.stop()
 
 app = FastAPI(lifespan=lifespan, title="Institutional PO3 Sniper")
 
@@ -34,15 +235,55 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Historiales largos (trades, curvas) viajan comprimidos
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+@app.exception_handler(BotNotReady)
+async def bot_not_ready_handler(request: Request, exc: BotNotReady):
+    return JSONResponse(
+        status_code=503,
+        content={"status": "starting", "message": str(exc)},
+        headers={"Retry-After": "2"},
+    )
+
+@app.exception_handler(EngineCommandError)
+async def engine_command_error_handler(request: Request, exc: EngineCommandError):
+    # El motor ejecutó el comando y falló (p.ej. panic sin poder cerrar en MT5)
+    return JSONResponse(status_code=502, content={"status": "error", "message": str(exc)})
 
 @app.get("/")
 def root():
+    bot = runtime.bot
     return {
-        "status": "Online",
+        "status": "Online" if bot is not None else "Starting",
         "system": "PO3 Sniper Real",
-        "ai_threshold": f"{bot.threshold:.2%}",
+        "ai_threshold": f"{bot.threshold:.2%}" if bot is not None else None,
     }
 
+@app.get("/metrics")
+def metrics():
+    """Métricas en formato de texto de Prometheus (trading, IA, terminal, WebSockets)"""
+    if ENGINE_MODE == "remote" and runtime.bot is not None:
+        # Trading y terminal viven en el motor: cada proceso expone lo suyo
+        body = REGISTRY.expose(skip_empty=True) + runtime.bot.call("metrics")["text"]
+    else:
+        body = REGISTRY.expose()
+    return Response(content=body, media_type=CONTENT_TYPE)
+
+@app.get("/metrics/loop")
+def loop_metrics():
+    """Lag del event loop, bloqueos (con stack), tareas y backlog de WebSockets"""
+    data = {"api": runtime.monitor.snapshot()}
+    if ENGINE_MODE == "remote" and runtime.bot is not None:
+        data["engine"] = runtime.bot.snapshot.get("loop")
+    return data
+
+@app.get("/health")
+def health():
+    """Readiness: 200 con el motor listo, 503 mientras arranca (o si falló)"""
+    data = runtime.health()
+    return JSONResponse(status_code=200 if data["ready"] else 503, content=data)
+
 # --- Modelos Pydantic ---
 class LoginRequest(BaseModel):
     username: str
@@ -52,23 +293,58 @@ class SettingsRequest(BaseModel):
     risk: float
     auto_trade: bool
 
+class JobRequest(BaseModel):
+    kind: str = "backtest"  # pipeline | dataset | train | backtest
+    until: Optional[str] = None
+    force: list = []
+    overrides: dict = {}  # {"backtest": {"risk_percent": 0.5}}
+    publish: bool = True
+
 # --- Endpoints de Control ---
 
+_engine_loop = None  # Task del loop en modo inprocess (referencia fuerte)
+
 @app.post("/bot/start")
 async def start():
-    if not bot.is_running:
-        asyncio.create_task(bot.start_loop())
-        return {"status": "started", "message": "Motor de Trading Iniciado"}
-    return {"status": "already_running", "message": "El motor ya está rugiendo"}
+    global _engine_loop
+    bot = await runtime.aget_bot()
+    started = {"status": "started", "message": "Motor de Trading Iniciado"}
+    already = {"status": "already_running", "message": "El motor ya está rugiendo"}
+    if ENGINE_MODE == "remote":
+        # El motor responde con el loop ya arrancado; si no arrancó -> EngineCommandError (502)
+        try:
+            reply = await bot.start_loop()
+        except (OSError, EOFError) as e:
+            return JSONResponse(status_code=503, content={"status": "error", "message": f"Motor no disponible: {e}"})
+        return already if reply.get("status") == "already_running" else started
+    if bot.is_running:
+        return already
+    # Inprocess: esperar el acuse del loop (o la excepción que lo tumbó)
+    ack = asyncio.Event()
+    task = asyncio.create_task(bot.start_loop(on_started=ack.set))
+    task.add_done_callback(lambda _: ack.set())
+    _engine_loop = task
+    try:
+        await asyncio.wait_for(ack.wait(), START_ACK_TIMEOUT)
+    except asyncio.TimeoutError:
+        return JSONResponse(
+            status_code=504,
+            content={"status": "error", "message": f"El loop no confirmó el arranque en {START_ACK_TIMEOUT:g}s"},
+        )
+    if task.done():
+        exc = None if task.cancelled() else task.exception()
+        detail = f"{type(exc).__name__}: {exc}" if exc else "terminó sin arrancar"
+        return JSONResponse(status_code=500, content={"status": "error", "message": f"El loop no arrancó ({detail})"})
+    return started
 
 @app.post("/bot/stop")
 def stop():
-    bot.stop()
+    runtime.get_bot().stop()
     return {"status": "stopped", "message": "Motor Detenido"}
 
 @app.post("/bot/panic")
 def panic():
-    bot.panic()  # Cierra posiciones en MT5 de verdad
+    runtime.get_bot().panic()  # Cierra posiciones en MT5 de verdad
     return {"status": "panic_executed", "message": "PROTOCOLO DE PÁNICO EJECUTADO"}
 
 # --- Endpoint Auth ---
@@ -84,6 +360,7 @@ def login(req: LoginRequest):
 def update_settings(req: SettingsRequest):
     # Asegúrate de que tu BotManager tenga este método implementado
     # Si no lo tiene, agrégalo en bot_manager.py
+    bot = runtime.get_bot()
     if hasattr(bot, 'update_settings'):
         bot.update_settings(req.risk, req.auto_trade)
         return {"status": "ok", "settings": bot.get_settings()}
@@ -94,55 +371,374 @@ def update_settings(req: SettingsRequest):
 # --- NUEVO: ENDPOINT DE RESULTADOS (BACKTEST) ---
 # Este es el endpoint que consumirá Flutter para mostrar la gráfica de ventas
 @app.get("/api/backtest-results")
-def get_backtest_results():
+def get_backtest_results(request: Request):
     """
     Entrega el JSON generado por backtester.py para mostrar en la App.
+    Se parsea una vez por versión del archivo (cache por mtime + ETag).
     """
-    file_path = "execution_engine/backtest_results.json"
-    
-    if os.path.exists(file_path):
+    file_path = RESULTS_PATH
+
+    def build():
+        if not os.path.exists(file_path):
+            # Mock si no hay datos aún (para que el frontend no falle)
+            return {
+                "summary": {"total_trades": 0, "win_rate": 0, "net_profit": 0},
+                "recent_trades": []
+            }
         with open(file_path, "r") as f:
             data = json.load(f)
+        # La serie completa es para /api/robustness, no para la pantalla
+        data.pop("outcomes", None)
         return data
-    else:
-        # Mock si no hay datos aún (para que el frontend no falle)
-        return {
-            "summary": {"total_trades": 0, "win_rate": 0, "net_profit": 0},
-            "recent_trades": []
-        }
+
+    return response_cache.respond(request, ("results",), [file_path], build)
+
+# --- Historial de Backtests (todas las corridas) ---
+class RunNotFound(LookupError):
+    """Id de corrida inválido o inexistente (404)"""
+
+
+@app.exception_handler(RunNotFound)
+async def run_not_found_handler(request: Request, exc: RunNotFound):
+    return JSONResponse(status_code=404, content={"status": "error", "message": str(exc)})
+
+def _resolve_run(run_id: str):
+    """'latest' o un id numérico -> id numérico existente (RunNotFound si no)"""
+    store = runtime.results_store
+    rid = store.latest_run_id() if run_id == "latest" else (int(run_id) if run_id.isdigit() else None)
+    if rid is None or not store.has_run(rid):
+        raise RunNotFound(f"Corrida no encontrada: {run_id}")
+    return rid
+
+@app.get("/api/backtest/runs")
+def list_backtest_runs(request: Request, page: int = 1, page_size: int = 20, engine: Optional[str] = None):
+    return response_cache.respond(
+        request,
+        ("runs", page, page_size, engine),
+        [runtime.results_store.db_path],
+        lambda: runtime.results_store.list_runs(page, page_size, engine),
+    )
+
+@app.get("/api/backtest/runs/{run_id}")
+def get_backtest_run(request: Request, run_id: str):
+    rid = _resolve_run(run_id)
+    return response_cache.respond(
+        request,
+        ("run", rid),
+        [runtime.results_store.db_path],
+        lambda: runtime.results_store.get_run(rid) or {"status": "error", "message": "Corrida no encontrada"},
+    )
+
+@app.get("/api/backtest/runs/{run_id}/trades")
+def get_backtest_run_trades(
+    request: Request,
+    run_id: str,
+    page: int = 1,
+    page_size: int = 100,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    result: Optional[str] = None,
+):
+    rid = _resolve_run(run_id)
+    return response_cache.respond(
+        request,
+        ("trades", rid, page, page_size, since, until, result),
+        [runtime.results_store.db_path],
+        lambda: runtime.results_store.get_trades(rid, page, page_size, since, until, result),
+    )
+
+@app.get("/api/backtest/runs/{run_id}/equity")
+def get_backtest_run_equity(request: Request, run_id: str, points: int = 500):
+    rid = _resolve_run(run_id)
+    points = max(3, min(points, 5000))
+    return response_cache.respond(
+        request,
+        ("equity", rid, points),
+        [runtime.results_store.db_path],
+        lambda: runtime.results_store.get_equity(rid, points),
+    )
+
+@app.get("/api/backtest/compare")
+def compare_backtest_runs(request: Request, ids: str, points: int = 300):
+    """ids=3,7,9 -> KPIs + curvas reducidas lado a lado"""
+    run_ids = tuple(int(i) for i in ids.split(",") if i.strip().isdigit())[:10]
+    points = max(3, min(points, 2000))
+    return response_cache.respond(
+        request,
+        ("compare", run_ids, points),
+        [runtime.results_store.db_path],
+        lambda: runtime.results_store.compare(run_ids, points),
+    )
+
+# --- Gráficos (resolución adaptada al presupuesto de puntos) ---
+_chart_warmup = None
+
+async def _chart_ready(bot):
+    """
+    True si la cache del replay está lista. Si no, la construye en segundo
+    plano (una sola vez) y la App reintenta: la primera construcción tarda.
+    """
+    global _chart_warmup
+    if bot.replay.is_ready():
+        return True
+    if _chart_warmup is None or _chart_warmup.done():
+        _chart_warmup = asyncio.create_task(asyncio.to_thread(bot.warm_replay))
+    return False
+
+_CHART_WARMING = {"status": "warming", "message": "Preparando datos del gráfico, reintenta en unos segundos"}
+
+@app.get("/api/chart/candles")
+async def get_chart_candles(request: Request, start: Optional[str] = None, end: Optional[str] = None, points: int = 800):
+    """Velas OHLC de [start, end] (ISO o epoch s) agregadas a <= points barras"""
+    bot = await runtime.aget_bot()
+    if not await _chart_ready(bot):
+        return _CHART_WARMING
+    points = max(10, min(points, 5000))
+    try:
+        data = await asyncio.to_thread(runtime.chart_data(bot).candles, start, end, points)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    return encoded_response(request, data)
+
+@app.get("/api/chart/signals")
+async def get_chart_signals(
+    request: Request,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    min_prob: float = 0.0,
+    limit: int = 500,
+):
+    """Setups PO3 del rango: FVG (entrada), nivel barrido, SL/TP y probabilidad IA"""
+    bot = await runtime.aget_bot()
+    if not await _chart_ready(bot):
+        return _CHART_WARMING
+    limit = max(1, min(limit, 5000))
+    try:
+        data = await asyncio.to_thread(runtime.chart_data(bot).signals, start, end, min_prob, limit)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    return encoded_response(request, data)
+
+@app.get("/api/chart/equity")
+def get_chart_equity(
+    request: Request,
+    run_id: str = "latest",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    points: int = 500,
+):
+    """Curva de equity de una corrida recortada a [start, end] y reducida con LTTB"""
+    rid = _resolve_run(run_id)
+    points = max(3, min(points, 5000))
+    return response_cache.respond(
+        request,
+        ("chart_equity", rid, start, end, points),
+        [runtime.results_store.db_path],
+        lambda: runtime.results_store.get_equity(rid, points, start, end),
+    )
+
+# --- Jobs (pipeline de quant_lab en procesos aparte) ---
+@app.post("/api/jobs")
+async def submit_job(req: JobRequest):
+    try:
+        job = runtime.jobs.submit(req.kind, req.until, req.force, req.overrides, req.publish)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "queued", "job_id": job.id}
+
+@app.get("/api/jobs")
+async def list_jobs():
+    return {"jobs": runtime.jobs.list()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: int):
+    job = runtime.jobs.get(job_id)
+    if job is None:
+        return {"status": "error", "message": "Job no encontrado"}
+    return job.to_dict()
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int):
+    if runtime.jobs.cancel(job_id):
+        return {"status": "cancelling", "job_id": job_id}
+    return {"status": "error", "message": "Job inexistente o ya terminado"}
+
+# --- Robustez (Monte Carlo sobre el último backtest) ---
+_robustness_cache = {}
+
+# Límites de /api/robustness: cada request ocupa el pool compartido
+MAX_ROBUSTNESS_PATHS = 100_000
+MAX_ROBUSTNESS_RISKS = 8
+
+
+def _parse_risks(risks: str):
+    """'0.5,1,2' -> (0.5, 1.0, 2.0); ValueError si algún valor no es un % de riesgo válido"""
+    values = tuple(float(r) for r in risks.split(",") if r.strip())
+    if not values or len(values) > MAX_ROBUSTNESS_RISKS:
+        raise ValueError(f"Entre 1 y {MAX_ROBUSTNESS_RISKS} riesgos separados por coma")
+    if not all(0 < v <= 100 for v in values):
+        raise ValueError("Cada riesgo debe estar en (0, 100]")
+    return values
+
+
+@app.get("/api/robustness")
+async def get_robustness(
+    paths: int = Query(10000, ge=100, le=MAX_ROBUSTNESS_PATHS),
+    risks: str = "0.5,1,2",
+    method: str = "bootstrap",
+    compounding: bool = True,
+):
+    """
+    Distribuciones de drawdown / recuperación / ruina remuestreando los trades
+    del último backtest. Se calcula en el pool de procesos compartido de los
+    jobs y se cachea hasta que el reporte cambie en disco.
+    """
+    from quant_lab.robustness import load_outcomes, run_robustness
+
+    try:
+        risk_list = _parse_risks(risks)
+    except ValueError as e:
+        return JSONResponse(status_code=422, content={"status": "error", "message": f"risks inválido: {e}"})
+    if method not in ("bootstrap", "permutation"):
+        return JSONResponse(status_code=422, content={"status": "error", "message": f"Método desconocido: {method}"})
+    if not os.path.exists(RESULTS_PATH):
+        return {"status": "error", "message": "No hay backtest todavía"}
+
+    key = (os.stat(RESULTS_PATH).st_mtime_ns, paths, risk_list, method, compounding)
+
+    if key not in _robustness_cache:
+        try:
+            outcomes = await asyncio.to_thread(load_outcomes, RESULTS_PATH)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        jobs = runtime.jobs
+        report = await asyncio.to_thread(
+            run_robustness,
+            outcomes,
+            risk_list,
+            paths,
+            method,
+            compounding,
+            workers=jobs.compute_workers,
+            executor=jobs.executor,
+        )
+        if len(_robustness_cache) >= 16:
+            _robustness_cache.clear()
+        _robustness_cache[key] = report
+    return _robustness_cache[key]
+
+# --- Diario de Operaciones (Paginado) ---
+@app.get("/api/trades")
+def get_trades(
+    page: int = 1,
+    page_size: int = 50,
+    symbol: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    demo: bool = False,
+):
+    """
+    Historial paginado desde el diario persistente.
+    demo=true consulta el historial sintético (nunca mezclado con el real).
+    """
+    bot = runtime.get_bot()
+    journal = bot.demo_journal if demo else bot.journal
+    return journal.get_trades(page, page_size, symbol, status, since, until)
+
+# --- Log estructurado ---
+@app.get("/api/logs")
+def get_logs(since: int = 0, limit: int = 200, level: Optional[str] = None):
+    """
+    Registros con seq > since (level, ts, code, fields). La App guarda
+    'next_since' y vuelve a pedir solo lo nuevo.
+    """
+    bot = runtime.get_bot()
+    return bot.get_logs(since, min(max(limit, 1), 1000), level.upper() if level else None)
 
 # --- Simulacion ---
 @app.post("/bot/simulate")
-async def simulate():
+async def simulate(speed: float = 1.0):
+    bot = await runtime.aget_bot()
     if not bot.is_running:
-        asyncio.create_task(bot.simulate_winning_scenario())
+        asyncio.create_task(bot.simulate_winning_scenario(speed=max(speed, 0.1)))
         return {"status": "simulation_started", "message": "Modo Demo Iniciado"}
     return {"status": "error", "message": "Detén el bot antes de simular"}
 
+async def _ws_send(websocket: WebSocket, fmt, data, channel="state"):
+    # Un envío que tarda en volver = cliente lento (backlog en /metrics/loop)
+    async with runtime.monitor.track_send(id(websocket)):
+        size = await send_payload(websocket, fmt, data)
+    WS_BYTES_SENT.labels(channel).inc(size)
+    WS_MESSAGES_SENT.labels(channel).inc()
+
+def _ws_state(bot):
+    """Foto del estado para /ws (bloqueante: se ejecuta en un thread)"""
+    return {
+        "running": bot.is_running,
+        "ready": True,
+        "status_text": bot.latest_status,
+        "logs": bot.recent_logs(15),
+        "account": bot.get_balance_equity(),     # {balance, equity}
+        "settings": bot.get_settings(),          # {risk, auto_trade}
+        "statistics": bot.get_statistics(),      # {win_rate, profit_factor, total_pnl, max_drawdown}
+        "recent_trades": bot.get_recent_trades(20), # Últimos 20 para display (solo reales)
+        "demo_statistics": bot.get_demo_statistics(), # Historial sintético, separado
+        "instruments": bot.get_instrument_stats(), # Estado y latencia por instrumento
+    }
+
 # --- WebSocket para Flutter ---
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
+    # Formato por cliente: JSON (texto) o MessagePack, con/sin deflate por mensaje
+    fmt, subprotocol = negotiate_websocket(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    WS_CLIENTS.labels("state").inc()
     try:
         while True:
-            # Obtenemos datos del bot de manera segura
-            financials = bot.get_balance_equity()
-            config = bot.get_settings()
-            stats = bot.get_statistics()
-            
-            data = {
-                "running": bot.is_running,
-                "status_text": bot.latest_status,
-                "logs": bot.logs[-15:],
-                "account": financials,       # {balance, equity}
-                "settings": config,          # {risk, auto_trade}
-                "statistics": stats,         # {win_rate, profit_factor, total_pnl}
-                "recent_trades": bot.trade_history[-20:] # Últimos 20 para display
-            }
-            await websocket.send_json(data)
+            bot = runtime.bot
+            if bot is None:
+                # El motor sigue cargando: la App muestra el estado de arranque
+                await _ws_send(websocket, fmt, {**runtime.health(), "running": False, "status_text": "STARTING"})
+                await asyncio.sleep(1)
+                continue
+
+            # La cuenta y el diario tocan MT5 / SQLite: fuera del event loop
+            data = await asyncio.to_thread(_ws_state, bot)
+            await _ws_send(websocket, fmt, data)
             await asyncio.sleep(1)
     except WebSocketDisconnect:
         print("📱 Cliente Flutter desconectado")
+    finally:
+        WS_CLIENTS.labels("state").dec()
+        runtime.monitor.forget_client(id(websocket))
+
+@app.websocket("/ws/jobs")
+async def jobs_websocket(websocket: WebSocket, job_id: Optional[int] = None):
+    """Progreso de jobs en vivo (todos, o solo job_id): estado, etapas y resultados parciales"""
+    fmt, subprotocol = negotiate_websocket(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    jobs = runtime.jobs
+    events = jobs.subscribe()
+    WS_CLIENTS.labels("jobs").inc()
+    try:
+        # Foto inicial para que la App no dependa de haber visto el inicio
+        if job_id is None:
+            snapshot = jobs.list()
+        else:
+            job = jobs.get(job_id)
+            snapshot = [job.to_dict()] if job else []
+        await _ws_send(websocket, fmt, {"type": "snapshot", "jobs": snapshot}, "jobs")
+        while True:
+            event = await events.get()
+            if job_id is None or event["job_id"] == job_id:
+                await _ws_send(websocket, fmt, event, "jobs")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        jobs.unsubscribe(events)
+        WS_CLIENTS.labels("jobs").dec()
+        runtime.monitor.forget_client(id(websocket))
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,241 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from data_core.indicator_stream import IndicatorStream
+
+# Velas pedidas por tick una vez que la ventana en vivo está cargada
+LIVE_TAIL_CANDLES = int(os.getenv("LIVE_TAIL_CANDLES", "10"))
+
+
+def parse_instruments(spec: str, default_symbol: str, default_corr: str):
+    """
+    'USTEC:US500,DE40:STOXX50' -> [('USTEC', 'US500'), ('DE40', 'STOXX50')]
+    Sin especificación se usa el par clásico del driver (NQ/ES).
+    """
+    if not spec:
+        return [(default_symbol, default_corr)]
+    pairs = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        symbol, _, corr = item.partition(":")
+        pairs.append((symbol.strip(), corr.strip() or None))
+    return pairs
+
+
+def signal_key_of(signal):
+    """Identidad de una señal: la misma barra no se evalúa dos veces"""
+    return (signal["timestamp"], signal["signal_type"], signal["entry_price"])
+
+
+class CandleCache:
+    """
+    Cache compartida de velas entre instancias.
+    Un símbolo usado por varias estrategias (ej. ES como pata correlacionada)
+    se descarga una sola vez por ventana de refresco.
+    La ventana es móvil: tras la primera descarga completa solo se piden las
+    últimas LIVE_TAIL_CANDLES velas y se empalman sobre la anterior; con
+    'indicators' cada ventana nueva actualiza además un IndicatorStream por
+    (símbolo, n), así que los indicadores tampoco se recalculan completos.
+    """
+
+    def __init__(self, driver, ttl_seconds: float = 2.0, recorder=None, indicators=None, tail: int = None):
+        self.driver = driver
+        self.ttl = ttl_seconds
+        # MarketRecorder opcional: cada descarga queda grabada (frame o delta)
+        self.recorder = recorder
+        self.indicators = indicators
+        self.tail = tail if tail is not None else LIVE_TAIL_CANDLES
+        self._entries = {}  # (symbol, n) -> (fetched_at, df, version, features)
+        self._streams = {}  # (symbol, n) -> IndicatorStream
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, symbol: str, n_candles: int = 500):
+        return self.get_with_version(symbol, n_candles)[0]
+
+    def get_with_version(self, symbol: str, n_candles: int = 500):
+        """(df, versión grabada): la versión liga la decisión con el frame exacto"""
+        entry = self._refresh(symbol, n_candles)
+        return entry[1], entry[2]
+
+    def get_features(self, symbol: str, n_candles: int = 500):
+        """
+        (frame con indicadores, versión grabada). El frame es compartido entre
+        instancias: no se modifica (copiar antes de escribir).
+        """
+        entry = self._refresh(symbol, n_candles)
+        return entry[3], entry[2]
+
+    def _refresh(self, symbol, n_candles):
+        key = (symbol, n_candles)
+        with self._lock_for(key):
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry and now - entry[0] < self.ttl:
+                return entry
+            df = self._fetch(symbol, n_candles, entry[1] if entry else None)
+            version = self.recorder.record_frame(symbol, n_candles, df) if self.recorder else 0
+            features = None
+            if self.indicators is not None and df is not None:
+                stream = self._streams.get(key)
+                if stream is None:
+                    stream = self._streams[key] = IndicatorStream(self.indicators)
+                features = stream.update(df)
+            entry = self._entries[key] = (now, df, version, features)
+            return entry
+
+    def _fetch(self, symbol, n_candles, prev):
+        """Ventana de n velas: solo la cola si empalma con la anterior, completa si no"""
+        if prev is not None and len(prev) == n_candles and 0 < self.tail < n_candles:
+            tail = self.driver.get_market_data(symbol=symbol, n_candles=self.tail)
+            # La cola debe arrancar dentro de la ventana anterior (sin hueco de velas)
+            if (
+                tail is not None
+                and len(tail)
+                and list(tail.columns) == list(prev.columns)
+                and prev.index[0] <= tail.index[0] <= prev.index[-1]
+            ):
+                return pd.concat([prev[prev.index < tail.index[0]], tail]).iloc[-n_candles:]
+        return self.driver.get_market_data(symbol=symbol, n_candles=n_candles)
+
+    def clear(self):
+        self._entries.clear()
+        self._streams.clear()
+
+
+class StrategyInstance:
+    """Estado independiente de la estrategia PO3 para un par (principal, correlacionado)"""
+
+    def __init__(self, symbol: str, corr_symbol: str = None):
+        self.symbol = symbol
+        self.corr_symbol = corr_symbol
+
+        self.busy = False
+        self.cooldown_until = 0.0
+        self.last_signal_key = None
+        self.status = "IDLE"
+
+        # Latencia de decisión por barra (segundos)
+        self.last_latency = 0.0
+        self.avg_latency = 0.0
+        self.max_latency = 0.0
+        self.evaluations = 0
+        self.skipped_ticks = 0
+        self.errors = 0
+
+        # Espera del lock de la terminal por barra (segundos): la parte de la
+        # latencia que se va en esperar a otros instrumentos
+        self.last_lock_wait = 0.0
+        self.avg_lock_wait = 0.0
+        self.max_lock_wait = 0.0
+        self._lock_waits = 0
+
+    def record_lock_wait(self, seconds: float):
+        self.last_lock_wait = seconds
+        self.max_lock_wait = max(self.max_lock_wait, seconds)
+        self._lock_waits += 1
+        alpha = 0.1 if self._lock_waits > 1 else 1.0
+        self.avg_lock_wait += alpha * (seconds - self.avg_lock_wait)
+
+    def record_latency(self, seconds: float):
+        self.last_latency = seconds
+        self.max_latency = max(self.max_latency, seconds)
+        self.evaluations += 1
+        # Media móvil exponencial: barata y estable
+        alpha = 0.1 if self.evaluations > 1 else 1.0
+        self.avg_latency += alpha * (seconds - self.avg_latency)
+
+    def get_stats(self):
+        return {
+            "symbol": self.symbol,
+            "corr_symbol": self.corr_symbol,
+            "status": self.status,
+            "busy": self.busy,
+            "last_latency_ms": round(self.last_latency * 1000, 2),
+            "avg_latency_ms": round(self.avg_latency * 1000, 2),
+            "max_latency_ms": round(self.max_latency * 1000, 2),
+            "last_lock_wait_ms": round(self.last_lock_wait * 1000, 2),
+            "avg_lock_wait_ms": round(self.avg_lock_wait * 1000, 2),
+            "max_lock_wait_ms": round(self.max_lock_wait * 1000, 2),
+            "evaluations": self.evaluations,
+            "skipped_ticks": self.skipped_ticks,
+            "errors": self.errors,
+        }
+
+
+class MultiStrategyRunner:
+    """
+    Ejecuta N instancias PO3 en paralelo sobre una sola conexión de terminal.
+    - Cada instancia se agenda como tarea independiente en un pool de workers:
+      una instancia lenta nunca retrasa a las demás.
+    - Si una instancia aún procesa la barra anterior, se salta el tick (no se encola).
+    - 'lock_wait_fn' (ej. MT5Driver.take_lock_wait) devuelve y reinicia la espera
+      del lock de la terminal del thread actual: queda por instancia en get_stats.
+    """
+
+    def __init__(self, evaluate_fn, instruments, max_workers: int = None, on_error=None, lock_wait_fn=None):
+        self.evaluate_fn = evaluate_fn
+        self.on_error = on_error
+        self.lock_wait_fn = lock_wait_fn
+        self.instances = [StrategyInstance(sym, corr) for sym, corr in instruments]
+        workers = max_workers or int(os.getenv("RUNNER_WORKERS", len(self.instances) + 1))
+        self.pool = ThreadPoolExecutor(
+            max_workers=max(workers, len(self.instances)),
+            thread_name_prefix="po3-worker",
+        )
+        self._tasks = set()
+
+    def tick(self):
+        """Agenda la evaluación de cada instancia libre (no bloquea)"""
+        loop = asyncio.get_running_loop()
+        for instance in self.instances:
+            if instance.busy:
+                instance.skipped_ticks += 1
+                continue
+            instance.busy = True
+            task = loop.create_task(self._run_instance(loop, instance))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_instance(self, loop, instance):
+        start = time.perf_counter()
+        try:
+            await loop.run_in_executor(self.pool, self._evaluate, instance)
+        except Exception as e:
+            instance.errors += 1
+            if self.on_error:
+                self.on_error(instance, e)
+        finally:
+            instance.record_latency(time.perf_counter() - start)
+            instance.busy = False
+
+    def _evaluate(self, instance):
+        """En el worker: la espera del lock se mide en el mismo thread que evalúa"""
+        if self.lock_wait_fn is None:
+            return self.evaluate_fn(instance)
+        self.lock_wait_fn()
+        try:
+            return self.evaluate_fn(instance)
+        finally:
+            instance.record_lock_wait(self.lock_wait_fn())
+
+    def get_stats(self):
+        return [inst.get_stats() for inst in self.instances]
+
+    def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,347 @@
+import sqlite3
+import threading
+import os
+from datetime import datetime, timezone
+
+
+class TradeJournal:
+    """
+    Diario de Operaciones Persistente (SQLite en modo WAL).
+    - Sobrevive reinicios del servidor (reemplaza la lista en memoria trade_history).
+    - Índices por tiempo, símbolo y estado para consultas paginadas desde la App.
+    - Agregados (Win Rate, Profit Factor, PnL, Max Drawdown) mantenidos de forma
+      incremental: get_statistics() es O(1), no recorre el historial.
+    - time / close_time en UTC (hora de pared, sin zona).
+    """
+
+    COLUMNS = [
+        "ticket",
+        "symbol",
+        "type",
+        "price",
+        "volume",
+        "sl",
+        "tp",
+        "time",
+        "close_time",
+        "status",
+        "pnl",
+        "comment",
+    ]
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv(
+            "JOURNAL_PATH", "execution_engine/data/trade_journal.db"
+        )
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+
+        # Una sola conexión compartida, serializada con lock (el loop y los workers la usan)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        self._stats = self._load_stats()
+
+    def _create_schema(self):
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS trades (
+                    ticket INTEGER PRIMARY KEY,
+                    symbol TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    volume REAL DEFAULT 0.0,
+                    sl REAL DEFAULT 0.0,
+                    tp REAL DEFAULT 0.0,
+                    time TEXT NOT NULL,
+                    close_time TEXT,
+                    status TEXT NOT NULL,
+                    pnl REAL DEFAULT 0.0,
+                    comment TEXT
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_trades_time ON trades(time)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_trades_symbol_time ON trades(symbol, time)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_trades_status_time ON trades(status, time)"
+            )
+            # Fila única con los agregados incrementales
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    closed_trades INTEGER DEFAULT 0,
+                    wins INTEGER DEFAULT 0,
+                    gross_profit REAL DEFAULT 0.0,
+                    gross_loss REAL DEFAULT 0.0,
+                    total_pnl REAL DEFAULT 0.0,
+                    peak_pnl REAL DEFAULT 0.0,
+                    max_drawdown REAL DEFAULT 0.0
+                )
+                """
+            )
+            self._conn.execute("INSERT OR IGNORE INTO stats (id) VALUES (1)")
+            # Clave/Valor para estado auxiliar (ej. marcas de agua del reconciliador)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    def _load_stats(self):
+        row = self._conn.execute("SELECT * FROM stats WHERE id = 1").fetchone()
+        stats = dict(row)
+        stats.pop("id", None)
+        return stats
+
+    # --- ESCRITURA ---
+    def record_trade(self, trade: dict):
+        """
+        Inserta (o reemplaza) un trade. Si llega ya CERRADO, actualiza los agregados;
+        si reemplaza uno CERRADO con otro PnL (o lo reabre), los recalcula.
+        """
+        record = {c: trade.get(c) for c in self.COLUMNS}
+        record["time"] = self._fmt_time(record["time"] or datetime.now(timezone.utc))
+        record["status"] = record["status"] or "OPEN"
+        record["pnl"] = float(record["pnl"] or 0.0)
+
+        with self._lock:
+            with self._conn:
+                prev = self._conn.execute(
+                    "SELECT status, pnl FROM trades WHERE ticket = ?", (record["ticket"],)
+                ).fetchone()
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO trades ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                    [record[c] for c in self.COLUMNS],
+                )
+                stats = self._stats_change(prev, record["status"], record["pnl"])
+            # En memoria solo tras el commit: un rollback no deja agregados fantasma
+            if stats is not None:
+                self._stats = stats
+
+    def update_trade(self, ticket: int, meta: dict = None, **fields):
+        """
+        Actualiza campos de un trade existente. La transición a CLOSED alimenta
+        los agregados una única vez (idempotente ante re-cierres); corregir el
+        PnL de un trade ya CERRADO los recalcula. 'meta' se escribe en la misma
+        transacción (ej. la marca de agua del deal que originó el cambio).
+        """
+        fields = {k: v for k, v in fields.items() if k in self.COLUMNS and k != "ticket"}
+        if not fields:
+            return False
+        if "close_time" in fields and fields["close_time"] is not None:
+            fields["close_time"] = self._fmt_time(fields["close_time"])
+
+        with self._lock:
+            with self._conn:
+                prev = self._conn.execute(
+                    "SELECT status, pnl FROM trades WHERE ticket = ?", (ticket,)
+                ).fetchone()
+                if prev is None:
+                    return False
+                assignments = ", ".join(f"{k} = ?" for k in fields)
+                self._conn.execute(
+                    f"UPDATE trades SET {assignments} WHERE ticket = ?",
+                    [*fields.values(), ticket],
+                )
+                if meta:
+                    self._write_meta(meta)
+                stats = self._stats_change(
+                    prev,
+                    fields.get("status", prev["status"]),
+                    float(fields.get("pnl", prev["pnl"]) or 0.0),
+                )
+            if stats is not None:
+                self._stats = stats
+        return True
+
+    def _stats_change(self, prev, status: str, pnl: float):
+        """
+        Agregados nuevos tras escribir un trade (None = sin cambios). Debe
+        llamarse dentro de la transacción; persiste la fila de stats.
+        """
+        was_closed = prev is not None and prev["status"] == "CLOSED"
+        if status == "CLOSED" and not was_closed:
+            stats = self._after_close(dict(self._stats), pnl)
+        elif was_closed and (status != "CLOSED" or float(prev["pnl"] or 0.0) != pnl):
+            # El drawdown depende del orden: corregir un cierre exige recorrer la curva (raro)
+            stats = self._rebuild_stats()
+        else:
+            return None
+        self._save_stats(stats)
+        return stats
+
+    @staticmethod
+    def _after_close(s: dict, pnl: float) -> dict:
+        """Actualización O(1) de agregados con un cierre"""
+        s["closed_trades"] += 1
+        s["total_pnl"] += pnl
+        if pnl > 0:
+            s["wins"] += 1
+            s["gross_profit"] += pnl
+        else:
+            s["gross_loss"] += abs(pnl)
+
+        # Drawdown sobre la curva de PnL acumulado (en orden de cierre)
+        s["peak_pnl"] = max(s["peak_pnl"], s["total_pnl"])
+        s["max_drawdown"] = max(s["max_drawdown"], s["peak_pnl"] - s["total_pnl"])
+        return s
+
+    def _rebuild_stats(self) -> dict:
+        """Agregados desde cero sobre los trades CERRADOS, en orden de cierre"""
+        s = dict.fromkeys(self._stats, 0)
+        for (pnl,) in self._conn.execute(
+            "SELECT pnl FROM trades WHERE status = 'CLOSED' ORDER BY close_time, ticket"
+        ):
+            self._after_close(s, float(pnl or 0.0))
+        return s
+
+    def _save_stats(self, s: dict):
+        self._conn.execute(
+            """
+            UPDATE stats SET closed_trades = ?, wins = ?, gross_profit = ?, gross_loss = ?,
+                total_pnl = ?, peak_pnl = ?, max_drawdown = ?
+            WHERE id = 1
+            """,
+            (
+                s["closed_trades"],
+                s["wins"],
+                s["gross_profit"],
+                s["gross_loss"],
+                s["total_pnl"],
+                s["peak_pnl"],
+                s["max_drawdown"],
+            ),
+        )
+
+    # --- LECTURA ---
+    def get_statistics(self):
+        """KPIs en O(1) desde los agregados incrementales"""
+        s = self._stats
+        total = s["closed_trades"]
+        win_rate = (s["wins"] / total) if total > 0 else 0.0
+        if total == 0:
+            pf = 0.0
+        else:
+            pf = (s["gross_profit"] / s["gross_loss"]) if s["gross_loss"] > 0 else 99.99
+
+        return {
+            "win_rate": round(win_rate * 100, 2),
+            "profit_factor": round(pf, 2),
+            "total_pnl": round(s["total_pnl"], 2),
+            "total_trades": total,
+            "max_drawdown": round(s["max_drawdown"], 2),
+        }
+
+    def get_trades(
+        self,
+        page: int = 1,
+        page_size: int = 50,
+        symbol: str = None,
+        status: str = None,
+        since: str = None,
+        until: str = None,
+    ):
+        """Consulta paginada (más recientes primero) usando los índices"""
+        page = max(1, int(page))
+        page_size = max(1, min(int(page_size), 500))
+
+        where, params = [], []
+        if symbol:
+            where.append("symbol = ?")
+            params.append(symbol)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if since:
+            where.append("time >= ?")
+            params.append(self._fmt_time(since))
+        if until:
+            where.append("time <= ?")
+            params.append(self._fmt_time(until))
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM trades {clause}", params
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM trades {clause} ORDER BY time DESC, ticket DESC LIMIT ? OFFSET ?",
+                [*params, page_size, (page - 1) * page_size],
+            ).fetchall()
+
+        return {
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "trades": [dict(r) for r in rows],
+        }
+
+    def recent(self, n: int = 20):
+        """Últimos N trades en orden cronológico (formato del WebSocket)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM trades ORDER BY time DESC, ticket DESC LIMIT ?", (n,)
+            ).fetchall()
+        return [dict(r) for r in reversed(rows)]
+
+    def get_trade(self, ticket: int):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM trades WHERE ticket = ?", (ticket,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_by_status(self, *statuses):
+        """Trades activos (PENDING/OPEN). Conjunto pequeño gracias al índice de estado."""
+        marks = ", ".join("?" * len(statuses))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM trades WHERE status IN ({marks}) ORDER BY time", statuses
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+    # --- META ---
+    def get_meta(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key: str, value):
+        self.set_meta_many({key: value})
+
+    def set_meta_many(self, values: dict):
+        """Varias claves en una sola transacción (todas o ninguna)"""
+        with self._lock, self._conn:
+            self._write_meta(values)
+
+    def _write_meta(self, values: dict):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()],
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _fmt_time(value):
+        """Normaliza a 'YYYY-MM-DD HH:MM:SS' (orden lexicográfico == cronológico)"""
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        return str(value)[:19]
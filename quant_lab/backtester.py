@@ -1,15 +1,29 @@
 import pandas as pd
 import numpy as np
 import xgboost as xgb
+import argparse
+import hashlib
 import json
 import os
+import shutil
 import sys
 from datetime import timedelta
 
 # Imports del sistema para encontrar módulos hermanos
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from data_core.po3_logic import PO3Detector
+from data_core.frame_cache import (
+    INDICATOR_CODE,
+    ContentHasher,
+    get_indicator_frame,
+    load_frame,
+    load_sync_csv,
+    save_frame,
+)
 from data_core.indicators import Indicators
+from data_core.session_calendar import calendar_for
+from execution_engine.risk import RiskManager, ContractSpec
+from quant_lab.results_store import ResultsStore
 
 # Intentar importar la librería de features centralizada
 try:
@@ -19,11 +33,53 @@ except ImportError:
     sys.exit(1)
 
 
+# Contrato por defecto para simular sin terminal (CFD índice: 1 lote = $1 por punto)
+DEFAULT_CONTRACT = ContractSpec(
+    symbol="USTEC",
+    tick_value=0.01,
+    tick_size=0.01,
+    volume_step=0.01,
+    volume_min=0.01,
+    volume_max=100.0,
+)
+
+
+# Código cuya versión invalida un checkpoint (otra lógica = otros resultados)
+CHECKPOINT_CODE = [
+    "quant_lab/backtester.py",
+    "quant_lab/features.py",
+    "data_core/po3_logic.py",
+    "execution_engine/risk.py",
+    *INDICATOR_CODE,
+]
+OHLC = ["open", "high", "low", "close"]
+
+
 class Backtester:
-    def __init__(self, data_path, model_path, config_path):
+    MAX_HOLDING = 45  # velas (minutos en M1)
+    SCAN_START = 50
+
+    def __init__(
+        self,
+        data_path,
+        model_path,
+        config_path,
+        risk_percent=1.0,
+        compounding=False,
+        contract_spec: ContractSpec = None,
+        output_file="execution_engine/backtest_results.json",
+        checkpoint_dir=None,
+        results_db=None,
+    ):
         self.data_path = data_path
+        self.output_file = output_file
+        self.model_path = model_path
         self.model = xgb.XGBClassifier()
         self.model.load_model(model_path)
+        # Checkpoint incremental: None = siempre desde cero
+        self.checkpoint_dir = checkpoint_dir
+        # Historial de corridas (None = BACKTEST_DB o la ruta por defecto)
+        self.results_db = results_db
 
         with open(config_path, "r") as f:
             conf = json.load(f)
@@ -33,8 +89,23 @@ class Backtester:
 
         # Estadísticas
         self.trades = []
-        self.balance = 10000.0  # Balance inicial simulado
-        self.equity_curve = [10000.0]
+        self.r_multiples = []  # Resultado de cada trade en R (para robustness.py)
+        self.initial_balance = 10000.0
+        self.balance = self.initial_balance  # Balance inicial simulado
+        self.equity_curve = [self.initial_balance]
+        # Balance con solo los trades ya CERRADOS (lo que ve la cuenta al entrar)
+        self.realized_balance = self.initial_balance
+
+        # Sizing: mismo RiskManager que en vivo (floor al step + límites del broker)
+        # compounding=False dimensiona siempre sobre el balance inicial (riesgo fijo);
+        # compounding=True sobre realized_balance (sin PnL de trades aún abiertos)
+        self.compounding = compounding
+        self.contract_spec = contract_spec or DEFAULT_CONTRACT
+
+        # Mismo Kill-Switch diario que en vivo (sesión NY, corte a medianoche)
+        self.risk_manager = RiskManager(risk_percent=risk_percent)
+        self.pending_pnl = []  # (timestamp_salida, pnl) aún no realizados
+        self.blocked_signals = 0
 
     def load_and_prep_data(self):
         print("📂 Cargando datos de prueba...")
@@ -42,40 +113,45 @@ class Backtester:
             print(f"❌ Error: No existe {self.data_path}")
             return None
 
-        df = pd.read_csv(self.data_path, index_col="time", parse_dates=True)
-
-        # Normalizar nombres
-        if "nq_close" in df.columns:
-            df.rename(
-                columns={
-                    "nq_open": "open",
-                    "nq_high": "high",
-                    "nq_low": "low",
-                    "nq_close": "close",
-                    "nq_vol": "volume",
-                },
-                inplace=True,
-            )
-
-        # Calcular Indicadores
-        print("⚙️ Calculando indicadores...")
-        indicators = Indicators()
-        df = indicators.add_all_features(df)
-        return df
+        # Indicadores desde la cache compartida (mismas columnas que dataset y demo)
+        print("⚙️ Cargando indicadores...")
+        return get_indicator_frame(self.data_path)
 
     def run(self):
-        df = self.load_and_prep_data()
-        if df is None:
-            return
+        resumed = self._load_checkpoint() if self.checkpoint_dir else None
+        if resumed:
+            df, start = resumed
+            print(f"⏩ Reanudando desde checkpoint: {len(df) - start} velas nuevas/pendientes")
+        else:
+            df = self.load_and_prep_data()
+            if df is None:
+                return
+            start = self.SCAN_START
+            print(f"🏎️ Corriendo simulación sobre {len(df)} velas...")
+            self.risk_manager.start_session(self.balance, df.index[start])
 
-        print(f"🏎️ Corriendo simulación sobre {len(df)} velas...")
         detector = PO3Detector(df)
+        # Hora NY de todas las velas de una vez (DST incluido)
+        session_hours = calendar_for(df.index).hour
+
+        # Primera vela cuya ventana de salida aún no está completa: el estado
+        # previo a ella es definitivo y se guarda como punto de reanudación.
+        cut = len(df) - self.MAX_HOLDING
+
+        for i in range(start, len(df)):
+            if i == cut and self.checkpoint_dir:
+                self._save_checkpoint(df, i)
 
-        for i in range(50, len(df)):
             # 1. Detectar Señal
             signal = detector.scan_for_signals(i)
 
             if signal:
+                # 1.B Guard diario: realizamos lo cerrado hasta esta vela y preguntamos
+                self._realize_until(df.index[i])
+                if not self.risk_manager.check_daily_drawdown(df.index[i]):
+                    self.blocked_signals += 1
+                    continue
+
                 # 2. Consultar a la IA
                 row = df.iloc[i]
                 market_ctx = {
@@ -84,7 +160,7 @@ class Backtester:
                     "ema_200": row.get("ema_200", 0.0),
                 }
 
-                features = build_features(row, signal["entry_price"], market_ctx)
+                features = build_features(row, signal["entry_price"], market_ctx, session_hours[i])
 
                 try:
                     prob = self.model.predict_proba(features)[0][1]
@@ -93,8 +169,19 @@ class Backtester:
 
                 # 3. Decisión de Trading
                 if prob >= self.threshold:
-                    result = self._simulate_trade_outcome(df, i, signal)
-                    self._record_trade(signal, result, prob)
+                    r_multiple, exit_time = self._simulate_trade_outcome(df, i, signal)
+                    # _realize_until ya imputó lo cerrado hasta esta vela: sin look-ahead
+                    sizing_balance = self.realized_balance if self.compounding else self.initial_balance
+                    lots, risk_money = self.risk_manager.get_lot_sizes(
+                        [signal["entry_price"]],
+                        [signal["stop_loss"]],
+                        [sizing_balance],
+                        self.contract_spec,
+                    )
+                    pnl = float(risk_money[0]) * r_multiple
+                    self._record_trade(signal, pnl, prob, lots=float(lots[0]), exit_time=exit_time)
+                    self.r_multiples.append(r_multiple)
+                    self.pending_pnl.append((exit_time, pnl))
 
         self._export_results()
 
@@ -104,31 +191,216 @@ class Backtester:
         sl = signal["stop_loss"]
         direction = signal["signal_type"]
 
-        max_holding = 45  # minutos
+        max_holding = self.MAX_HOLDING  # minutos
+        # Resultado en múltiplos de R (el dinero lo fija el sizing del RiskManager)
         pnl = 0.0
-        risk_money = 100.0  # Riesgo fijo por trade
+        risk_money = 1.0
 
         future_df = df.iloc[entry_idx + 1 : entry_idx + 1 + max_holding]
+        exit_time = future_df.index[-1] if len(future_df) else df.index[entry_idx]
 
-        for _, candle in future_df.iterrows():
+        for t, candle in future_df.iterrows():
             if direction == "BULLISH":
                 if candle["low"] <= sl:
                     pnl = -risk_money
+                    exit_time = t
                     break
                 if candle["high"] >= tp:
                     pnl = risk_money * 2
+                    exit_time = t
                     break
             elif direction == "BEARISH":
                 if candle["high"] >= sl:
                     pnl = -risk_money
+                    exit_time = t
                     break
                 if candle["low"] <= tp:
                     pnl = risk_money * 2
+                    exit_time = t
                     break
 
-        return pnl
+        return pnl, exit_time
+
+    def _realize_until(self, ts):
+        """
+        Imputa al guard diario (y a realized_balance) el PnL de los trades
+        cerrados antes de ts, en orden de salida
+        """
+        due, still_open = [], []
+        for exit_time, pnl in self.pending_pnl:
+            (due if exit_time <= ts else still_open).append((exit_time, pnl))
+        # Se abren en orden pero pueden cerrar en otro: el guard (día NY, HWM) ve el orden real
+        due.sort(key=lambda item: item[0])
+        for exit_time, pnl in due:
+            self.risk_manager.on_realized_pnl(pnl, exit_time)
+            self.realized_balance += pnl
+        self.pending_pnl = still_open
+
+    # --- CHECKPOINT INCREMENTAL ---
+    def _config_key(self):
+        """Huella de todo lo que cambia resultados salvo los datos: modelo, reglas y código"""
+        hasher = ContentHasher(f"{self.checkpoint_dir}.hash_index.json")
+        payload = {
+            "model": hasher.file_hash(self.model_path),
+            "code": hasher.code_hash(CHECKPOINT_CODE),
+            "indicators": Indicators().params(),
+            "threshold": self.threshold,
+            "risk_percent": self.risk_manager.risk_percent,
+            "max_daily_loss": self.risk_manager.max_daily_loss,
+            "compounding": self.compounding,
+            "contract": list(self.contract_spec),
+            "initial_balance": self.initial_balance,
+        }
+        hasher.save()
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _save_checkpoint(self, df, i):
+        """
+        Estado completo antes de la vela i:
+        - halo de velas crudas (OHLC) para recalcular indicadores sin la historia entera,
+        - balance, curva de equity, trades, PnL pendiente del guard y estado del guard.
+        """
+        halo = Indicators().warmup_rows() + self.SCAN_START
+        tail = df[OHLC].iloc[max(0, i - halo) : i].copy()
+        if tail.index.tz is not None:
+            tail.index = tail.index.tz_convert("UTC").tz_localize(None)
+
+        resume_ts = df.index[i]
+        state = {
+            "config": self._config_key(),
+            "resume_time": str(resume_ts),
+            "balance": self.balance,
+            "realized_balance": self.realized_balance,
+            "equity_curve": self.equity_curve,
+            "trades": self.trades,
+            "r_multiples": self.r_multiples,
+            "pending_pnl": [(str(t), pnl) for t, pnl in self.pending_pnl],
+            "blocked_signals": self.blocked_signals,
+            "risk": self.risk_manager.get_state(),
+        }
 
-    def _record_trade(self, signal, pnl, prob):
+        tmp = f"{self.checkpoint_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        save_frame(tail, os.path.join(tmp, "halo"))
+        with open(os.path.join(tmp, "state.json"), "w") as f:
+            json.dump(state, f)
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        os.replace(tmp, self.checkpoint_dir)
+
+    def _load_checkpoint(self):
+        """
+        (df, inicio) con indicadores solo sobre halo + velas nuevas, o None si el
+        checkpoint no existe, es de otra configuración o la historia cambió.
+        """
+        state_path = os.path.join(self.checkpoint_dir, "state.json")
+        if not os.path.exists(state_path) or not os.path.exists(self.data_path):
+            return None
+        with open(state_path, "r") as f:
+            state = json.load(f)
+        if state["config"] != self._config_key():
+            print("♻️ Checkpoint de otra configuración: simulación completa.")
+            return None
+
+        halo = load_frame(os.path.join(self.checkpoint_dir, "halo"))
+        raw = load_sync_csv(self.data_path)[OHLC]
+        resume_ts = pd.Timestamp(state["resume_time"]).tz_convert("UTC").tz_localize(None)
+
+        # El CSV re-minado debe coincidir con lo ya simulado en el borde del halo
+        last = halo.index[-1] if len(halo) else None
+        if (
+            resume_ts not in raw.index
+            or (last is not None and last not in raw.index)
+            or (last is not None and not np.array_equal(raw.loc[last].to_numpy(), halo.loc[last].to_numpy()))
+        ):
+            print("♻️ La historia cambió respecto al checkpoint: simulación completa.")
+            return None
+
+        new = raw[raw.index >= resume_ts]
+        df = Indicators().add_all_features(pd.concat([halo, new]))
+
+        self.balance = state["balance"]
+        self.realized_balance = state["realized_balance"]
+        self.equity_curve = state["equity_curve"]
+        self.trades = state["trades"]
+        self.r_multiples = state["r_multiples"]
+        self.pending_pnl = [(pd.Timestamp(t), pnl) for t, pnl in state["pending_pnl"]]
+        self.blocked_signals = state["blocked_signals"]
+        self.risk_manager.set_state(state["risk"])
+        return df, len(halo)
+
+    def compound_equity(
+        self, r_multiples, entries, stops, initial_balance=None, entry_times=None, exit_times=None, max_iter=50
+    ):
+        """
+        Curva de equity con interés compuesto para N trades (millones), vectorizada por pasada.
+        Cada trade se dimensiona sobre el balance realizado al entrar: inicial + PnL de los
+        trades con salida <= su entrada (sin tiempos: cada trade cierra antes del siguiente).
+        Ese balance solo depende de trades anteriores (sistema triangular, solución única =
+        la simulación secuencial). Se itera: semilla continua balance * prod(1 + r% * R),
+        re-dimensionar con get_lot_sizes y recalcular balances. Cada pasada deja exacto al
+        menos un trade más, así que en el peor caso harían falta N pasadas; en la práctica
+        bastan pocas. Pasadas max_iter sin converger, se termina con un bucle secuencial.
+
+        Returns:
+            (lots, pnl, equity): arrays por trade; equity (orden de entrada) incluye el balance inicial.
+        """
+        initial = self.initial_balance if initial_balance is None else initial_balance
+        r = np.asarray(r_multiples, dtype=np.float64)
+        entries = np.asarray(entries, dtype=np.float64)
+        stops = np.asarray(stops, dtype=np.float64)
+        if r.size == 0:
+            return np.zeros(0), np.zeros(0), np.array([initial])
+
+        if entry_times is None or exit_times is None:
+            # Secuencial: al entrar el trade k ya cerraron los k anteriores
+            exit_order = np.arange(r.size)
+            realized_count = np.arange(r.size)
+        else:
+            # utc=True: textos con offsets distintos (cambio de horario) en un solo eje
+            entry_ns = pd.DatetimeIndex(pd.to_datetime(entry_times, utc=True)).asi8
+            exit_ns = pd.DatetimeIndex(pd.to_datetime(exit_times, utc=True)).asi8
+            # Mismo orden que _realize_until: por salida, empates en orden de entrada
+            exit_order = np.argsort(exit_ns, kind="stable")
+            realized_count = np.searchsorted(exit_ns[exit_order], entry_ns, side="right")
+
+        def balances_for(pnl):
+            realized = np.concatenate(([0.0], np.cumsum(pnl[exit_order])))
+            return initial + realized[realized_count]
+
+        rp = self.risk_manager.risk_percent / 100
+        with np.errstate(over="ignore"):
+            # Semilla continua; puede saturar a inf, el clip a volume_max lo absorbe
+            growth = np.cumprod(1.0 + rp * r)
+            balances = initial * np.concatenate(([1.0], growth[:-1]))
+
+        for _ in range(max_iter):
+            lots, risk_money = self.risk_manager.get_lot_sizes(entries, stops, balances, self.contract_spec)
+            pnl = risk_money * r
+            new_balances = balances_for(pnl)
+            if np.array_equal(new_balances, balances):
+                break
+            balances = new_balances
+        else:
+            # Sin convergencia: trade a trade en orden de entrada, realizando por orden de salida
+            pnl = np.zeros_like(r)
+            realized, done = 0.0, 0
+            for k in range(r.size):
+                while done < realized_count[k]:
+                    realized += pnl[exit_order[done]]
+                    done += 1
+                balances[k] = initial + realized
+                _, risk = self.risk_manager.get_lot_sizes(
+                    entries[k : k + 1], stops[k : k + 1], balances[k], self.contract_spec
+                )
+                pnl[k] = float(risk[0]) * r[k]
+            lots, risk_money = self.risk_manager.get_lot_sizes(entries, stops, balances, self.contract_spec)
+            pnl = risk_money * r
+
+        equity = initial + np.concatenate(([0.0], np.cumsum(pnl)))
+        return lots, pnl, equity
+
+    def _record_trade(self, signal, pnl, prob, lots=0.0, exit_time=None):
         self.balance += pnl
         self.equity_curve.append(self.balance)
         self.trades.append(
@@ -136,6 +408,10 @@ class Backtester:
                 "time": str(signal["timestamp"]),
                 "type": signal["signal_type"],
                 "prob": round(float(prob) * 100, 2),
+                "lots": round(lots, 2),
+                "entry": float(signal["entry_price"]),
+                "sl": float(signal["stop_loss"]),
+                "exit_time": str(exit_time) if exit_time is not None else None,
                 "pnl": round(float(pnl), 2),
                 "result": "WIN" if pnl > 0 else "LOSS" if pnl < 0 else "TIMEOUT",
             }
@@ -146,12 +422,13 @@ class Backtester:
         wins = len([t for t in self.trades if t["pnl"] > 0])
         losses = len([t for t in self.trades if t["pnl"] < 0])
         win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
-        net_profit = self.balance - 10000.0
+        net_profit = self.balance - self.initial_balance
 
         print("\n" + "=" * 40)
         print(
             f"📊 RESULTADO FINAL: {win_rate:.2f}% Win Rate | ${net_profit:.2f} Profit"
         )
+        print(f"🛑 Señales bloqueadas por pérdida diaria: {self.blocked_signals}")
         print("=" * 40)
 
         # JSON para el Frontend
@@ -165,10 +442,15 @@ class Backtester:
                 "net_profit": round(float(net_profit), 2),
             },
             "recent_trades": self.trades[-20:],
+            # Serie completa de resultados (Monte Carlo / bootstrap)
+            "outcomes": {"r_multiples": [round(float(r), 4) for r in self.r_multiples]},
         }
+        if self.compounding:
+            export_data["compounding_check"] = self._check_compounding()
+        export_data["run_id"] = self._store_run(export_data["summary"])
 
         # Guardar donde el server.py pueda leerlo
-        output_file = "execution_engine/backtest_results.json"
+        output_file = self.output_file
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
         with open(output_file, "w") as f:
@@ -176,11 +458,80 @@ class Backtester:
 
         print(f"💾 Reporte generado para Flutter: {output_file}")
 
+    def _check_compounding(self):
+        """
+        La simulación dimensiona trade a trade (el guard diario necesita cada PnL);
+        compound_equity debe reproducir la misma curva en una sola pasada vectorizada.
+        Devuelve la discrepancia (None sin trades); se exporta con el reporte.
+        """
+        if not self.trades:
+            return None
+        lots, _, equity = self.compound_equity(
+            self.r_multiples,
+            [t["entry"] for t in self.trades],
+            [t["sl"] for t in self.trades],
+            entry_times=[t["time"] for t in self.trades],
+            exit_times=[t["exit_time"] for t in self.trades],
+        )
+        lot_diff = np.abs(lots - np.array([t["lots"] for t in self.trades]))
+        equity_diff = np.abs(equity - np.array(self.equity_curve))
+        check = {
+            "trades": len(self.trades),
+            "lot_mismatches": int((lot_diff > 0.005).sum()),
+            "max_lot_diff": float(lot_diff.max()),
+            "max_equity_diff": float(equity_diff.max()),
+        }
+        check["ok"] = check["lot_mismatches"] == 0 and np.allclose(equity, self.equity_curve, rtol=1e-9, atol=1e-6)
+        if check["ok"]:
+            print(f"✅ Interés compuesto: compound_equity coincide con la simulación ({len(self.trades)} trades)")
+        else:
+            print(
+                f"⚠ Interés compuesto: compound_equity difiere de la simulación secuencial "
+                f"({check['lot_mismatches']} lotajes, equity máx. {check['max_equity_diff']:.6f})"
+            )
+        return check
+
+    def _store_run(self, summary):
+        """Persiste la corrida completa (todos los trades + equity) en el ResultsStore"""
+        symbol = self.contract_spec.symbol
+        trades = [
+            {**t, "symbol": symbol, "r_multiple": float(r)}
+            for t, r in zip(self.trades, self.r_multiples)
+        ]
+        start = self.trades[0]["time"] if self.trades else None
+        equity = [(start, self.initial_balance)] + [
+            (t["time"], b) for t, b in zip(self.trades, self.equity_curve[1:])
+        ]
+        params = {
+            "model_path": self.model_path,
+            "threshold": self.threshold,
+            "risk_percent": self.risk_manager.risk_percent,
+            "compounding": self.compounding,
+            "initial_balance": self.initial_balance,
+        }
+
+        store = ResultsStore(self.results_db)
+        try:
+            run_id = store.save_run("backtest", summary, trades, equity, params, self.data_path)
+        finally:
+            store.close()
+        print(f"🗄 Corrida #{run_id} guardada en {store.db_path}")
+        return run_id
+
 
 if __name__ == "__main__":
     data_file = "data_core/datasets/SYNC_DATA_M1.csv"
     model_file = "quant_lab/models/po3_sniper_v1.json"
     config_file = "quant_lab/models/model_config.json"
 
-    bt = Backtester(data_file, model_file, config_file)
+    parser = argparse.ArgumentParser(description="Backtest PO3 + IA")
+    parser.add_argument("--full", action="store_true", help="Ignorar el checkpoint y simular todo")
+    parser.add_argument("--compounding", action="store_true", help="Dimensionar sobre el balance actual (interés compuesto)")
+    args = parser.parse_args()
+
+    checkpoint = "quant_lab/checkpoints/SYNC_DATA_M1"
+    if args.full:
+        shutil.rmtree(checkpoint, ignore_errors=True)
+
+    bt = Backtester(data_file, model_file, config_file, checkpoint_dir=checkpoint, compounding=args.compounding)
     bt.run()
@@ -1,99 +1,193 @@
-import pandas as pd
+import argparse
 import os
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
 
 # Truco para importar módulos hermanos desde otra carpeta
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from data_core.frame_cache import (
+    NQ_COLUMNS,
+    ensure_calendar,
+    ensure_indicator_frame,
+    load_frame,
+    open_frame_arrays,
+)
 from data_core.indicators import Indicators
 from data_core.po3_logic import PO3Detector
-
-
-def build_candidates_dataset():
-    print("🏭 INICIANDO FÁBRICA DE DATASET (SPRINT 2)...")
-
-    # 1. Cargar Datos Raw
-    input_path = "data_core/datasets/SYNC_DATA_M1.csv"
-    if not os.path.exists(input_path):
-        print("❌ No hay datos. Corre el miner primero.")
-        return
-
-    print(f"📂 Leyendo historial completo: {input_path}")
-    df = pd.read_csv(input_path, index_col="time", parse_dates=True)
-
-    # Adaptador de nombres (igual que en el test)
-    df.rename(
-        columns={
-            "nq_open": "open",
-            "nq_high": "high",
-            "nq_low": "low",
-            "nq_close": "close",
-            "nq_vol": "volume",
-        },
-        inplace=True,
-    )
-
-    # 2. Calcular Indicadores
-    print("🧮 Calculando features técnicas...")
-    engine = Indicators()
-    df = engine.add_all_features(df)
-
-    # 3. Escaneo Masivo
-    print("🕵️‍♂️ Buscando patrones en todo el historial (esto tomará unos segundos)...")
+from data_core.session_calendar import calendar_for
+
+# Margen inicial del escaneo (igual que la pasada única original)
+SCAN_START = 100
+
+# Halo del detector: i >= 20 + ventana de sweep (5) + velas del FVG (2)
+DETECTOR_HALO = 20
+
+
+def warmup_halo(indicators=None):
+    """Velas de solape por bloque: calentamiento de indicadores + lookback del detector"""
+    return (indicators or Indicators()).warmup_rows() + DETECTOR_HALO
+
+
+def _candidate_row(df, i, signal, hour, in_session):
+    """Aplana la señal en una fila de CSV con las features de contexto (hora NY del calendario)"""
+    close = df["close"].iloc[i]
+    return {
+        "timestamp": df.index[i],
+        "signal_type": signal["signal_type"],
+        "entry_price": signal["entry_price"],
+        "stop_loss": signal["stop_loss"],
+        "take_profit": signal["take_profit"],
+        "atr": signal["atr_context"],
+        # --- FEATURES PARA LA IA (CONTEXTO) ---
+        "hour": hour,
+        "is_ny_session": int(in_session),
+        "distance_to_ema50": close - df["ema_50"].iloc[i],
+        "trend_ema200": 1 if close > df["ema_200"].iloc[i] else -1,
+        "volatility_shock": 1
+        if (df["high"].iloc[i] - df["low"].iloc[i]) > (signal["atr_context"] * 1.5)
+        else 0,
+    }
+
+
+def _scan_block(task):
+    """
+    Worker: escanea las velas [scan_from, len) de un bloque con halo.
+    - frame: el bloque se lee del frame memory-mapped (indicadores ya exactos).
+    - raw: velas crudas; los indicadores se recalculan sobre bloque + halo.
+    """
+    if "frame_dir" in task:
+        df = load_frame(task["frame_dir"], rows=task["rows"])
+        calendar = ensure_calendar(task["frame_dir"]).slice(*task["rows"])
+    else:
+        df = Indicators().add_all_features(task["raw"])
+        if "ema_200" not in df.columns:
+            return []
+        calendar = calendar_for(df.index)
+
+    hours, in_session = calendar.hour_frac, calendar.is_cash_session
     detector = PO3Detector(df)
-
-    candidates = []
-
-    # Recorremos TODO el dataframe (dejando margen inicial de 100 velas)
-    total_candles = len(df)
-    for i in range(100, total_candles):
+    rows = []
+    for i in range(task["scan_from"], len(df)):
         signal = detector.scan_for_signals(i)
-
         if signal:
-            # Aplanamos el diccionario para que sea una fila de CSV
-            row = {
-                "timestamp": df.index[i],
-                "signal_type": signal["signal_type"],
-                "entry_price": signal["entry_price"],
-                "stop_loss": signal["stop_loss"],
-                "take_profit": signal["take_profit"],
-                "atr": signal["atr_context"],
-                # --- FEATURES PARA LA IA (CONTEXTO) ---
-                "hour": df.index[i].hour + df.index[i].minute / 60.0,
-                "is_ny_session": 1
-                if (9.5 <= (df.index[i].hour + df.index[i].minute / 60.0) <= 16.0)
-                else 0,
-                "distance_to_ema50": df["close"].iloc[i] - df["ema_50"].iloc[i],
-                "trend_ema200": 1
-                if df["close"].iloc[i] > df["ema_200"].iloc[i]
-                else -1,
-                "volatility_shock": 1
-                if (df["high"].iloc[i] - df["low"].iloc[i])
-                > (signal["atr_context"] * 1.5)
-                else 0,
-            }
-            candidates.append(row)
-
-        # Barra de progreso simple
-        if i % 10000 == 0:
-            print(f"   ... procesado {i}/{total_candles} velas")
+            rows.append(_candidate_row(df, i, signal, hours[i], in_session[i]))
+    return rows
+
+
+def _frame_tasks(frame_dir, chunk_rows):
+    total = open_frame_arrays(frame_dir)["__meta__"]["rows"]
+    # Calendario del dataset antes de repartir: los workers solo lo abren
+    ensure_calendar(frame_dir)
+    for start in range(SCAN_START, total, chunk_rows):
+        lo = start - DETECTOR_HALO
+        yield {
+            "frame_dir": frame_dir,
+            "rows": (lo, min(start + chunk_rows, total)),
+            "scan_from": start - lo,
+        }
+
+
+def _raw_tasks(input_path, chunk_rows, halo):
+    """Lee el CSV por trozos: nunca hay más de chunk_rows + halo velas en memoria"""
+    tail, seen = None, 0
+    for chunk in pd.read_csv(input_path, index_col="time", parse_dates=True, chunksize=chunk_rows):
+        chunk.rename(columns=NQ_COLUMNS, inplace=True)
+        block = chunk if tail is None else pd.concat([tail, chunk])
+        offset = len(block) - len(chunk)
+        # Posición global de la primera vela nueva -> respeta SCAN_START
+        scan_from = offset + max(SCAN_START - seen, 0)
+        seen += len(chunk)
+        tail = block.iloc[-halo:]
+        if scan_from < len(block):
+            yield {"raw": block, "scan_from": scan_from}
+
+
+def build_candidates_dataset(
+    input_path="data_core/datasets/SYNC_DATA_M1.csv",
+    output_path="quant_lab/datasets/candidates_unlabeled.csv",
+    frame_dir=None,
+    stream=False,
+    chunk_rows=250_000,
+    workers=None,
+):
+    """
+    Escaneo PO3 por bloques de tiempo repartidos entre procesos.
+
+    Args:
+        frame_dir: frame de indicadores ya resuelto (etapa 'indicators' del pipeline).
+        stream: lee el CSV crudo por trozos y recalcula indicadores con halo
+            (memoria acotada aunque el historial no quepa en RAM).
+        chunk_rows: velas nuevas por bloque.
+        workers: procesos (None = todos los núcleos, 1 = en este proceso).
+    """
+    print("🏭 INICIANDO FÁBRICA DE DATASET (SPRINT 2)...")
+
+    if frame_dir:
+        print(f"📂 Usando indicadores precalculados: {frame_dir}")
+        tasks = _frame_tasks(frame_dir, chunk_rows)
+    else:
+        # 1. Cargar Datos Raw
+        if not os.path.exists(input_path):
+            print("❌ No hay datos. Corre el miner primero.")
+            return
+
+        if stream:
+            halo = warmup_halo()
+            print(f"📂 Leyendo {input_path} por bloques de {chunk_rows} velas (halo {halo})")
+            tasks = _raw_tasks(input_path, chunk_rows, halo)
+        else:
+            # 2. Indicadores desde la cache compartida (se calculan solo la primera vez)
+            print(f"📂 Leyendo historial completo: {input_path}")
+            tasks = _frame_tasks(ensure_indicator_frame(input_path), chunk_rows)
+
+    # 3. Escaneo Masivo (bloques en paralelo, escritura en orden a medida que terminan)
+    print("🕵️‍♂️ Buscando patrones en todo el historial (esto tomará unos segundos)...")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    workers = workers or os.cpu_count() or 1
+    total, blocks = 0, 0
+
+    def write(rows):
+        nonlocal total, blocks
+        blocks += 1
+        if rows:
+            pd.DataFrame(rows).to_csv(tmp_path, mode="a", header=total == 0, index=False)
+            total += len(rows)
+        print(f"   ... bloque {blocks} listo ({total} candidatos)")
+
+    try:
+        if workers == 1:
+            for task in tasks:
+                write(_scan_block(task))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Ventana acotada de bloques en vuelo: memoria fija, orden preservado
+                pending = deque()
+                for task in tasks:
+                    pending.append(pool.submit(_scan_block, task))
+                    if len(pending) >= workers * 2:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
     # 4. Guardar
-    if not candidates:
+    if total == 0:
         print("⚠️ No se encontraron candidatos en todo el historial.")
         return
 
-    df_candidates = pd.DataFrame(candidates)
-    output_path = "quant_lab/datasets/candidates_unlabeled.csv"
-
-    # Asegurar que el directorio existe
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-    df_candidates.to_csv(output_path, index=False)
+    os.replace(tmp_path, output_path)
 
     print("\n------------------------------------------------")
     print(f"✅ DATASET GENERADO: {output_path}")
-    print(f"📊 Total Candidatos: {len(df_candidates)}")
+    print(f"📊 Total Candidatos: {total}")
     print("------------------------------------------------")
     print(
         "Siguiente paso: Ejecutar labeler.py para decir cuáles ganaron y cuáles perdieron."
@@ -101,4 +195,12 @@ def build_candidates_dataset():
 
 
 if __name__ == "__main__":
-    build_candidates_dataset()
+    parser = argparse.ArgumentParser(description="Escaneo PO3 por bloques")
+    parser.add_argument("--stream", action="store_true", help="CSV por trozos (sin frame en RAM)")
+    parser.add_argument("--chunk-rows", type=int, default=250_000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    build_candidates_dataset(
+        stream=args.stream, chunk_rows=args.chunk_rows, workers=args.workers
+    )
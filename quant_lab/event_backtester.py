@@ -0,0 +1,457 @@
+import argparse
+import heapq
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+# Imports del sistema para encontrar módulos hermanos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from execution_engine.replay_engine import ReplayEngine
+from execution_engine.risk import RiskManager
+from quant_lab.backtester import DEFAULT_CONTRACT
+from quant_lab.results_store import ResultsStore
+
+MINUTE_NS = 60 * 1_000_000_000
+
+# Tipos de evento; el valor es la prioridad dentro del mismo instante:
+# primero se liberan cupos (cierres/expiraciones), luego fills, luego señales nuevas.
+EXIT, EXPIRE, FILL, SIGNAL = 0, 1, 2, 3
+
+# Ciclo de vida de una orden
+IDLE, PENDING, OPEN, CLOSED, EXPIRED, REJECTED, BLOCKED = range(7)
+STATE_NAMES = ["IDLE", "PENDING", "OPEN", "CLOSED", "EXPIRED", "REJECTED", "BLOCKED"]
+
+# Motivo de salida
+EXIT_SL, EXIT_TP, EXIT_TIME, EXIT_END = range(4)
+EXIT_NAMES = ["SL", "TP", "TIME", "END"]
+
+
+class EventBacktester:
+    """
+    Backtester de cartera dirigido por eventos (órdenes límite como en vivo).
+    - Las señales aprobadas por la IA salen de la cache del ReplayEngine
+      (escaneo PO3 + probabilidades ya precalculados, memory-mapped).
+    - Cola de prioridad (heapq) de eventos SIGNAL/FILL/EXPIRE/EXIT; el estado de
+      las órdenes vive en arrays NumPy indexados por id de orden.
+    - Fills y salidas se buscan con ventanas vectorizadas sobre las velas: el coste
+      es proporcional al número de señales, no al de velas.
+    - Reglas: expiración de la límite (45 min), cupo por símbolo y de cartera,
+      spread (precios del CSV = bid), comisión por lote y Kill-Switch diario.
+    """
+
+    def __init__(
+        self,
+        data_paths,
+        model_path,
+        config_path,
+        risk_percent=1.0,
+        compounding=False,
+        contract_specs=None,
+        expiration_minutes=45,
+        max_holding_minutes=None,
+        max_positions_per_symbol=1,
+        max_positions=None,
+        spread=0.0,
+        commission_per_lot=0.0,
+        initial_balance=10000.0,
+        output_file="execution_engine/backtest_results.json",
+        results_db=None,
+    ):
+        # {símbolo: csv}; un string se interpreta como el símbolo por defecto
+        if isinstance(data_paths, str):
+            data_paths = {DEFAULT_CONTRACT.symbol: data_paths}
+        self.data_paths = data_paths
+        self.model_path = model_path
+        self.output_file = output_file
+        self.results_db = results_db
+
+        with open(config_path, "r") as f:
+            self.threshold = json.load(f).get("threshold", 0.70)
+
+        self.compounding = compounding
+        self.contract_specs = {
+            sym: (contract_specs or {}).get(sym) or DEFAULT_CONTRACT._replace(symbol=sym)
+            for sym in data_paths
+        }
+        self.expiration_ns = int(expiration_minutes * MINUTE_NS)
+        self.max_holding_ns = int(max_holding_minutes * MINUTE_NS) if max_holding_minutes else None
+        self.max_per_symbol = max_positions_per_symbol
+        self.max_positions = max_positions or max_positions_per_symbol * len(data_paths)
+        # Spread por símbolo (en precio); un número aplica a todos
+        self.spread = spread if isinstance(spread, dict) else {s: spread for s in data_paths}
+        self.commission_per_lot = commission_per_lot
+
+        self.initial_balance = initial_balance
+        self.balance = initial_balance
+        self.equity_curve = [initial_balance]
+        self.risk_manager = RiskManager(risk_percent=risk_percent)
+
+        print(f"🤖 EventBacktester Iniciado. Umbral IA: {self.threshold:.2%} | {list(data_paths)}")
+
+    # --- DATOS ---
+    def _load_markets(self):
+        """
+        Arrays de velas + señales por símbolo desde la cache del ReplayEngine.
+        Su huella cubre datos, indicadores, detector, features y el contenido
+        del modelo: las señales siempre salen del código y modelo que se prueban.
+        """
+        model = xgb.XGBClassifier()
+        model.load_model(self.model_path)
+
+        self.symbols = list(self.data_paths)
+        self.markets = []
+        self.replay_keys = {}
+        for sym in self.symbols:
+            engine = ReplayEngine(csv_path=self.data_paths[sym], model_path=self.model_path)
+            if not engine.ensure_ready(model, with_model=True):
+                raise FileNotFoundError(f"No existe {self.data_paths[sym]}")
+            self.markets.append(engine.arrays)
+            self.replay_keys[sym] = engine.key
+
+    def _collect_signals(self):
+        """Órdenes candidatas (una por señal aprobada), en arrays columnares"""
+        cols = {k: [] for k in ("sym", "bar", "time", "dir", "entry", "sl", "tp", "prob")}
+        for s, a in enumerate(self.markets):
+            prob = np.asarray(a["prob"])
+            bars = np.flatnonzero(prob >= self.threshold)  # NaN (sin IA) nunca pasa
+            cols["sym"].append(np.full(len(bars), s, dtype=np.int32))
+            cols["bar"].append(bars)
+            cols["time"].append(np.asarray(a["time"])[bars])
+            cols["dir"].append(np.asarray(a["signal"])[bars].astype(np.int8))
+            for name in ("entry", "sl", "tp", "prob"):
+                cols[name].append(np.asarray(a[name])[bars])
+
+        o = {k: np.concatenate(v) for k, v in cols.items()}
+        n = len(o["bar"])
+        o.update(
+            state=np.full(n, IDLE, dtype=np.int8),
+            lots=np.zeros(n),
+            risk=np.zeros(n),
+            fill_bar=np.full(n, -1, dtype=np.int64),
+            fill_price=np.full(n, np.nan),
+            exit_bar=np.full(n, -1, dtype=np.int64),
+            exit_price=np.full(n, np.nan),
+            exit_reason=np.full(n, -1, dtype=np.int8),
+            pnl=np.zeros(n),
+            commission=np.zeros(n),
+        )
+        self.orders = o
+
+    # --- BÚSQUEDAS VECTORIZADAS ---
+    def _find_fill(self, k):
+        """Primera vela que toca la límite antes de expirar, o -1"""
+        o, a = self.orders, self.markets[self.orders["sym"][k]]
+        i, t = o["bar"][k], o["time"][k]
+        end = int(np.searchsorted(a["time"], t + self.expiration_ns, side="right"))
+        if end <= i + 1:
+            return -1
+        spread = self.spread[self.symbols[o["sym"][k]]]
+        window = slice(i + 1, end)
+        if o["dir"][k] > 0:
+            # Buy limit: se llena cuando el ask (bid + spread) baja a la entrada
+            touched = np.asarray(a["low"][window]) + spread <= o["entry"][k]
+        else:
+            touched = np.asarray(a["high"][window]) >= o["entry"][k]
+        hits = np.flatnonzero(touched)
+        return int(i + 1 + hits[0]) if len(hits) else -1
+
+    def _find_exit(self, k, block=512):
+        """(bar, precio, motivo) de salida para una posición abierta en fill_bar"""
+        o, a = self.orders, self.markets[self.orders["sym"][k]]
+        j, d = int(o["fill_bar"][k]), o["dir"][k]
+        sl, tp = o["sl"][k], o["tp"][k]
+        spread = self.spread[self.symbols[o["sym"][k]]]
+        n = len(a["time"])
+        stop = n
+        if self.max_holding_ns:
+            stop = int(np.searchsorted(a["time"], a["time"][j] + self.max_holding_ns, side="right"))
+
+        start = j
+        while start < stop:
+            window = slice(start, min(start + block, stop))
+            high, low = np.asarray(a["high"][window]), np.asarray(a["low"][window])
+            if d > 0:
+                sl_hit, tp_hit = low <= sl, high >= tp
+            else:
+                # Salida de un short = compra al ask
+                sl_hit, tp_hit = high + spread >= sl, low + spread <= tp
+            if start == j:
+                # Vela del fill: no sabemos si el TP llegó antes que la entrada (conservador)
+                tp_hit[0] = False
+            first_sl = np.argmax(sl_hit) if sl_hit.any() else len(sl_hit)
+            first_tp = np.argmax(tp_hit) if tp_hit.any() else len(tp_hit)
+            if first_sl < len(sl_hit) and first_sl <= first_tp:
+                bar = start + int(first_sl)
+                # Gap a través del SL: se ejecuta a la apertura
+                opened = a["open"][bar] + (0.0 if d > 0 else spread)
+                price = min(sl, opened) if d > 0 else max(sl, opened)
+                return bar, price, EXIT_SL
+            if first_tp < len(tp_hit):
+                return start + int(first_tp), tp, EXIT_TP
+            start = window.stop
+
+        bar = stop - 1
+        price = a["close"][bar] + (0.0 if d > 0 else spread)
+        return bar, price, EXIT_TIME if stop < n else EXIT_END
+
+    # --- MOTOR DE EVENTOS ---
+    def run(self):
+        self._load_markets()
+        self._collect_signals()
+        o = self.orders
+        n_orders = len(o["bar"])
+        if n_orders == 0:
+            print("⚠️ Sin señales aprobadas por la IA.")
+            self._export_results()
+            return
+
+        print(f"🏎️ Simulando {n_orders} señales aprobadas sobre {len(self.symbols)} símbolo(s)...")
+        queue = [(int(o["time"][k]), SIGNAL, k) for k in range(n_orders)]
+        heapq.heapify(queue)
+
+        active = np.zeros(len(self.symbols), dtype=np.int64)  # pendientes + abiertas
+        self.risk_manager.start_session(self.balance, int(queue[0][0]) / 1e9)
+
+        while queue:
+            t, kind, k = heapq.heappop(queue)
+            s = o["sym"][k]
+
+            if kind == SIGNAL:
+                # Cuenta quemada o Kill-Switch diario: la señal no llega al broker
+                if self.balance <= 0 or not self.risk_manager.check_daily_drawdown(t / 1e9):
+                    o["state"][k] = BLOCKED
+                    continue
+                if active[s] >= self.max_per_symbol or active.sum() >= self.max_positions:
+                    o["state"][k] = REJECTED
+                    continue
+
+                sizing_balance = self.balance if self.compounding else self.initial_balance
+                lots, risk_money = self.risk_manager.get_lot_sizes(
+                    o["entry"][k : k + 1],
+                    o["sl"][k : k + 1],
+                    sizing_balance,
+                    self.contract_specs[self.symbols[s]],
+                )
+                if lots[0] == 0.0:
+                    o["state"][k] = REJECTED
+                    continue
+
+                o["lots"][k], o["risk"][k] = lots[0], risk_money[0]
+                o["state"][k] = PENDING
+                active[s] += 1
+                bar = self._find_fill(k)
+                if bar >= 0:
+                    o["fill_bar"][k] = bar
+                    heapq.heappush(queue, (int(self.markets[s]["time"][bar]), FILL, k))
+                else:
+                    heapq.heappush(queue, (t + self.expiration_ns, EXPIRE, k))
+
+            elif kind == FILL:
+                a, bar = self.markets[s], o["fill_bar"][k]
+                spread = self.spread[self.symbols[s]]
+                # Límite: al precio o mejor (gap de apertura a favor)
+                if o["dir"][k] > 0:
+                    o["fill_price"][k] = min(o["entry"][k], a["open"][bar] + spread)
+                else:
+                    o["fill_price"][k] = max(o["entry"][k], a["open"][bar])
+                o["state"][k] = OPEN
+                exit_bar, price, reason = self._find_exit(k)
+                o["exit_bar"][k], o["exit_price"][k], o["exit_reason"][k] = exit_bar, price, reason
+                heapq.heappush(queue, (int(a["time"][exit_bar]), EXIT, k))
+
+            elif kind == EXPIRE:
+                o["state"][k] = EXPIRED
+                active[s] -= 1
+
+            else:  # EXIT
+                spec = self.contract_specs[self.symbols[s]]
+                move = (o["exit_price"][k] - o["fill_price"][k]) * o["dir"][k]
+                commission = self.commission_per_lot * o["lots"][k]
+                pnl = move * o["lots"][k] * spec.point_value - commission
+                o["pnl"][k], o["commission"][k] = pnl, commission
+                o["state"][k] = CLOSED
+                active[s] -= 1
+
+                self.balance += pnl
+                self.equity_curve.append(self.balance)
+                self.risk_manager.on_realized_pnl(pnl, t / 1e9)
+
+        self._export_results()
+
+    # --- REPORTE ---
+    def trade_log(self):
+        """Trades cerrados en orden de salida (DataFrame)"""
+        o = self.orders
+        closed = np.flatnonzero(o["state"] == CLOSED)
+        exit_times = np.array(
+            [self.markets[o["sym"][k]]["time"][o["exit_bar"][k]] for k in closed], dtype=np.int64
+        )
+        closed = closed[np.argsort(exit_times, kind="stable")]
+        exit_times = np.sort(exit_times, kind="stable")
+        return pd.DataFrame(
+            {
+                "symbol": [self.symbols[s] for s in o["sym"][closed]],
+                "time": pd.to_datetime(o["time"][closed], utc=True),
+                "exit_time": pd.to_datetime(exit_times, utc=True),
+                "type": np.where(o["dir"][closed] > 0, "BULLISH", "BEARISH"),
+                "prob": o["prob"][closed],
+                "lots": o["lots"][closed],
+                "entry": o["fill_price"][closed],
+                "exit": o["exit_price"][closed],
+                "reason": [EXIT_NAMES[r] for r in o["exit_reason"][closed]],
+                "pnl": o["pnl"][closed],
+                # Resultado en R sobre el riesgo planificado (incluye costos)
+                "r_multiple": o["pnl"][closed] / o["risk"][closed],
+            }
+        )
+
+    def _export_results(self):
+        log = self.trade_log()
+        total_trades = len(log)
+        wins = int((log["pnl"] > 0).sum()) if total_trades else 0
+        losses = int((log["pnl"] < 0).sum()) if total_trades else 0
+        win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
+        net_profit = self.balance - self.initial_balance
+
+        states = self.orders["state"]
+        order_stats = {name.lower(): int((states == code).sum()) for code, name in enumerate(STATE_NAMES)}
+        order_stats["signals"] = int(len(states))
+        order_stats["filled"] = order_stats["closed"] + order_stats["open"]
+        order_stats.pop("idle", None)
+
+        print("\n" + "=" * 40)
+        print(f"📊 RESULTADO FINAL: {win_rate:.2f}% Win Rate | ${net_profit:.2f} Profit")
+        print(
+            f"📬 Órdenes: {order_stats['filled']} llenas | {order_stats['expired']} expiradas | "
+            f"{order_stats['rejected']} sin cupo | {order_stats['blocked']} bloqueadas (pérdida diaria)"
+        )
+        print("=" * 40)
+
+        recent = [
+            {
+                "time": str(r.time),
+                "symbol": r.symbol,
+                "type": r.type,
+                "prob": round(float(r.prob) * 100, 2),
+                "lots": round(float(r.lots), 2),
+                "pnl": round(float(r.pnl), 2),
+                "result": "WIN" if r.pnl > 0 else "LOSS" if r.pnl < 0 else "TIMEOUT",
+                "exit_reason": r.reason,
+            }
+            for r in log.tail(20).itertuples()
+        ]
+
+        per_symbol = {}
+        if total_trades:
+            for sym, group in log.groupby("symbol"):
+                per_symbol[sym] = {
+                    "trades": int(len(group)),
+                    "win_rate": round(float((group["pnl"] > 0).mean() * 100), 2),
+                    "net_profit": round(float(group["pnl"].sum()), 2),
+                }
+
+        export_data = {
+            "summary": {
+                "total_trades": int(total_trades),
+                "wins": wins,
+                "losses": losses,
+                "win_rate": round(float(win_rate), 2),
+                "final_balance": round(float(self.balance), 2),
+                "net_profit": round(float(net_profit), 2),
+                "commission": round(float(self.orders["commission"].sum()), 2),
+            },
+            "orders": order_stats,
+            "per_symbol": per_symbol,
+            "recent_trades": recent,
+            # Serie completa de resultados (Monte Carlo / bootstrap)
+            "outcomes": {"r_multiples": np.round(log["r_multiple"].to_numpy(), 4).tolist()},
+        }
+        export_data["run_id"] = self._store_run(export_data["summary"], log)
+
+        os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
+        with open(self.output_file, "w") as f:
+            json.dump(export_data, f, indent=4)
+
+        print(f"💾 Reporte generado para Flutter: {self.output_file}")
+
+    def _store_run(self, summary, log):
+        """Persiste la corrida completa (todos los trades + equity) en el ResultsStore"""
+        trades = [
+            {
+                "time": str(r.time),
+                "exit_time": str(r.exit_time),
+                "symbol": r.symbol,
+                "type": r.type,
+                "prob": round(float(r.prob) * 100, 2),
+                "lots": float(r.lots),
+                "pnl": round(float(r.pnl), 2),
+                "r_multiple": float(r.r_multiple),
+                "result": "WIN" if r.pnl > 0 else "LOSS" if r.pnl < 0 else "TIMEOUT",
+                "exit_reason": r.reason,
+            }
+            for r in log.itertuples()
+        ]
+        start = trades[0]["time"] if trades else None
+        equity = [(start, self.initial_balance)] + [
+            (t["exit_time"], b) for t, b in zip(trades, self.equity_curve[1:])
+        ]
+        params = {
+            "symbols": self.data_paths,
+            "threshold": self.threshold,
+            "risk_percent": self.risk_manager.risk_percent,
+            "compounding": self.compounding,
+            "spread": self.spread,
+            "commission_per_lot": self.commission_per_lot,
+            "max_positions": self.max_positions,
+            "initial_balance": self.initial_balance,
+            # Cache de señales usada (huella de datos + código + modelo)
+            "replay_keys": self.replay_keys,
+        }
+
+        store = ResultsStore(self.results_db)
+        try:
+            run_id = store.save_run("event", summary, trades, equity, params, ",".join(self.data_paths.values()))
+        finally:
+            store.close()
+        print(f"🗄 Corrida #{run_id} guardada en {store.db_path}")
+        return run_id
+
+
+def _parse_data(items):
+    """['USTEC=data_core/datasets/SYNC_DATA_M1.csv'] -> {'USTEC': '...'}"""
+    return dict(item.split("=", 1) for item in items)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest de cartera dirigido por eventos")
+    parser.add_argument(
+        "--data",
+        nargs="*",
+        default=[f"{DEFAULT_CONTRACT.symbol}=data_core/datasets/SYNC_DATA_M1.csv"],
+        help="SIMBOLO=csv (uno por instrumento)",
+    )
+    parser.add_argument("--model", default="quant_lab/models/po3_sniper_v1.json")
+    parser.add_argument("--config", default="quant_lab/models/model_config.json")
+    parser.add_argument("--risk", type=float, default=1.0)
+    parser.add_argument("--compounding", action="store_true")
+    parser.add_argument("--spread", type=float, default=0.0)
+    parser.add_argument("--commission", type=float, default=0.0, help="Por lote (ida y vuelta)")
+    parser.add_argument("--max-positions", type=int, default=None)
+    parser.add_argument("--max-holding", type=float, default=None, help="Minutos (None = hasta SL/TP)")
+    args = parser.parse_args()
+
+    EventBacktester(
+        _parse_data(args.data),
+        args.model,
+        args.config,
+        risk_percent=args.risk,
+        compounding=args.compounding,
+        spread=args.spread,
+        commission_per_lot=args.commission,
+        max_positions=args.max_positions,
+        max_holding_minutes=args.max_holding,
+    ).run()
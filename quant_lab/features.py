@@ -1,8 +1,9 @@
+import numpy as np
 import pandas as pd
-import pytz
-from datetime import datetime
 
-def build_features(row, signal_entry_price, market_context):
+from data_core.session_calendar import SessionCalendar, session_hour as ny_session_hour
+
+def build_features(row, signal_entry_price, market_context, session_hour=None):
     """
     SINGLE SOURCE OF TRUTH (Fuente Única de Verdad)
     Calcula los features matemáticos para la IA.
@@ -11,25 +12,20 @@ def build_features(row, signal_entry_price, market_context):
         row: Fila del DataFrame (Series) con datos OHLCV y Time.
         signal_entry_price: Precio de entrada de la señal detectada.
         market_context: Diccionario con indicadores {'atr', 'ema_50', 'ema_200'}
+        session_hour: Hora NY ya precalculada (SessionCalendar); si falta se
+            calcula desde el timestamp de la fila.
     
     Returns:
         pd.DataFrame: DataFrame de 1 fila con las columnas en orden estricto.
     """
     
-    # 1. Gestión de Hora (Timezone Aware)
-    # Asumimos que row.name o row['time'] es el timestamp.
-    ts = row.name if isinstance(row.name, pd.Timestamp) else row['time']
-    
-    # Convertir a UTC si es naive
-    if ts.tzinfo is None:
-        ts = ts.replace(tzinfo=pytz.utc)
-    else:
-        ts = ts.astimezone(pytz.utc)
-        
-    ny_tz = pytz.timezone('America/New_York')
-    ny_time = ts.astimezone(ny_tz)
-    
-    feat_hour = ny_time.hour
+    # 1. Gestión de Hora (Timezone Aware, DST incluido)
+    if session_hour is None:
+        # Asumimos que row.name o row['time'] es el timestamp (naive = DATA_TZ).
+        ts = row.name if isinstance(row.name, pd.Timestamp) else row['time']
+        session_hour = ny_session_hour(ts)
+
+    feat_hour = int(session_hour)
     
     # 2. Cálculos Relativos
     atr = market_context.get('atr', 1.0)
@@ -62,4 +58,33 @@ def build_features(row, signal_entry_price, market_context):
     # ORDEN ESTRICTO (Vital para XGBoost)
     cols = ["hour", "is_ny_session", "distance_to_ema50", "trend_ema200", "volatility_shock"]
     
-    return pd.DataFrame([data])[cols]
\ No newline at end of file
+    return pd.DataFrame([data])[cols]
+
+FEATURE_COLUMNS = ["hour", "is_ny_session", "distance_to_ema50", "trend_ema200", "volatility_shock"]
+
+
+def build_features_batch(times, highs, lows, entries, atrs, ema50s, ema200s):
+    """
+    Versión vectorizada de build_features para N señales a la vez
+    (mismas reglas y mismo orden de columnas).
+
+    Args:
+        times: epoch ns UTC (np.int64) o DatetimeIndex de las velas de entrada.
+        highs, lows: rango de la vela de entrada.
+        entries: precios de entrada de las señales.
+        atrs, ema50s, ema200s: contexto de mercado en la vela de entrada.
+    """
+    feat_hour = SessionCalendar.from_times(times).hour
+
+    atr = np.asarray(atrs, dtype=np.float64)
+    atr = np.where(atr <= 0, 1.0, atr)
+    entry = np.asarray(entries, dtype=np.float64)
+
+    data = {
+        "hour": feat_hour,
+        "is_ny_session": ((feat_hour >= 9) & (feat_hour < 16)).astype(np.int64),
+        "distance_to_ema50": (entry - np.asarray(ema50s, dtype=np.float64)) / atr,
+        "trend_ema200": (entry > np.asarray(ema200s, dtype=np.float64)).astype(np.int64),
+        "volatility_shock": (np.asarray(highs) - np.asarray(lows)) / atr,
+    }
+    return pd.DataFrame(data)[FEATURE_COLUMNS]
@@ -1,27 +1,158 @@
+import argparse
 import pandas as pd
 import numpy as np
 import os
 import sys
-from datetime import timedelta
-import pandas_ta as ta
-import pytz
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 # --- IMPORTACIÓN DE LA LIBRERÍA DE FEATURES (Single Source of Truth) ---
 # Esto es lo que reduce las líneas: Importamos la lógica en lugar de escribirla de nuevo
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_core.frame_cache import ensure_indicator_frame, open_frame_arrays
+
 try:
-    from quant_lab.features import build_features
+    from quant_lab.features import FEATURE_COLUMNS, build_features_batch
 except ImportError:
     print("❌ Error Crítico: No se encontró 'quant_lab/features.py'.")
     print("   Asegúrate de haber creado ese archivo con la función build_features.")
     sys.exit(1)
 
-def label_and_enrich_dataset():
+MAX_HOLDING_NS = 45 * 60 * 1_000_000_000  # 45 minutos
+CONTEXT_COLUMNS = ["ATRr_14", "ema_50", "ema_200"]
+
+
+def _to_epoch_ns(timestamps):
+    idx = pd.DatetimeIndex(timestamps).tz_convert("UTC").tz_localize(None)
+    return idx.values.astype("datetime64[ns]").astype(np.int64)
+
+
+def _label_shard(task):
+    """
+    Worker: etiqueta un tramo temporal de candidatos.
+    Los precios se leen del frame memory-mapped compartido (nada de DataFrames
+    serializados); el proceso solo recibe posiciones y niveles de cada señal.
+
+    Returns:
+        (shard_id, targets, features_df)
+    """
+    arrays = open_frame_arrays(task["frame_dir"])
+    times, high, low = arrays["__index__"], arrays["high"], arrays["low"]
+    pos, end = task["pos"], task["end"]
+
+    # --- A. LABELING (primer toque, vectorizado) ---
+    # Ventana = velas (entrada, entrada + 45 min]; se salta la vela de entrada
+    width = int((end - pos).max()) - 1 if len(pos) else 0
+    steps = np.arange(1, width + 1)
+    rows = pos[:, None] + steps[None, :]
+    valid = rows < end[:, None]
+    rows = np.where(valid, rows, pos[:, None])
+
+    h = np.asarray(high[rows.ravel()]).reshape(rows.shape)
+    l = np.asarray(low[rows.ravel()]).reshape(rows.shape)
+    bull = task["bullish"][:, None]
+    sl, tp = task["sl"][:, None], task["tp"][:, None]
+
+    sl_hit = valid & np.where(bull, l <= sl, h >= sl)
+    tp_hit = valid & np.where(bull, h >= tp, l <= tp)
+
+    never = width + 1
+    first_sl = np.where(sl_hit.any(axis=1), sl_hit.argmax(axis=1), never)
+    first_tp = np.where(tp_hit.any(axis=1), tp_hit.argmax(axis=1), never)
+    # En la misma vela gana el SL (se revisa primero, igual que vela a vela)
+    targets = (first_tp < first_sl).astype(np.int64)
+
+    # --- B. FEATURE ENGINEERING (Delegado a features.py) ---
+    features = build_features_batch(
+        np.asarray(times[pos]),
+        np.asarray(high[pos]),
+        np.asarray(low[pos]),
+        task["entry"],
+        np.asarray(arrays["ATRr_14"][pos]),
+        np.asarray(arrays["ema_50"][pos]),
+        np.asarray(arrays["ema_200"][pos]),
+    )
+    return task["shard"], targets, features
+
+
+def _locate_candidates(df_candidates, arrays):
+    """
+    Posición de cada candidato en el frame y fin de su ventana de 45 min.
+    Descarta (igual que antes) velas ausentes, sin indicadores o sin futuro.
+    """
+    index = np.asarray(arrays["__index__"])
+    ts = _to_epoch_ns(df_candidates["timestamp"])
+
+    pos = np.searchsorted(index, ts, side="left")
+    found = pos < len(index)
+    found[found] = index[pos[found]] == ts[found]
+    pos = np.where(found, pos, 0)
+
+    ready = found.copy()
+    for col in CONTEXT_COLUMNS:
+        ready &= ~np.isnan(np.asarray(arrays[col])[pos])
+
+    end = np.searchsorted(index, ts + MAX_HOLDING_NS, side="right")
+    ready &= (end - pos) >= 2
+    return ready, pos, end
+
+
+def label_candidates(df_candidates, frame_dir, workers=None, shards=None):
+    """
+    Etiqueta + features de todos los candidatos repartiendo tramos de tiempo
+    entre procesos. La salida queda en orden de timestamp (determinista).
+    """
+    arrays = open_frame_arrays(frame_dir)
+    df = df_candidates.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    ready, pos, end = _locate_candidates(df, arrays)
+    df, pos, end = df[ready].reset_index(drop=True), pos[ready], end[ready]
+    if df.empty:
+        return df
+
+    workers = workers or os.cpu_count() or 1
+    n_shards = min(shards or workers * 4, len(df))
+    bounds = np.linspace(0, len(df), n_shards + 1).astype(int)
+
+    bullish = (df["signal_type"] == "BULLISH").to_numpy()
+    tasks = [
+        {
+            "shard": k,
+            "frame_dir": frame_dir,
+            "pos": pos[a:b],
+            "end": end[a:b],
+            "bullish": bullish[a:b],
+            "entry": df["entry_price"].to_numpy(np.float64)[a:b],
+            "sl": df["stop_loss"].to_numpy(np.float64)[a:b],
+            "tp": df["take_profit"].to_numpy(np.float64)[a:b],
+        }
+        for k, (a, b) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+    if workers == 1:
+        results = [_label_shard(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_label_shard, tasks))
+
+    # --- C. FUSIÓN (tramos contiguos en orden de tiempo) ---
+    results.sort(key=lambda r: r[0])
+    targets = np.concatenate([r[1] for r in results])
+    features = pd.concat([r[2] for r in results], ignore_index=True)
+
+    df["target"] = targets
+    for col in FEATURE_COLUMNS:
+        df[col] = features[col].to_numpy()
+    return df
+
+
+def label_and_enrich_dataset(
+    candidates_path="quant_lab/datasets/candidates_unlabeled.csv",
+    raw_data_path="data_core/datasets/SYNC_DATA_M1.csv",
+    output_path="quant_lab/datasets/dataset_labeled.csv",
+    workers=None,
+):
     print("⚖️ INICIANDO ETIQUETADO E INGENIERÍA DE FEATURES (V3.0 Modular)...")
 
-    candidates_path = "quant_lab/datasets/candidates_unlabeled.csv"
-    raw_data_path = "data_core/datasets/SYNC_DATA_M1.csv" 
-
     if not os.path.exists(candidates_path):
         print(f"❌ Falta candidatos: {candidates_path}")
         return
@@ -35,93 +166,59 @@ def label_and_enrich_dataset():
     df_candidates = pd.read_csv(candidates_path)
     df_candidates["timestamp"] = pd.to_datetime(df_candidates["timestamp"], utc=True)
 
-    df_raw = pd.read_csv(raw_data_path, index_col="time", parse_dates=True)
-    df_raw.index = pd.to_datetime(df_raw.index, utc=True)
-    
-    # Normalizar columnas
-    if 'nq_close' in df_raw.columns:
-        df_raw.rename(columns={
-            'nq_open': 'open', 'nq_high': 'high', 'nq_low': 'low', 
-            'nq_close': 'close', 'nq_vol': 'volume'
-        }, inplace=True)
-    
-    # 2. Pre-Cálculo de Indicadores (Optimización Vectorizada)
-    if 'ATR' not in df_raw.columns:
-        print("⚙️ Generando indicadores técnicos base...")
-        df_raw.sort_index(inplace=True)
-        df_raw['EMA_50'] = ta.ema(df_raw['close'], length=50)
-        df_raw['EMA_200'] = ta.ema(df_raw['close'], length=200)
-        df_raw['ATR'] = ta.atr(df_raw['high'], df_raw['low'], df_raw['close'], length=14)
-        df_raw.ffill(inplace=True)
-        df_raw.dropna(inplace=True)
+    # 2. Indicadores desde la cache compartida: mismas columnas (ATRr_14, ema_50,
+    # ema_200) que el backtester, el dataset y el bot en vivo.
+    print("⚙️ Cargando frame de indicadores...")
+    frame_dir = ensure_indicator_frame(raw_data_path)
 
     print(f"🧐 Procesando {len(df_candidates)} candidatos...")
+    df_final = label_candidates(df_candidates, frame_dir, workers)
 
-    processed_data = []
-    MAX_HOLDING_TIME = timedelta(minutes=45) 
-
-    for i, row in df_candidates.iterrows():
-        entry_time = row["timestamp"]
-        
-        if entry_time not in df_raw.index: continue 
-
-        try:
-            current_market_data = df_raw.loc[entry_time]
-            
-            # --- A. LABELING (Determinista) ---
-            exit_deadline = entry_time + MAX_HOLDING_TIME
-            future_window = df_raw.loc[entry_time : exit_deadline]
-            
-            if future_window.empty or len(future_window) < 2: continue
-
-            tp_price = row["take_profit"]
-            sl_price = row["stop_loss"]
-            signal_type = row["signal_type"]
-            
-            outcome = 0
-            # Vela a vela (skip entrada)
-            for t, candle in future_window.iloc[1:].iterrows():
-                if signal_type == "BULLISH":
-                    if candle["low"] <= sl_price: outcome = 0; break
-                    if candle["high"] >= tp_price: outcome = 1; break
-                elif signal_type == "BEARISH":
-                    if candle["high"] >= sl_price: outcome = 0; break
-                    if candle["low"] <= tp_price: outcome = 1; break
-            
-            # --- B. FEATURE ENGINEERING (Delegado a features.py) ---
-            # AQUÍ ESTÁ EL AHORRO DE LÍNEAS:
-            market_ctx = {
-                'atr': current_market_data['ATR'],
-                'ema_50': current_market_data['EMA_50'],
-                'ema_200': current_market_data['EMA_200']
-            }
-            
-            # Llamada mágica que calcula todo estándar
-            features_df = build_features(current_market_data, row["entry_price"], market_ctx)
-            features_dict = features_df.iloc[0].to_dict()
-
-            # --- C. FUSIÓN ---
-            new_row = row.to_dict()
-            new_row.update({'target': outcome})
-            new_row.update(features_dict)
-            
-            processed_data.append(new_row)
-
-        except Exception as e:
-            continue
-
-    if not processed_data:
+    if df_final.empty:
         print("❌ Error: No se generaron datos.")
         return
 
     # Guardado
-    df_final = pd.DataFrame(processed_data)
-    output_path = "quant_lab/datasets/dataset_labeled.csv"
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     df_final.to_csv(output_path, index=False)
 
     print(f"✅ DATASET GENERADO: {len(df_final)} muestras.")
     print(f"📊 Win Rate Base: {(df_final['target'].sum() / len(df_final)) * 100:.2f}%")
 
+
+def benchmark(
+    candidates_path="quant_lab/datasets/candidates_unlabeled.csv",
+    raw_data_path="data_core/datasets/SYNC_DATA_M1.csv",
+    max_workers=None,
+    repeat=3,
+):
+    """Escalado 1..N núcleos (mejor de 'repeat' corridas por nivel)"""
+    df_candidates = pd.read_csv(candidates_path)
+    df_candidates["timestamp"] = pd.to_datetime(df_candidates["timestamp"], utc=True)
+    frame_dir = ensure_indicator_frame(raw_data_path)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    print(f"⏱ Benchmark de etiquetado: {len(df_candidates)} candidatos")
+    print(f"{'WORKERS':>8}{'SEGUNDOS':>12}{'SPEEDUP':>10}{'EFICIENCIA':>12}")
+    base = None
+    for workers in range(1, max_workers + 1):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            label_candidates(df_candidates, frame_dir, workers)
+            best = min(best, time.perf_counter() - t0)
+        base = base or best
+        speedup = base / best
+        print(f"{workers:>8}{best:>12.3f}{speedup:>9.2f}x{speedup / workers:>11.0%}")
+
+
 if __name__ == "__main__":
-    label_and_enrich_dataset()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Etiquetado de candidatos PO3")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--benchmark", action="store_true", help="Escalado de 1 a N núcleos")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(max_workers=args.workers)
+    else:
+        label_and_enrich_dataset(workers=args.workers)
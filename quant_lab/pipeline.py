@@ -0,0 +1,376 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+# Imports del sistema para encontrar módulos hermanos
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+from data_core.frame_cache import INDICATOR_CODE, ContentHasher
+
+ARTIFACTS_DIR = "quant_lab/artifacts"
+RAW_DATA_PATH = "data_core/datasets/SYNC_DATA_M1.csv"
+
+
+class Stage:
+    """
+    Nodo del DAG del pipeline.
+    - deps: etapas de las que consume artefactos.
+    - code: archivos fuente cuya versión forma parte de la clave del artefacto.
+    - params: parámetros por defecto (sobrescribibles desde la CLI).
+    - outputs: archivos que la etapa debe dejar en su directorio de artefactos.
+    - check: check(out_dir) -> bool, valida en cada HIT lo que el artefacto
+      referencia fuera de su directorio (False = se vuelve a ejecutar).
+    """
+
+    def __init__(self, name, deps, code, outputs, run, params=None, check=None):
+        self.name = name
+        self.deps = deps
+        self.code = code
+        self.outputs = outputs
+        self.run = run
+        self.params = params or {}
+        self.check = check
+
+
+# --- IMPLEMENTACIÓN DE ETAPAS ---
+# Firma común: run(inputs: {dep: dir_artefacto}, out_dir, params)
+
+
+def _run_mine(inputs, out_dir, params):
+    # Fuente: el CSV minado no se copia, se referencia por contenido
+    if params.get("live"):
+        from data_core import miner
+
+        if not miner.initialize_mt5():
+            raise RuntimeError("No se pudo iniciar MT5 para minar datos")
+        miner.sync_and_save_data(os.path.dirname(RAW_DATA_PATH))
+
+
+def _run_indicators(inputs, out_dir, params):
+    from data_core.frame_cache import ensure_indicator_frame
+
+    # El frame vive en la cache compartida de data_core (la misma que usan
+    # backtester, labeler y demo); el artefacto solo guarda su ubicación.
+    frame_dir = ensure_indicator_frame(RAW_DATA_PATH)
+    with open(os.path.join(out_dir, "frame.json"), "w") as f:
+        json.dump({"frame_dir": frame_dir}, f)
+
+
+def _frame_dir(inputs):
+    with open(os.path.join(inputs["indicators"], "frame.json"), "r") as f:
+        return json.load(f)["frame_dir"]
+
+
+def _check_indicators(out_dir):
+    """El frame referenciado sigue en la cache (se pudo purgar o mover de máquina)"""
+    try:
+        frame_dir = _frame_dir({"indicators": out_dir})
+    except (OSError, ValueError, KeyError):
+        return False
+    return os.path.exists(os.path.join(frame_dir, "meta.json"))
+
+
+def _run_candidates(inputs, out_dir, params):
+    from quant_lab.build_dataset import build_candidates_dataset
+
+    build_candidates_dataset(
+        frame_dir=_frame_dir(inputs),
+        output_path=os.path.join(out_dir, "candidates_unlabeled.csv"),
+    )
+
+
+def _run_labels(inputs, out_dir, params):
+    from quant_lab.labeler import label_and_enrich_dataset
+
+    label_and_enrich_dataset(
+        candidates_path=os.path.join(inputs["candidates"], "candidates_unlabeled.csv"),
+        raw_data_path=RAW_DATA_PATH,
+        output_path=os.path.join(out_dir, "dataset_labeled.csv"),
+    )
+
+
+def _run_model(inputs, out_dir, params):
+    from quant_lab.train_xgb import train_model
+
+    train_model(
+        dataset_path=os.path.join(inputs["labels"], "dataset_labeled.csv"),
+        model_dir=out_dir,
+    )
+
+
+def _run_backtest(inputs, out_dir, params):
+    from quant_lab.backtester import Backtester
+
+    bt = Backtester(
+        RAW_DATA_PATH,
+        os.path.join(inputs["model"], "po3_sniper_v1.json"),
+        os.path.join(inputs["model"], "model_config.json"),
+        risk_percent=params["risk_percent"],
+        compounding=params["compounding"],
+        output_file=os.path.join(out_dir, "backtest_results.json"),
+        # Checkpoint compartido entre claves: con datos re-minados solo simula lo nuevo
+        checkpoint_dir=os.path.join(os.path.dirname(out_dir), "checkpoint"),
+    )
+    bt.run()
+
+
+STAGES = [
+    Stage("mine", [], ["data_core/miner.py"], [], _run_mine, {"live": False}),
+    Stage(
+        "indicators",
+        ["mine"],
+        INDICATOR_CODE,
+        ["frame.json"],
+        _run_indicators,
+        check=_check_indicators,
+    ),
+    Stage(
+        "candidates",
+        ["indicators"],
+        ["quant_lab/build_dataset.py", "data_core/po3_logic.py", "data_core/frame_cache.py", *INDICATOR_CODE],
+        ["candidates_unlabeled.csv"],
+        _run_candidates,
+    ),
+    Stage(
+        "labels",
+        ["candidates", "mine"],
+        ["quant_lab/labeler.py", "quant_lab/features.py", "data_core/frame_cache.py", *INDICATOR_CODE],
+        ["dataset_labeled.csv"],
+        _run_labels,
+    ),
+    Stage(
+        "model",
+        ["labels"],
+        ["quant_lab/train_xgb.py"],
+        ["po3_sniper_v1.json", "model_config.json"],
+        _run_model,
+    ),
+    Stage(
+        "backtest",
+        ["mine", "model"],
+        [
+            "quant_lab/backtester.py",
+            "quant_lab/features.py",
+            "data_core/frame_cache.py",
+            "data_core/po3_logic.py",
+            "execution_engine/risk.py",
+            *INDICATOR_CODE,
+        ],
+        ["backtest_results.json"],
+        _run_backtest,
+        {"risk_percent": 1.0, "compounding": False},
+    ),
+]
+STAGES_BY_NAME = {s.name: s for s in STAGES}
+
+# Artefactos que el bot/servidor leen desde rutas fijas
+PUBLISH = {
+    "model": [
+        ("po3_sniper_v1.json", "quant_lab/models/po3_sniper_v1.json"),
+        ("model_config.json", "quant_lab/models/model_config.json"),
+    ],
+    "backtest": [("backtest_results.json", "execution_engine/backtest_results.json")],
+}
+
+
+def stage_key(stage, params, dep_keys, hasher):
+    """Clave = hash(datos de entrada, versión del código, parámetros)"""
+    payload = {
+        "stage": stage.name,
+        "code": hasher.code_hash(stage.code),
+        "params": params,
+        "deps": dep_keys,
+    }
+    if "data_core/indicators.py" in stage.code:
+        # Parámetros de indicadores (pool_max_age, DATA_TZ, ...) = los de la huella del frame
+        from data_core.indicators import Indicators
+
+        payload["indicators"] = Indicators().params()
+    if stage.name == "mine":
+        # La fuente se identifica solo por su contenido (da igual cómo se obtuvo)
+        payload["params"] = {}
+        payload["data"] = hasher.file_hash(RAW_DATA_PATH)
+    blob = json.dumps(payload, sort_keys=True).encode()
+    return hashlib.sha256(blob).hexdigest()[:24]
+
+
+# --- RUNNER ---
+def _resolve_order(until):
+    """Etapas necesarias para 'until' en orden topológico (STAGES ya lo está)"""
+    if until is None:
+        return list(STAGES)
+    needed, pending = set(), [until]
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(STAGES_BY_NAME[name].deps)
+    return [s for s in STAGES if s.name in needed]
+
+
+def run_pipeline(
+    until=None,
+    force=(),
+    overrides=None,
+    publish=True,
+    artifacts_dir=ARTIFACTS_DIR,
+    on_event=None,
+):
+    """
+    Ejecuta el DAG saltando toda etapa cuyo artefacto (clave) ya existe.
+
+    Args:
+        until: última etapa a producir (None = todas).
+        force: etapas a re-ejecutar aunque haya cache.
+        overrides: {etapa: {param: valor}}.
+        on_event: callback(dict) para progreso (CLI / jobs del servidor).
+
+    Returns:
+        list[dict]: reporte por etapa (status HIT/RUN/FAILED, segundos, clave, ruta).
+    """
+    overrides = overrides or {}
+    emit = on_event or (lambda event: None)
+    hasher = ContentHasher(os.path.join(artifacts_dir, "hash_index.json"))
+    keys, dirs, report = {}, {}, []
+
+    for stage in _resolve_order(until):
+        params = {**stage.params, **overrides.get(stage.name, {})}
+        t0 = time.perf_counter()
+
+        # La fuente se (re)mina antes de calcular su clave
+        if stage.name == "mine" and params.get("live"):
+            emit({"stage": stage.name, "status": "RUNNING"})
+            stage.run({}, None, params)
+
+        if stage.name == "mine" and not os.path.exists(RAW_DATA_PATH):
+            report.append({"stage": stage.name, "status": "FAILED", "seconds": 0.0})
+            emit({**report[-1], "error": f"No existe {RAW_DATA_PATH}"})
+            print(f"❌ No existe {RAW_DATA_PATH}. Corre el miner primero (--mine).")
+            break
+
+        dep_keys = {d: keys[d] for d in stage.deps}
+        key = stage_key(stage, params, dep_keys, hasher)
+        out_dir = os.path.join(artifacts_dir, stage.name, key)
+        manifest_path = os.path.join(out_dir, "manifest.json")
+
+        hit = os.path.exists(manifest_path) and stage.name not in force
+        if hit and stage.check is not None and not stage.check(out_dir):
+            print(f"♻️ '{stage.name}': lo que referencia su artefacto ya no existe, se reconstruye.")
+            hit = False
+
+        if hit:
+            status = "HIT"
+        else:
+            status = "RUN"
+            emit({"stage": stage.name, "status": "RUNNING", "key": key})
+            tmp_dir = out_dir + ".tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            try:
+                if stage.name != "mine":
+                    stage.run({d: dirs[d] for d in stage.deps}, tmp_dir, params)
+                missing = [o for o in stage.outputs if not os.path.exists(os.path.join(tmp_dir, o))]
+                if missing:
+                    raise RuntimeError(f"La etapa no produjo: {missing}")
+            except Exception as e:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                report.append(
+                    {
+                        "stage": stage.name,
+                        "status": "FAILED",
+                        "seconds": round(time.perf_counter() - t0, 3),
+                        "key": key,
+                    }
+                )
+                emit({**report[-1], "error": str(e)})
+                print(f"❌ Etapa '{stage.name}' falló: {e}")
+                break
+
+            with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+                json.dump(
+                    {
+                        "stage": stage.name,
+                        "key": key,
+                        "params": params,
+                        "deps": dep_keys,
+                        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    },
+                    f,
+                    indent=2,
+                )
+            shutil.rmtree(out_dir, ignore_errors=True)
+            os.replace(tmp_dir, out_dir)
+
+        keys[stage.name], dirs[stage.name] = key, out_dir
+        report.append(
+            {
+                "stage": stage.name,
+                "status": status,
+                "seconds": round(time.perf_counter() - t0, 3),
+                "key": key,
+                "path": out_dir,
+            }
+        )
+        emit(report[-1])
+
+        if publish and stage.name in PUBLISH:
+            for src, dst in PUBLISH[stage.name]:
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copyfile(os.path.join(out_dir, src), dst)
+
+    hasher.save()
+    return report
+
+
+def print_report(report):
+    print("\n" + "=" * 56)
+    print(f"{'ETAPA':<12}{'ESTADO':<9}{'SEGUNDOS':>10}  CLAVE")
+    print("-" * 56)
+    for r in report:
+        print(f"{r['stage']:<12}{r['status']:<9}{r['seconds']:>10.2f}  {r.get('key', '-')}")
+    hits = sum(1 for r in report if r["status"] == "HIT")
+    print("-" * 56)
+    print(f"⚡ Cache: {hits}/{len(report)} etapas reutilizadas")
+    print("=" * 56)
+
+
+def _parse_overrides(items):
+    """['backtest.risk_percent=0.5'] -> {'backtest': {'risk_percent': 0.5}}"""
+    overrides = {}
+    for item in items:
+        target, _, raw = item.partition("=")
+        stage, _, param = target.partition(".")
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = raw
+        overrides.setdefault(stage, {})[param] = value
+    return overrides
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline quant_lab con cache por contenido")
+    parser.add_argument("--until", choices=list(STAGES_BY_NAME), help="Última etapa a producir")
+    parser.add_argument("--force", nargs="*", default=[], help="Etapas a re-ejecutar")
+    parser.add_argument("--mine", action="store_true", help="Minar datos frescos desde MT5")
+    parser.add_argument("--set", nargs="*", default=[], help="Parámetros: etapa.param=valor")
+    parser.add_argument("--no-publish", action="store_true", help="No copiar a rutas del bot")
+    args = parser.parse_args()
+
+    overrides = _parse_overrides(args.set)
+    if args.mine:
+        overrides.setdefault("mine", {})["live"] = True
+
+    print_report(
+        run_pipeline(
+            until=args.until,
+            force=set(args.force),
+            overrides=overrides,
+            publish=not args.no_publish,
+        )
+    )
@@ -0,0 +1,286 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from data_core.downsample import lttb
+
+
+class ResultsStore:
+    """
+    Historial completo de backtests (SQLite en modo WAL).
+    - runs: una fila por corrida (parámetros, resumen, KPIs para listar/comparar).
+    - run_trades / run_equity: lista completa de trades y curva de equity,
+      con clave (run_id, seq) e índice por tiempo para paginar sin escanear.
+    """
+
+    TRADE_COLUMNS = [
+        "seq",
+        "time",
+        "exit_time",
+        "symbol",
+        "type",
+        "prob",
+        "lots",
+        "pnl",
+        "r_multiple",
+        "result",
+        "exit_reason",
+    ]
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv(
+            "BACKTEST_DB", "execution_engine/data/backtest_runs.db"
+        )
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created TEXT NOT NULL,
+                    engine TEXT NOT NULL,
+                    data_path TEXT,
+                    params TEXT,
+                    summary TEXT,
+                    total_trades INTEGER DEFAULT 0,
+                    win_rate REAL DEFAULT 0.0,
+                    net_profit REAL DEFAULT 0.0,
+                    max_drawdown REAL DEFAULT 0.0
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_created ON runs(created)")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS run_trades (
+                    run_id INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
+                    time TEXT NOT NULL,
+                    exit_time TEXT,
+                    symbol TEXT,
+                    type TEXT,
+                    prob REAL,
+                    lots REAL,
+                    pnl REAL,
+                    r_multiple REAL,
+                    result TEXT,
+                    exit_reason TEXT,
+                    PRIMARY KEY (run_id, seq)
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_run_trades_time ON run_trades(run_id, time)"
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS run_equity (
+                    run_id INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
+                    time TEXT,
+                    balance REAL NOT NULL,
+                    PRIMARY KEY (run_id, seq)
+                ) WITHOUT ROWID
+                """
+            )
+
+    # --- ESCRITURA ---
+    def save_run(self, engine, summary, trades, equity, params=None, data_path=None):
+        """
+        Persiste una corrida completa en una sola transacción.
+
+        Args:
+            engine: 'backtest' | 'event'.
+            summary: dict del reporte (KPIs).
+            trades: lista de dicts (claves de TRADE_COLUMNS, seq opcional).
+            equity: lista de (time, balance); el primer punto es el balance inicial.
+
+        Returns:
+            int: run_id.
+        """
+        balances = np.asarray([b for _, b in equity], dtype=np.float64)
+        max_dd = float((np.maximum.accumulate(balances) - balances).max()) if len(balances) else 0.0
+
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                """
+                INSERT INTO runs (created, engine, data_path, params, summary,
+                    total_trades, win_rate, net_profit, max_drawdown)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    engine,
+                    data_path,
+                    json.dumps(params or {}),
+                    json.dumps(summary),
+                    int(summary.get("total_trades", len(trades))),
+                    float(summary.get("win_rate", 0.0)),
+                    float(summary.get("net_profit", 0.0)),
+                    round(max_dd, 2),
+                ),
+            )
+            run_id = cur.lastrowid
+            self._conn.executemany(
+                f"INSERT INTO run_trades (run_id, {', '.join(self.TRADE_COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' * len(self.TRADE_COLUMNS))})",
+                (
+                    [run_id, t.get("seq", k)] + [t.get(c) for c in self.TRADE_COLUMNS[1:]]
+                    for k, t in enumerate(trades)
+                ),
+            )
+            self._conn.executemany(
+                "INSERT INTO run_equity (run_id, seq, time, balance) VALUES (?, ?, ?, ?)",
+                ((run_id, k, t, float(b)) for k, (t, b) in enumerate(equity)),
+            )
+        return run_id
+
+    def delete_run(self, run_id: int):
+        with self._lock, self._conn:
+            for table in ("run_trades", "run_equity", "runs"):
+                self._conn.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+
+    # --- LECTURA ---
+    def _row_to_run(self, row):
+        run = dict(row)
+        run["params"] = json.loads(run["params"] or "{}")
+        run["summary"] = json.loads(run["summary"] or "{}")
+        return run
+
+    def latest_run_id(self):
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(run_id) FROM runs").fetchone()
+        return row[0]
+
+    def has_run(self, run_id: int) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row is not None
+
+    def list_runs(self, page: int = 1, page_size: int = 20, engine: str = None):
+        """Corridas (más recientes primero) sin sus trades"""
+        page = max(1, int(page))
+        page_size = max(1, min(int(page_size), 200))
+        clause, params = ("WHERE engine = ?", [engine]) if engine else ("", [])
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM runs {clause}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM runs {clause} ORDER BY run_id DESC LIMIT ? OFFSET ?",
+                [*params, page_size, (page - 1) * page_size],
+            ).fetchall()
+        return {
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "runs": [self._row_to_run(r) for r in rows],
+        }
+
+    def get_run(self, run_id: int):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return self._row_to_run(row) if row else None
+
+    def get_trades(
+        self,
+        run_id: int,
+        page: int = 1,
+        page_size: int = 100,
+        since: str = None,
+        until: str = None,
+        result: str = None,
+    ):
+        """Trades de una corrida en orden cronológico, paginados"""
+        page = max(1, int(page))
+        page_size = max(1, min(int(page_size), 1000))
+
+        where, params = ["run_id = ?"], [run_id]
+        if since:
+            where.append("time >= ?")
+            params.append(str(since))
+        if until:
+            where.append("time <= ?")
+            params.append(str(until))
+        if result:
+            where.append("result = ?")
+            params.append(result)
+        clause = " AND ".join(where)
+
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM run_trades WHERE {clause}", params
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.TRADE_COLUMNS)} FROM run_trades WHERE {clause} "
+                "ORDER BY seq LIMIT ? OFFSET ?",
+                [*params, page_size, (page - 1) * page_size],
+            ).fetchall()
+        return {
+            "run_id": run_id,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "trades": [dict(r) for r in rows],
+        }
+
+    def get_equity(self, run_id: int, max_points: int = 500, since: str = None, until: str = None):
+        """Curva de equity (opcionalmente un rango de tiempo) reducida con LTTB al presupuesto de puntos"""
+        where, params = ["run_id = ?"], [run_id]
+        if since:
+            where.append("time >= ?")
+            params.append(str(since))
+        if until:
+            where.append("time <= ?")
+            params.append(str(until))
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT seq, time, balance FROM run_equity WHERE {' AND '.join(where)} ORDER BY seq",
+                params,
+            ).fetchall()
+        if not rows:
+            return {"run_id": run_id, "points": 0, "total_points": 0, "equity": []}
+
+        seq = np.fromiter((r["seq"] for r in rows), dtype=np.float64, count=len(rows))
+        bal = np.fromiter((r["balance"] for r in rows), dtype=np.float64, count=len(rows))
+        keep = lttb(seq, bal, max(3, int(max_points)))
+        return {
+            "run_id": run_id,
+            "points": int(len(keep)),
+            "total_points": len(rows),
+            "equity": [
+                {"seq": rows[k]["seq"], "time": rows[k]["time"], "balance": round(rows[k]["balance"], 2)}
+                for k in keep
+            ],
+        }
+
+    def compare(self, run_ids, max_points: int = 300):
+        """Resumen + equity reducida de varias corridas lado a lado"""
+        runs = []
+        for run_id in run_ids:
+            run = self.get_run(run_id)
+            if run is None:
+                continue
+            run["equity"] = self.get_equity(run_id, max_points)["equity"]
+            runs.append(run)
+        return {"runs": runs}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Imports del sistema para encontrar módulos hermanos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+RESULTS_PATH = "execution_engine/backtest_results.json"
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Celdas (paths x trades) por lote: acota la memoria de cada worker (~64 MB en float64)
+BATCH_CELLS = 8_000_000
+
+
+def load_outcomes(path=RESULTS_PATH):
+    """Serie de resultados en R exportada por backtester.py / event_backtester.py"""
+    with open(path, "r") as f:
+        data = json.load(f)
+    r = data.get("outcomes", {}).get("r_multiples")
+    if r is None:
+        raise ValueError(f"{path} no trae 'outcomes': vuelve a correr el backtester")
+    return np.asarray(r, dtype=np.float64)
+
+
+def resample(r, n_paths, rng, method="bootstrap"):
+    """
+    Matriz (n_paths, n_trades) de secuencias alternativas:
+    - bootstrap: muestreo con reemplazo (incertidumbre de la muestra).
+    - permutation: mismo set de trades en otro orden (riesgo de secuencia).
+    """
+    n = len(r)
+    if method == "bootstrap":
+        return r[rng.integers(0, n, size=(n_paths, n))]
+    if method == "permutation":
+        return rng.permuted(np.broadcast_to(r, (n_paths, n)), axis=1)
+    raise ValueError(f"Método desconocido: {method}")
+
+
+def path_metrics(r_paths, risk_percent, compounding=True, ruin_level=0.5):
+    """
+    Métricas por path (todo vectorizado sobre el eje de trades).
+    Equity normalizada: 1.0 = balance inicial.
+
+    Returns:
+        dict de arrays (n_paths,): max_drawdown (fracción), time_to_recovery
+        (trades bajo el agua, racha más larga), final (equity final), ruined (bool).
+    """
+    rp = risk_percent / 100
+    if compounding:
+        # Riesgo fijo sobre el balance vigente; una cuenta a cero no revive
+        eq = np.cumprod(np.maximum(1.0 + rp * r_paths, 0.0), axis=1)
+    else:
+        eq = np.maximum(1.0 + rp * np.cumsum(r_paths, axis=1), 0.0)
+    eq = np.concatenate([np.ones((len(eq), 1)), eq], axis=1)
+
+    peak = np.maximum.accumulate(eq, axis=1)
+    max_dd = (1.0 - eq / peak).max(axis=1)
+
+    # Última posición en máximos -> distancia = trades bajo el agua
+    steps = np.arange(eq.shape[1])
+    last_peak = np.maximum.accumulate(np.where(eq >= peak, steps, 0), axis=1)
+    time_to_recovery = (steps - last_peak).max(axis=1)
+
+    return {
+        "max_drawdown": max_dd,
+        "time_to_recovery": time_to_recovery,
+        "final": eq[:, -1],
+        "ruined": eq.min(axis=1) <= ruin_level,
+    }
+
+
+def _simulate_chunk(task):
+    """Worker: n_paths remuestreos evaluados con cada % de riesgo (mismos paths)"""
+    r = task["r"]
+    rng = np.random.default_rng(task["seed"])
+    batch = max(1, BATCH_CELLS // max(len(r), 1))
+    out = {risk: [] for risk in task["risks"]}
+
+    remaining = task["n_paths"]
+    while remaining > 0:
+        size = min(batch, remaining)
+        paths = resample(r, size, rng, task["method"])
+        for risk in task["risks"]:
+            out[risk].append(path_metrics(paths, risk, task["compounding"], task["ruin_level"]))
+        remaining -= size
+
+    return {
+        risk: {k: np.concatenate([m[k] for m in parts]) for k in parts[0]}
+        for risk, parts in out.items()
+    }
+
+
+def _describe(values):
+    values = np.asarray(values, dtype=np.float64)
+    stats = {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+    stats["mean"] = float(values.mean())
+    return stats
+
+
+def run_robustness(
+    r_multiples,
+    risks=(0.5, 1.0, 2.0),
+    n_paths=20000,
+    method="bootstrap",
+    compounding=True,
+    ruin_level=0.5,
+    workers=None,
+    seed=42,
+    executor=None,
+):
+    """
+    Distribuciones de max drawdown, tiempo de recuperación y riesgo de ruina
+    por % de riesgo. Los paths se reparten entre procesos con semillas derivadas
+    de 'seed' (resultado reproducible para un mismo número de workers).
+    executor: pool ya abierto (el del servidor); None = uno propio para esta corrida.
+    """
+    t0 = time.perf_counter()
+    r = np.asarray(r_multiples, dtype=np.float64)
+    if r.size == 0:
+        raise ValueError("Sin trades: nada que remuestrear")
+
+    workers = workers or os.cpu_count() or 1
+    n_chunks = min(workers, n_paths)
+    sizes = np.diff(np.linspace(0, n_paths, n_chunks + 1).astype(int))
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    tasks = [
+        {
+            "r": r,
+            "n_paths": int(size),
+            "seed": s,
+            "method": method,
+            "risks": list(risks),
+            "compounding": compounding,
+            "ruin_level": ruin_level,
+        }
+        for size, s in zip(sizes, seeds)
+    ]
+
+    if n_chunks == 1:
+        results = [_simulate_chunk(tasks[0])]
+    elif executor is not None:
+        results = list(executor.map(_simulate_chunk, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_chunks) as pool:
+            results = list(pool.map(_simulate_chunk, tasks))
+
+    report = []
+    for risk in risks:
+        m = {k: np.concatenate([res[risk][k] for res in results]) for k in results[0][risk]}
+        report.append(
+            {
+                "risk_percent": risk,
+                "max_drawdown": _describe(m["max_drawdown"] * 100),
+                "time_to_recovery": _describe(m["time_to_recovery"]),
+                "final_return": _describe((m["final"] - 1.0) * 100),
+                "risk_of_ruin": float(m["ruined"].mean()),
+                "prob_loss": float((m["final"] < 1.0).mean()),
+            }
+        )
+
+    return {
+        "trades": int(r.size),
+        "paths": int(n_paths),
+        "method": method,
+        "compounding": compounding,
+        "ruin_level": ruin_level,
+        "seconds": round(time.perf_counter() - t0, 3),
+        "results": report,
+    }
+
+
+def print_report(report):
+    print("\n" + "=" * 72)
+    print(
+        f"🎲 {report['method'].upper()} | {report['paths']} paths x {report['trades']} trades "
+        f"| ruina <= {report['ruin_level']:.0%} | {report['seconds']:.2f}s"
+    )
+    print("-" * 72)
+    print(f"{'RIESGO':>7}{'DD p50':>9}{'DD p95':>9}{'REC p50':>9}{'REC p95':>9}{'RET p50':>10}{'RUINA':>9}{'P(PÉRD)':>10}")
+    for r in report["results"]:
+        print(
+            f"{r['risk_percent']:>6.2f}%"
+            f"{r['max_drawdown']['p50']:>8.1f}%{r['max_drawdown']['p95']:>8.1f}%"
+            f"{r['time_to_recovery']['p50']:>9.0f}{r['time_to_recovery']['p95']:>9.0f}"
+            f"{r['final_return']['p50']:>9.1f}%{r['risk_of_ruin']:>9.2%}{r['prob_loss']:>10.2%}"
+        )
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Robustez Monte Carlo del backtest")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--paths", type=int, default=20000)
+    parser.add_argument("--risks", type=float, nargs="*", default=[0.5, 1.0, 2.0])
+    parser.add_argument("--method", choices=["bootstrap", "permutation"], default="bootstrap")
+    parser.add_argument("--fixed", action="store_true", help="Sin interés compuesto")
+    parser.add_argument("--ruin", type=float, default=0.5, help="Equity (fracción) que cuenta como ruina")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Guardar el reporte en este archivo")
+    args = parser.parse_args()
+
+    report = run_robustness(
+        load_outcomes(args.results),
+        risks=args.risks,
+        n_paths=args.paths,
+        method=args.method,
+        compounding=not args.fixed,
+        ruin_level=args.ruin,
+        workers=args.workers,
+        seed=args.seed,
+    )
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4)
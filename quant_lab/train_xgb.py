@@ -5,10 +5,12 @@ import os
 import json
 import joblib
 
-def train_model():
+def train_model(
+    dataset_path="quant_lab/datasets/dataset_labeled.csv",
+    model_dir="quant_lab/models",
+):
     print("🧠 INICIANDO ENTRENAMIENTO DE IA (XGBOOST)...")
 
-    dataset_path = "quant_lab/datasets/dataset_labeled.csv"
     if not os.path.exists(dataset_path):
         print("❌ No existe el dataset etiquetado.")
         return
@@ -84,7 +86,6 @@ def train_model():
     print(f"   Señales generadas en test: {best_trades_count}")
 
     # Guardado
-    model_dir = "quant_lab/models"
     os.makedirs(model_dir, exist_ok=True)
     
     model_path = os.path.join(model_dir, "po3_sniper_v1.json")
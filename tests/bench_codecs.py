@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from execution_engine.payload_codecs import (
+    COMPRESS_LEVEL,
+    JsonCodec,
+    MsgpackCodec,
+    OrjsonCodec,
+    msgpack,
+    orjson,
+)
+
+
+# --- PAYLOADS (misma forma que los que sirve server.py) ---
+def ws_snapshot(rng):
+    """Foto que /ws envía cada segundo a cada cliente"""
+    trades = [
+        {
+            "ticket": 1000 + k,
+            "symbol": "USTEC",
+            "type": "BULLISH" if rng.random() > 0.5 else "BEARISH",
+            "price": round(18500 + rng.random() * 500, 2),
+            "sl": round(18450 + rng.random() * 500, 2),
+            "tp": round(18600 + rng.random() * 500, 2),
+            "lots": 0.5,
+            "pnl": round(rng.normal(40, 150), 2),
+            "time": f"2025-01-{1 + k % 28:02d} 14:{k % 60:02d}:00",
+            "status": "CLOSED",
+            "comment": "Live Trade",
+        }
+        for k in range(20)
+    ]
+    return {
+        "running": True,
+        "status_text": "USTEC: Esperando FVG  ||  DE40: Sweep detectado",
+        "logs": [f"[14:{k:02d}:00] 🔎 USTEC: escaneando vela {k}" for k in range(15)],
+        "account": {"balance": 10234.55, "equity": 10301.12},
+        "settings": {"risk": 1.0, "auto_trade": True},
+        "statistics": {"win_rate": 61.2, "profit_factor": 1.74, "total_pnl": 2345.6, "max_drawdown": 512.3},
+        "recent_trades": trades,
+        "demo_statistics": {"win_rate": 60.0, "profit_factor": 1.6, "total_pnl": 1800.0, "max_drawdown": 400.0},
+        "instruments": [
+            {"symbol": s, "status": "OK", "last_latency_ms": 12.3, "p95_latency_ms": 30.1, "errors": 0}
+            for s in ("USTEC", "DE40")
+        ],
+    }
+
+
+def backtest_trades(rng, n=1000):
+    """Página grande de /api/backtest/runs/{id}/trades"""
+    return {
+        "run_id": 1,
+        "page": 1,
+        "page_size": n,
+        "total": 25000,
+        "trades": [
+            {
+                "seq": k,
+                "time": f"2025-02-{1 + k % 28:02d} {k % 24:02d}:{k % 60:02d}:00",
+                "exit_time": f"2025-02-{1 + k % 28:02d} {k % 24:02d}:{(k + 17) % 60:02d}:00",
+                "symbol": "USTEC",
+                "type": "BULLISH",
+                "prob": float(rng.random()),
+                "lots": 0.37,
+                "pnl": float(rng.normal(20, 120)),
+                "r_multiple": float(rng.normal(0.2, 1.3)),
+                "result": "WIN",
+                "exit_reason": "TP",
+            }
+            for k in range(n)
+        ],
+    }
+
+
+def chart_candles(rng, n=800):
+    """/api/chart/candles con el presupuesto por defecto"""
+    close = 18000 + np.cumsum(rng.normal(0, 5, n))
+    return {
+        "total_candles": 60000,
+        "candles_per_bar": 75,
+        "points": n,
+        "candles": [
+            {
+                "time": f"2025-01-{1 + k // 60 % 28:02d} {k % 24:02d}:{k % 60:02d}:00+00:00",
+                "open": float(c - 2.5),
+                "high": float(c + 6.1),
+                "low": float(c - 7.3),
+                "close": float(c),
+            }
+            for k, c in enumerate(close)
+        ],
+    }
+
+
+def _stdlib_send_json(obj):
+    # Lo que hacía websocket.send_json (starlette) antes de los codecs
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def encoders():
+    out = [("json (send_json)", _stdlib_send_json), ("json (stdlib)", JsonCodec().encode)]
+    if orjson is not None:
+        out.append(("orjson", OrjsonCodec().encode))
+    if msgpack is not None:
+        out.append(("msgpack", MsgpackCodec().encode))
+    return out
+
+
+def _per_op(fn, obj, min_seconds=0.3):
+    n, t0 = 0, time.perf_counter()
+    while True:
+        fn(obj)
+        n += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_seconds:
+            return elapsed / n
+
+
+def run(min_seconds=0.3, seed=7):
+    rng = np.random.default_rng(seed)
+    payloads = {
+        "ws_snapshot": ws_snapshot(rng),
+        "backtest_trades_1000": backtest_trades(rng),
+        "chart_candles_800": chart_candles(rng),
+    }
+    rows = []
+    for pname, obj in payloads.items():
+        for ename, enc in encoders():
+            raw = enc(obj)
+            encode_s = _per_op(enc, obj, min_seconds)
+            deflated = zlib.compress(raw, COMPRESS_LEVEL)
+            deflate_s = _per_op(lambda o: zlib.compress(enc(o), COMPRESS_LEVEL), obj, min_seconds)
+            rows.append(
+                {
+                    "payload": pname,
+                    "codec": ename,
+                    "bytes": len(raw),
+                    "encode_us": encode_s * 1e6,
+                    "deflate_bytes": len(deflated),
+                    "deflate_us": deflate_s * 1e6,
+                }
+            )
+    return rows
+
+
+def print_table(rows):
+    print("\n" + "=" * 86)
+    print(f"{'PAYLOAD':<22}{'CODEC':<18}{'BYTES':>9}{'ENC µs':>10}{'+DEFLATE B':>12}{'+DEFLATE µs':>13}")
+    print("-" * 86)
+    last = None
+    for r in rows:
+        if last and r["payload"] != last:
+            print("-" * 86)
+        last = r["payload"]
+        print(
+            f"{r['payload']:<22}{r['codec']:<18}{r['bytes']:>9}{r['encode_us']:>10.1f}"
+            f"{r['deflate_bytes']:>12}{r['deflate_us']:>13.1f}"
+        )
+    print("=" * 86)
+    if msgpack is None or orjson is None:
+        print("ℹ Instala orjson / msgpack para comparar todos los codecs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de codecs (CPU de encode y bytes en el cable)")
+    parser.add_argument("--seconds", type=float, default=0.3, help="Tiempo mínimo por medición")
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    rows = run(args.seconds)
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=4)
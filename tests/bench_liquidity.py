@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from data_core.liquidity import POOL_MAX_AGE, LiquidityPoolIndex, pool_sweep_columns
+
+
+def synthetic_m1(n, seed=7):
+    """Random walk M1 + fractales de ventana 5 (mismo criterio que Indicators)"""
+    rng = np.random.default_rng(seed)
+    close = np.round(18000 + np.cumsum(rng.normal(0, 2.5, n)), 2)
+    high = close + np.round(np.abs(rng.normal(0, 2, n)), 2)
+    low = close - np.round(np.abs(rng.normal(0, 2, n)), 2)
+    pad_h = np.pad(high, 2, constant_values=-np.inf)
+    pad_l = np.pad(low, 2, constant_values=np.inf)
+    win_h = np.lib.stride_tricks.sliding_window_view(pad_h, 5).max(axis=1)
+    win_l = np.lib.stride_tricks.sliding_window_view(pad_l, 5).min(axis=1)
+    swing_high = high == win_h
+    swing_low = low == win_l
+    # Bordes sin ventana completa: rolling(center=True) da NaN => no es swing
+    swing_high[:2] = swing_high[-2:] = False
+    swing_low[:2] = swing_low[-2:] = False
+    return high, low, swing_high, swing_low
+
+
+def naive_scan(high, low, swing_high, swing_low, lag, max_age):
+    """Referencia: en cada vela recorre todos los niveles vivos (cuadrático)"""
+    n = len(high)
+    highs, lows = [], []  # [precio, confirmado_en]
+    taken_n = np.zeros(n, dtype=np.int64)
+    for t in range(n):
+        j = t - lag
+        if j >= 0:
+            if swing_high[j]:
+                highs.append((high[j], t))
+            if swing_low[j]:
+                lows.append((low[j], t))
+        highs = [lv for lv in highs if t - lv[1] <= max_age]
+        lows = [lv for lv in lows if t - lv[1] <= max_age]
+        keep_h = [lv for lv in highs if not high[t] > lv[0]]
+        keep_l = [lv for lv in lows if not low[t] < lv[0]]
+        taken_n[t] = (len(highs) - len(keep_h)) + (len(lows) - len(keep_l))
+        highs, lows = keep_h, keep_l
+    return taken_n
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def run(n=200_000, naive_n=20_000, max_age=POOL_MAX_AGE):
+    high, low, swing_high, swing_low = synthetic_m1(n)
+    incremental, t_scan = _timed(LiquidityPoolIndex.scan, high, low, swing_high, swing_low, 2, max_age)
+    vectorized, t_vec = _timed(pool_sweep_columns, high, low, swing_high, swing_low, 2, max_age)
+    equal = all(np.array_equal(incremental[k], vectorized[k], equal_nan=True) for k in incremental)
+
+    m = min(naive_n, n)
+    naive, t_naive = _timed(naive_scan, high[:m], low[:m], swing_high[:m], swing_low[:m], 2, max_age)
+    small = pool_sweep_columns(high[:m], low[:m], swing_high[:m], swing_low[:m], 2, max_age)
+    naive_equal = np.array_equal(naive, small["pool_high_swept_n"] + small["pool_low_swept_n"])
+
+    return {
+        "rows": n,
+        "levels": int(swing_high.sum() + swing_low.sum()),
+        "sweeps": int(vectorized["pool_high_swept_n"].sum() + vectorized["pool_low_swept_n"].sum()),
+        "scan_s": t_scan,
+        "vectorized_s": t_vec,
+        "equal": bool(equal),
+        "naive_rows": m,
+        "naive_s": t_naive,
+        "naive_equal": bool(naive_equal),
+    }
+
+
+def print_report(r):
+    print("\n" + "=" * 60)
+    print(f"💧 POOLS DE LIQUIDEZ: {r['rows']:,} velas | {r['levels']:,} niveles | {r['sweeps']:,} tomas")
+    print("-" * 60)
+    print(f"{'LiquidityPoolIndex.scan':<36}{r['scan_s'] * 1000:>12.1f} ms")
+    print(f"{'pool_sweep_columns':<36}{r['vectorized_s'] * 1000:>12.1f} ms")
+    print(f"Mismo resultado: {'✅' if r['equal'] else '❌'}")
+    print("-" * 60)
+    naive_ms = r["naive_s"] * 1000 * r["rows"] / r["naive_rows"]
+    print(f"{'Re-escaneo ingenuo (extrapolado)':<36}{naive_ms:>12.1f} ms")
+    print(f"Coincide con el ingenuo ({r['naive_rows']:,} velas): {'✅' if r['naive_equal'] else '❌'}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Índice de pools de liquidez vs re-escaneo ingenuo")
+    parser.add_argument("-n", type=int, default=200_000, help="Velas M1 sintéticas")
+    parser.add_argument("--naive", type=int, default=20_000, help="Velas para la referencia cuadrática")
+    parser.add_argument("--max-age", type=int, default=POOL_MAX_AGE)
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    result = run(args.n, args.naive, args.max_age)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=4)
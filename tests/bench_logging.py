@@ -0,0 +1,200 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from execution_engine.log_store import LogStore
+
+
+class LegacyLog:
+    """Lo que hacía BotManager.log antes del LogStore (lista + pop(0) + print)"""
+
+    def __init__(self, maxlen=100):
+        self.logs = []
+        self.maxlen = maxlen
+        self.latest_status = "IDLE"
+
+    def log(self, msg):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        fmsg = f"[{timestamp}] {msg}"
+        print(fmsg)
+        self.logs.append(fmsg)
+        if len(self.logs) > self.maxlen:
+            self.logs.pop(0)
+        self.latest_status = msg
+
+
+def _per_op(fn, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - t0) / n
+
+
+def bench_hot_path(n, workdir):
+    """Costo por llamada en el thread que loguea (el que decide la operación)"""
+    rows = []
+    # print va a /dev/null: en una consola real el legacy es todavía más lento
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for maxlen in (100, 4096):
+            legacy = LegacyLog(maxlen)
+            # Lista ya llena: cada llamada paga el pop(0)
+            _per_op(lambda i: legacy.log(f"🔎 [USTEC] Patrón BULLISH detectado @ {18500 + i}"), maxlen)
+            rows.append(
+                (
+                    f"legacy list (max {maxlen})",
+                    _per_op(lambda i: legacy.log(f"🔎 [USTEC] Patrón BULLISH detectado @ {18500 + i}"), n),
+                )
+            )
+
+    bare = LogStore(path=None, echo=False)
+    rows.append(
+        (
+            "LogStore.append (sin writer)",
+            _per_op(lambda i: bare.append(f"🔎 [USTEC] Patrón BULLISH detectado @ {18500 + i}"), n),
+        )
+    )
+    # Con el writer bajando a disco en paralelo (compite por el GIL)
+    store = LogStore(path=os.path.join(workdir, "hot.log"), echo=False)
+    rows.append(
+        (
+            "LogStore.append",
+            _per_op(lambda i: store.append(f"🔎 [USTEC] Patrón BULLISH detectado @ {18500 + i}"), n),
+        )
+    )
+    rows.append(
+        (
+            "LogStore.append (+fields)",
+            _per_op(
+                lambda i: store.append(
+                    f"🔎 [USTEC] Patrón BULLISH detectado @ {18500 + i}",
+                    "INFO",
+                    "SIGNAL",
+                    {"symbol": "USTEC", "type": "BULLISH", "price": 18500 + i},
+                ),
+                n,
+            ),
+        )
+    )
+    filtered = LogStore(path=None, echo=False, min_level="WARNING")
+    rows.append(("LogStore.append (DEBUG filtrado)", _per_op(lambda i: filtered.append("x", "DEBUG"), n)))
+    store.close()
+    return rows
+
+
+def bench_threads(n, threads, workdir):
+    """N workers (uno por instrumento) logueando a la vez: seq sin huecos ni repetidos"""
+    store = LogStore(
+        path=os.path.join(workdir, "threads.log"), echo=False, capacity=n * threads + 1, max_bytes=1 << 30
+    )
+    per_thread = n
+
+    def worker(k):
+        for i in range(per_thread):
+            store.append(f"worker {k} msg {i}", code="BENCH", fields={"k": k})
+
+    pool = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    store.close()
+
+    seqs = [rec.seq for rec in store.since(0, limit=n * threads)]
+    with open(store.path) as f:
+        written = sum(1 for _ in f)
+    return {
+        "threads": threads,
+        "records": n * threads,
+        "us_per_op": elapsed / (n * threads) * 1e6,
+        "seq_ok": seqs == list(range(1, n * threads + 1)),
+        "written": written,
+    }
+
+
+def bench_queries(workdir, capacity=4096):
+    """Consulta 'since N' de la App: costo proporcional a lo devuelto, no al ring"""
+    store = LogStore(capacity=capacity, path=None, echo=False)
+    for i in range(capacity * 3):
+        store.append(f"msg {i}")
+    last = store.last_seq
+    rows = []
+    for label, since, limit in (
+        ("since (nada nuevo)", last, 200),
+        ("since (últimos 15)", last - 15, 200),
+        ("since (página 200)", last - 1000, 200),
+        ("tail 15 + formato", None, 15),
+    ):
+        if since is None:
+            rows.append((label, _per_op(lambda i: store.lines(limit), 2000)))
+        else:
+            rows.append((label, _per_op(lambda i: store.since(since, limit), 2000)))
+    return rows
+
+
+def bench_writer(n, workdir):
+    """Throughput del writer: registros por segundo bajados a disco en lotes"""
+    store = LogStore(
+        path=os.path.join(workdir, "writer.log"), echo=False, capacity=n + 1, flush_interval=3600, max_bytes=1 << 30
+    )
+    for i in range(n):
+        store.append(f"msg {i}", code="BENCH", fields={"i": i})
+    t0 = time.perf_counter()
+    store.flush()
+    elapsed = time.perf_counter() - t0
+    store.close()
+    return {"records": n, "seconds": elapsed, "records_per_s": n / elapsed if elapsed else 0.0}
+
+
+def run(n=200_000, threads=4):
+    with tempfile.TemporaryDirectory() as workdir:
+        return {
+            "hot_path": bench_hot_path(n, workdir),
+            "threads": bench_threads(n // threads, threads, workdir),
+            "queries": bench_queries(workdir),
+            "writer": bench_writer(n, workdir),
+        }
+
+
+def print_report(result):
+    print("\n" + "=" * 60)
+    print(f"{'CAMINO CALIENTE':<42}{'µs/llamada':>16}")
+    print("-" * 60)
+    for label, secs in result["hot_path"]:
+        print(f"{label:<42}{secs * 1e6:>16.3f}")
+    print("-" * 60)
+    t = result["threads"]
+    print(
+        f"{t['threads']} threads x {t['records'] // t['threads']}: {t['us_per_op']:.3f} µs/op | "
+        f"seq sin huecos: {'✅' if t['seq_ok'] else '❌'} | en disco: {t['written']}"
+    )
+    print("-" * 60)
+    print(f"{'CONSULTAS (ring 4096)':<42}{'µs/consulta':>16}")
+    for label, secs in result["queries"]:
+        print(f"{label:<42}{secs * 1e6:>16.3f}")
+    print("-" * 60)
+    w = result["writer"]
+    print(f"Writer: {w['records']} registros en {w['seconds']:.3f}s ({w['records_per_s']:,.0f}/s)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Overhead del log estructurado vs la lista legacy")
+    parser.add_argument("-n", type=int, default=200_000, help="Registros por medición")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    result = run(args.n, args.threads)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=4)
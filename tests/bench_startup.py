@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+# Raíz del proyecto: los subprocesos importan execution_engine.server desde aquí
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Módulos que NO deben cargarse al importar el servidor (van en el arranque perezoso)
+HEAVY_MODULES = ["pandas", "pandas_ta", "xgboost", "MetaTrader5", "sklearn"]
+
+IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import execution_engine.server
+elapsed = time.perf_counter() - t0
+print(json.dumps({"seconds": elapsed, "heavy": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def measure_import(repeat=5):
+    """Tiempo de 'import execution_engine.server' en procesos limpios (mediana)"""
+    runs, heavy = [], set()
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE % HEAVY_MODULES],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        data = json.loads(out.stdout.strip().splitlines()[-1])
+        runs.append(data["seconds"])
+        heavy.update(data["heavy"])
+    runs.sort()
+    return runs[len(runs) // 2], sorted(heavy)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url):
+    """(status HTTP, JSON); 503 cuenta como respuesta: el servidor ya atiende"""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as r:
+            return r.status, json.loads(r.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+
+
+def measure_first_response(ready_timeout=120.0):
+    """
+    Lanza uvicorn y mide:
+    - first_response: hasta la primera respuesta de /health (API arriba).
+    - ready: hasta que /health responde 200 (motor cargado en segundo plano).
+    """
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "execution_engine.server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    first, ready = None, None
+    try:
+        while time.perf_counter() - t0 < ready_timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn terminó con código {proc.returncode}")
+            try:
+                status, body = _get(url)
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.01)
+                continue
+            now = time.perf_counter() - t0
+            if first is None:
+                first = now
+            if status == 200:
+                ready = now
+                break
+            if body.get("status") == "error":
+                print(f"⚠ el motor no arrancó: {body.get('error')}")
+                break
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return first, ready
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de arranque del servidor API")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-import", type=float, default=1.0, help="Presupuesto (s) del import")
+    parser.add_argument("--max-first-response", type=float, default=3.0, help="Presupuesto (s) de la primera respuesta")
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    parser.add_argument("--skip-server", action="store_true", help="Solo medir el import")
+    args = parser.parse_args()
+
+    failures = []
+    import_s, heavy = measure_import(args.repeat)
+    print(f"⏱ import execution_engine.server: {import_s * 1000:.0f} ms (mediana de {args.repeat})")
+    if heavy:
+        failures.append(f"módulos pesados cargados al importar: {', '.join(heavy)}")
+    if import_s > args.max_import:
+        failures.append(f"import {import_s:.2f}s > {args.max_import:.2f}s")
+
+    if not args.skip_server:
+        first, ready = measure_first_response(args.ready_timeout)
+        print(f"⏱ primera respuesta /health: {first * 1000:.0f} ms" if first is not None else "❌ sin respuesta")
+        print(f"⏱ motor listo (/health 200): {ready:.2f} s" if ready is not None else "⚠ motor no listo (timeout o error de arranque)")
+        if first is None or first > args.max_first_response:
+            failures.append(f"primera respuesta {first}s > {args.max_first_response:.2f}s")
+
+    if failures:
+        print("❌ REGRESIÓN DE ARRANQUE: " + " | ".join(failures))
+        sys.exit(1)
+    print("✅ Arranque dentro del presupuesto")
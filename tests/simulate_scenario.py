@@ -7,7 +7,7 @@ from datetime import datetime
 # 1. Configurar rutas para importar los módulos del proyecto
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from data_core.indicators import Indicators
+from data_core.frame_cache import get_indicator_frame
 from data_core.po3_logic import PO3Detector
 from execution_engine.bot_manager import BotManager
 
@@ -22,31 +22,15 @@ def run_simulation():
         print("❌ No se encontró SYNC_DATA_M1.csv. Ejecuta el miner primero.")
         return
 
-    print(f"📂 Cargando historial: {data_path}")
-    df = pd.read_csv(data_path, index_col="time", parse_dates=True)
-
-    # Adaptador de columnas (Infraestructura -> Lógica)
-    df.rename(
-        columns={
-            "nq_open": "open",
-            "nq_high": "high",
-            "nq_low": "low",
-            "nq_close": "close",
-            "nq_vol": "volume",
-        },
-        inplace=True,
-    )
-
     # 3. Inicializar Componentes Reales
     # Instanciamos el BotManager para usar SU cerebro (IA) y SU lógica de features
     # Esto asegura que la simulación sea idéntica a la realidad.
     print("🧠 Inicializando Motores e IA...")
     bot = BotManager()
-    indicators = Indicators()
 
-    # 4. Preparar Datos
-    print("🧮 Calculando Indicadores Técnicos...")
-    df = indicators.add_all_features(df)
+    # 4. Preparar Datos (frame de indicadores compartido con backtester y dataset)
+    print(f"📂 Cargando historial + indicadores: {data_path}")
+    df = get_indicator_frame(data_path)
 
     # 5. Escaneo Retrospectivo (Back-Scan)
     # Miramos las últimas 5000 velas (aprox 3.5 días)
@@ -0,0 +1,122 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pandas_ta")
+xgb = pytest.importorskip("xgboost")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from data_core.frame_cache import get_indicator_frame
+from quant_lab import backtester
+from quant_lab.backtester import Backtester
+
+N_CANDLES = 14_000
+FIRST_MINE = 9_000  # Velas del primer minado; el resto llega en la siguiente corrida
+FEATURES = ["hour", "is_ny_session", "distance_to_ema50", "trend_ema200", "volatility_shock"]
+
+
+def write_sync_csv(path, rows, seed=5):
+    rng = np.random.default_rng(seed)
+    time = pd.date_range("2025-03-03 18:00", periods=N_CANDLES, freq="1min")
+    close = 18000 + np.cumsum(rng.normal(0, 5, N_CANDLES))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) + rng.random(N_CANDLES) * 6
+    low = np.minimum(open_, close) - rng.random(N_CANDLES) * 6
+    data = {"time": time, "nq_open": open_, "nq_high": high, "nq_low": low, "nq_close": close}
+    pd.DataFrame(data).iloc[:rows].to_csv(path, index=False)
+
+
+@pytest.fixture
+def lab(tmp_path, monkeypatch):
+    """Modelo, config, cache de indicadores e historial de corridas, todo en tmp_path"""
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(400, len(FEATURES))), columns=FEATURES)
+    X["hour"] = rng.integers(0, 24, 400)
+    model = xgb.XGBClassifier(n_estimators=8, max_depth=2)
+    model.fit(X, (X["distance_to_ema50"] + rng.normal(size=400) > 0).astype(int))
+    model_path = str(tmp_path / "model.json")
+    model.save_model(model_path)
+    config_path = str(tmp_path / "model_config.json")
+    with open(config_path, "w") as f:
+        json.dump({"threshold": 0.3, "features": FEATURES}, f)
+
+    frames = str(tmp_path / "frames")
+    monkeypatch.setattr(backtester, "get_indicator_frame", lambda path: get_indicator_frame(path, cache_root=frames))
+
+    def run(data_path, compounding, checkpoint_dir=None, name="out.json"):
+        output = str(tmp_path / name)
+        Backtester(
+            data_path,
+            model_path,
+            config_path,
+            compounding=compounding,
+            output_file=output,
+            checkpoint_dir=checkpoint_dir,
+            results_db=str(tmp_path / "runs.db"),
+        ).run()
+        with open(output) as f:
+            report = json.load(f)
+        report.pop("run_id")  # Cada corrida tiene su propio id en el historial
+        return report
+
+    return tmp_path, run
+
+
+@pytest.mark.parametrize("compounding", [False, True])
+def test_resume_matches_uninterrupted_run(lab, compounding, capsys):
+    tmp_path, run = lab
+    full_csv, live_csv = str(tmp_path / "full.csv"), str(tmp_path / "live.csv")
+    write_sync_csv(full_csv, N_CANDLES)
+    reference = run(full_csv, compounding, name="reference.json")
+    assert reference["summary"]["total_trades"] > 0
+    if compounding:
+        assert reference["compounding_check"]["ok"]
+
+    checkpoint = str(tmp_path / "checkpoint")
+    write_sync_csv(live_csv, FIRST_MINE)
+    run(live_csv, compounding, checkpoint)
+    capsys.readouterr()
+    with open(os.path.join(checkpoint, "state.json")) as f:
+        saved = json.load(f)
+    # Hay trades a ambos lados del punto de reanudación
+    assert 0 < len(saved["trades"]) < reference["summary"]["total_trades"]
+
+    # El miner re-escribe el CSV con las velas nuevas: se reanuda sin re-simular lo anterior
+    write_sync_csv(live_csv, N_CANDLES)
+    assert run(live_csv, compounding, checkpoint) == reference
+    assert "Reanudando desde checkpoint" in capsys.readouterr().out
+    # Reanudar otra vez sobre el mismo CSV da el mismo reporte
+    assert run(live_csv, compounding, checkpoint) == reference
+
+
+def test_changed_history_falls_back_to_full_run(lab, capsys):
+    tmp_path, run = lab
+    live_csv = str(tmp_path / "live.csv")
+    checkpoint = str(tmp_path / "checkpoint")
+    write_sync_csv(live_csv, FIRST_MINE)
+    run(live_csv, False, checkpoint)
+
+    # Historia distinta (otro broker / re-minado con correcciones): el checkpoint no sirve
+    write_sync_csv(live_csv, N_CANDLES, seed=6)
+    capsys.readouterr()
+    resumed = run(live_csv, False, checkpoint)
+    out = capsys.readouterr().out
+    assert "La historia cambió" in out and "Reanudando" not in out
+    assert resumed == run(live_csv, False, name="reference.json")
+
+
+def test_other_config_ignores_checkpoint(lab, capsys):
+    tmp_path, run = lab
+    live_csv = str(tmp_path / "live.csv")
+    checkpoint = str(tmp_path / "checkpoint")
+    write_sync_csv(live_csv, FIRST_MINE)
+    run(live_csv, False, checkpoint)
+    write_sync_csv(live_csv, N_CANDLES)
+    capsys.readouterr()
+    # Con interés compuesto el estado guardado (riesgo fijo) no es válido
+    assert run(live_csv, True, checkpoint) == run(live_csv, True, name="reference.json")
+    assert "Checkpoint de otra configuración" in capsys.readouterr().out
@@ -0,0 +1,109 @@
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pandas_ta")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from data_core.frame_cache import ensure_indicator_frame, load_sync_csv
+from data_core.indicators import Indicators
+from data_core.po3_logic import PO3Detector
+from data_core.session_calendar import calendar_for
+from quant_lab import build_dataset
+from quant_lab.build_dataset import SCAN_START, build_candidates_dataset
+
+N_CANDLES = 15_000
+
+
+@pytest.fixture(scope="module")
+def sync_csv(tmp_path_factory):
+    """Historial M1 sintético con el formato del miner (SYNC_DATA_M1.csv)"""
+    rng = np.random.default_rng(3)
+    time = pd.date_range("2025-01-02 18:00", periods=N_CANDLES, freq="1min")
+    close = 18000 + np.cumsum(rng.normal(0, 5, N_CANDLES))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) + rng.random(N_CANDLES) * 6
+    low = np.minimum(open_, close) - rng.random(N_CANDLES) * 6
+    path = tmp_path_factory.mktemp("data") / "SYNC_DATA_M1.csv"
+    pd.DataFrame(
+        {
+            "time": time,
+            "nq_open": open_,
+            "nq_high": high,
+            "nq_low": low,
+            "nq_close": close,
+            "es_open": open_ / 4,
+            "es_high": high / 4,
+            "es_low": low / 4,
+            "es_close": close / 4,
+        }
+    ).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def single_pass(sync_csv):
+    """Referencia: indicadores sobre todo el historial y un único recorrido vela a vela"""
+    df = Indicators().add_all_features(load_sync_csv(sync_csv))
+    calendar = calendar_for(df.index)
+    detector = PO3Detector(df)
+    rows = []
+    for i in range(SCAN_START, len(df)):
+        signal = detector.scan_for_signals(i)
+        if signal:
+            rows.append(
+                build_dataset._candidate_row(df, i, signal, calendar.hour_frac[i], calendar.is_cash_session[i])
+            )
+    assert rows, "el historial sintético debe producir candidatos"
+    return pd.DataFrame(rows)
+
+
+def read_candidates(path):
+    return pd.read_csv(path, parse_dates=["timestamp"])
+
+
+def assert_same_candidates(path, expected):
+    got = read_candidates(path)
+    # Misma serialización que el CSV de la pasada única
+    expected = pd.read_csv(io.StringIO(expected.to_csv(index=False)), parse_dates=["timestamp"])
+    pd.testing.assert_frame_equal(got, expected, check_exact=True)
+
+
+@pytest.mark.parametrize("chunk_rows, workers", [(N_CANDLES, 1), (997, 1), (2500, 2)])
+def test_frame_blocks_match_single_pass(sync_csv, single_pass, tmp_path, chunk_rows, workers):
+    frame_dir = ensure_indicator_frame(sync_csv, cache_root=str(tmp_path / "frames"))
+    output = str(tmp_path / "candidates.csv")
+    build_candidates_dataset(output_path=output, frame_dir=frame_dir, chunk_rows=chunk_rows, workers=workers)
+    assert_same_candidates(output, single_pass)
+
+
+@pytest.mark.parametrize("chunk_rows, workers", [(3000, 1), (4999, 2)])
+def test_streamed_blocks_match_single_pass(sync_csv, single_pass, tmp_path, chunk_rows, workers):
+    # Cada bloque recalcula sus indicadores desde el halo: mismos valores que la pasada completa
+    output = str(tmp_path / "candidates.csv")
+    build_candidates_dataset(
+        input_path=sync_csv, output_path=output, stream=True, chunk_rows=chunk_rows, workers=workers
+    )
+    assert_same_candidates(output, single_pass)
+
+
+def test_no_partial_output_on_failure(sync_csv, tmp_path, monkeypatch):
+    frame_dir = ensure_indicator_frame(sync_csv, cache_root=str(tmp_path / "frames"))
+    output = tmp_path / "candidates.csv"
+    calls = []
+
+    def failing_scan(task):
+        calls.append(task)
+        if len(calls) == 3:
+            raise RuntimeError("worker caído")
+        return scan(task)
+
+    scan = build_dataset._scan_block
+    monkeypatch.setattr(build_dataset, "_scan_block", failing_scan)
+    with pytest.raises(RuntimeError):
+        build_candidates_dataset(output_path=str(output), frame_dir=frame_dir, chunk_rows=2000, workers=1)
+    assert list(tmp_path.glob("candidates.csv*")) == []
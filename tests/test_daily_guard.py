@@ -0,0 +1,112 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from execution_engine import risk
+from execution_engine.risk import RiskManager
+
+NY = pytz.timezone("America/New_York")
+
+
+def ny(*args):
+    """Epoch de una hora de pared de Nueva York"""
+    return NY.localize(datetime(*args)).timestamp()
+
+
+@pytest.fixture(autouse=True)
+def no_terminal(monkeypatch):
+    # Sin terminal: el único balance es el que fija start_session
+    monkeypatch.setattr(risk, "mt5", None)
+
+
+def test_halts_on_breach_until_next_session():
+    rm = RiskManager(max_daily_loss=3.0)
+    rm.start_session(10_000.0, ny(2025, 3, 4, 9, 30))
+    rm.on_realized_pnl(-200.0, ny(2025, 3, 4, 10, 0))
+    assert rm.check_daily_drawdown(ny(2025, 3, 4, 10, 0))
+    rm.update_unrealized(-100.0, ny(2025, 3, 4, 10, 5))  # -300 = 3% exacto
+    assert not rm.check_daily_drawdown(ny(2025, 3, 4, 10, 5))
+    # Recuperar el flotante no levanta el bloqueo dentro de la sesión
+    rm.update_unrealized(0.0, ny(2025, 3, 4, 15, 0))
+    assert not rm.check_daily_drawdown(ny(2025, 3, 4, 23, 59, 59))
+    # Medianoche de NY: sesión nueva, el balance de referencia absorbe lo realizado
+    assert rm.check_daily_drawdown(ny(2025, 3, 5, 0, 0))
+    assert rm.get_state()["day_start_balance"] == 9_800.0
+    assert rm.daily_pnl == 0.0
+
+
+@pytest.mark.parametrize(
+    "before, after",
+    [
+        # Cambio de horario (EE.UU.): los cortes siguen en la medianoche local, no cada 24h UTC
+        ((2025, 3, 8, 23, 59), (2025, 3, 9, 0, 0)),
+        ((2025, 3, 9, 23, 59), (2025, 3, 10, 0, 0)),
+        ((2025, 11, 1, 23, 59), (2025, 11, 2, 0, 0)),
+        ((2025, 11, 2, 23, 59), (2025, 11, 3, 0, 0)),
+    ],
+)
+def test_rollover_at_ny_midnight_across_dst(before, after):
+    rm = RiskManager(max_daily_loss=1.0)
+    rm.start_session(10_000.0, ny(*before) - 3600)
+    rm.on_realized_pnl(-150.0, ny(*before))
+    assert not rm.check_daily_drawdown(ny(*before))
+    assert rm.check_daily_drawdown(ny(*after))
+    following = datetime(*after[:3]) + timedelta(days=1)
+    assert rm.get_state()["next_reset_ts"] == ny(following.year, following.month, following.day)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_replayed_sessions(seed):
+    """
+    Flujo aleatorio de realizados y flotantes a lo largo de varios días contra
+    una referencia que agrupa por fecha de NY y recorre cada sesión desde cero.
+    """
+    rng = random.Random(seed)
+    rm = RiskManager(max_daily_loss=2.0)
+    t = ny(2025, 3, 6, 18, 0)
+    rm.start_session(5_000.0, t)
+
+    balance, day, realized, unrealized, halted = 5_000.0, None, 0.0, 0.0, False
+    start_unrealized = 0.0
+    for _ in range(300):
+        t += rng.choice((60, 600, 3600, 4 * 3600))
+        date = datetime.fromtimestamp(t, NY).date()
+        if day is not None and date != day:
+            balance += realized
+            realized, halted, start_unrealized = 0.0, False, unrealized
+        day = date
+        if rng.random() < 0.5:
+            pnl = round(rng.uniform(-60, 40), 2)
+            rm.on_realized_pnl(pnl, t)
+            realized += pnl
+        else:
+            unrealized = round(rng.uniform(-80, 80), 2)
+            rm.update_unrealized(unrealized, t)
+        if realized + unrealized - start_unrealized <= -balance * 0.02:
+            halted = True
+        assert rm.check_daily_drawdown(t) == (not halted)
+
+
+def test_fails_closed_without_session_balance(capsys):
+    rm = RiskManager()
+    assert not rm.check_daily_drawdown(ny(2025, 3, 4, 10, 0))
+    assert not rm.check_daily_drawdown(ny(2025, 3, 4, 10, 1))
+    assert capsys.readouterr().out.count("Balance de inicio de sesión desconocido") == 1
+    rm.start_session(10_000.0, ny(2025, 3, 4, 10, 2))
+    assert rm.check_daily_drawdown(ny(2025, 3, 4, 10, 2))
+
+
+def test_state_roundtrip_keeps_the_halt():
+    rm = RiskManager(max_daily_loss=1.0)
+    rm.start_session(10_000.0, ny(2025, 3, 4, 9, 0))
+    rm.on_realized_pnl(-100.0, ny(2025, 3, 4, 9, 5))
+    assert not rm.check_daily_drawdown(ny(2025, 3, 4, 9, 5))
+    restored = RiskManager(max_daily_loss=1.0)
+    restored.set_state(rm.get_state())
+    assert not restored.check_daily_drawdown(ny(2025, 3, 4, 12, 0))
+    assert restored.check_daily_drawdown(ny(2025, 3, 5, 0, 1))
@@ -0,0 +1,130 @@
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from execution_engine.risk import ContractSpec, RiskManager
+
+SPEC = ContractSpec("USTEC", tick_value=0.01, tick_size=0.01, volume_step=0.01, volume_min=0.01, volume_max=100.0)
+
+
+def scalar_lot(entry, stop, balance, spec, risk_percent):
+    """Fórmula unitaria de referencia: floor al step, límites del broker, 0 sin distancia/valor de punto"""
+    dist = abs(entry - stop)
+    if dist == 0 or spec.point_value <= 0:
+        return 0.0
+    raw = balance * risk_percent / 100 / (dist * spec.point_value)
+    lots = round(math.floor(raw / spec.volume_step) * spec.volume_step, 2)
+    return min(max(lots, spec.volume_min), spec.volume_max)
+
+
+def random_spec(rng):
+    step = float(rng.choice([0.01, 0.1, 1.0]))
+    volume_min = round(step * rng.integers(1, 5), 2)
+    return ContractSpec(
+        "X",
+        tick_value=float(rng.choice([0.0, 0.01, 0.5, 5.0, 12.5])),
+        tick_size=float(rng.choice([0.01, 0.25, 1.0])),
+        volume_step=step,
+        volume_min=volume_min,
+        volume_max=round(volume_min + step * rng.integers(0, 1000), 2),
+    )
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_vectorized_matches_scalar_formula(seed):
+    rng = np.random.default_rng(seed)
+    spec = random_spec(rng)
+    n = 64
+    entries = 18000 + rng.normal(0, 50, n)
+    stops = entries - rng.choice([0.0, 0.25, 3.0, 40.0, 500.0], n) * rng.choice([-1, 1], n)
+    balances = rng.uniform(100, 1e6, n)
+    risk_percent = float(rng.choice([0.25, 1.0, 2.5]))
+
+    lots, risk_money = RiskManager(risk_percent=risk_percent).get_lot_sizes(entries, stops, balances, spec)
+
+    expected = [scalar_lot(e, s, b, spec, risk_percent) for e, s, b in zip(entries, stops, balances)]
+    np.testing.assert_array_equal(lots, expected)
+    np.testing.assert_allclose(risk_money, lots * np.abs(entries - stops) * spec.point_value)
+
+    sized = lots > 0
+    # Siempre múltiplo del step y dentro de los límites del broker
+    steps = lots[sized] / spec.volume_step
+    np.testing.assert_allclose(steps, np.round(steps), atol=1e-6)
+    assert np.all((lots[sized] >= spec.volume_min - 1e-12) & (lots[sized] <= spec.volume_max + 1e-12))
+    # Redondeo hacia abajo: nunca arriesga más que el objetivo salvo forzado por volume_min
+    target = balances * risk_percent / 100
+    over = sized & (risk_money > target * (1 + 1e-9))
+    assert np.all(lots[over] == spec.volume_min)
+
+
+def test_floor_never_rounds_up():
+    rm = RiskManager(risk_percent=1.0)
+    # 100 $ de riesgo / (30 puntos * 1 $) = 3.333 lotes -> 3.33
+    lots, risk = rm.get_lot_sizes([18000.0], [17970.0], [10_000.0], SPEC)
+    assert lots[0] == 3.33
+    assert risk[0] <= 100.0
+
+
+def test_clipped_to_broker_limits():
+    rm = RiskManager(risk_percent=1.0)
+    lots, _ = rm.get_lot_sizes([18000.0, 18000.0], [17999.99, 17000.0], [1e9, 50.0], SPEC)
+    assert lots[0] == SPEC.volume_max
+    assert lots[1] == SPEC.volume_min  # El mínimo del broker puede superar el riesgo objetivo
+
+
+def test_zero_point_value_or_distance_sizes_zero():
+    rm = RiskManager(risk_percent=1.0)
+    broken = SPEC._replace(tick_size=0.0)
+    assert broken.point_value == 0.0
+    lots, risk = rm.get_lot_sizes([18000.0, 18000.0], [17990.0, 17990.0], [10_000.0, 10_000.0], broken)
+    assert lots.tolist() == [0.0, 0.0] and risk.tolist() == [0.0, 0.0]
+    lots, _ = rm.get_lot_sizes([18000.0], [18000.0], [10_000.0], SPEC)
+    assert lots[0] == 0.0
+
+
+def test_scalar_balance_broadcasts():
+    rm = RiskManager(risk_percent=1.0)
+    lots, _ = rm.get_lot_sizes([18000.0, 18010.0, 18020.0], [17990.0, 18000.0, 18010.0], 10_000.0, SPEC)
+    assert lots.tolist() == [10.0, 10.0, 10.0]
+
+
+@pytest.mark.parametrize("overlap", [False, True])
+def test_compound_equity_matches_sequential_sizing(overlap):
+    pytest.importorskip("pandas_ta")
+    import pandas as pd
+
+    from quant_lab.backtester import DEFAULT_CONTRACT, Backtester
+
+    bt = Backtester.__new__(Backtester)
+    bt.initial_balance = 10_000.0
+    bt.contract_spec = DEFAULT_CONTRACT
+    bt.risk_manager = RiskManager(risk_percent=1.0)
+
+    rng = np.random.default_rng(11)
+    n = 1500
+    r = np.where(rng.random(n) < 0.4, 2.0, -1.0)
+    entries = 18000 + rng.random(n) * 100
+    stops = entries - rng.uniform(5, 50, n)
+    entry_times = pd.date_range("2025-03-01", periods=n, freq="7min", tz="America/New_York")
+    hold = rng.integers(1, 46, n) if overlap else np.full(n, 6)
+    exit_times = entry_times + pd.to_timedelta(hold, unit="min")
+
+    # Referencia trade a trade: cada trade se dimensiona con lo cerrado antes de su entrada
+    realized, pending, expected_lots = bt.initial_balance, [], []
+    for k in range(n):
+        pending.sort(key=lambda item: item[0])
+        while pending and pending[0][0] <= entry_times[k]:
+            realized += pending.pop(0)[1]
+        lots, risk = bt.risk_manager.get_lot_sizes(entries[k : k + 1], stops[k : k + 1], realized, DEFAULT_CONTRACT)
+        expected_lots.append(lots[0])
+        pending.append((exit_times[k], risk[0] * r[k]))
+
+    times = dict(entry_times=[str(t) for t in entry_times], exit_times=[str(t) for t in exit_times])
+    for max_iter in (50, 1):  # 1 = fuerza el tramo secuencial
+        lots, pnl, equity = bt.compound_equity(r, entries, stops, max_iter=max_iter, **times)
+        np.testing.assert_array_equal(lots, expected_lots)
+        assert equity[-1] == pytest.approx(bt.initial_balance + pnl.sum())
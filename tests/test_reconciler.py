@@ -0,0 +1,230 @@
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from execution_engine.reconciler import DEAL_ENTRY_IN, DEAL_ENTRY_OUT, DealReconciler
+from execution_engine.trade_journal import TradeJournal
+
+# Deals de la última hora (dentro del lookback del arranque en frío), fijos para todo el módulo
+T0 = int(time.time()) - 3600
+
+
+class FakeTerminal:
+    """Terminal en memoria: los deals se van revelando como si llegaran en vivo"""
+
+    def __init__(self, deals, expired):
+        self.deals = deals
+        self.expired = set(expired)
+        self.visible = 0
+
+    def reveal(self, n):
+        self.visible = min(len(self.deals), self.visible + n)
+
+    def _seen(self):
+        return self.deals[: self.visible]
+
+    def get_deals(self, from_ts, to_ts=None):
+        # MT5 filtra por segundos: el reconciliador debe tolerar el solape
+        return tuple(d for d in self._seen() if d.time >= int(from_ts))
+
+    def get_open_positions(self, symbol=None):
+        net = {}
+        for d in self._seen():
+            if d.entry == DEAL_ENTRY_IN:
+                net[d.order] = net.get(d.order, 0.0) + d.volume
+            else:
+                net[d.position_id] = net.get(d.position_id, 0.0) - d.volume
+        return [SimpleNamespace(ticket=t, profit=1.0, swap=0.0) for t, v in net.items() if round(v, 8) > 0]
+
+    def get_pending_orders(self, symbol=None):
+        filled = {d.order for d in self._seen() if d.entry == DEAL_ENTRY_IN}
+        return [SimpleNamespace(ticket=t) for t in self.orders if t not in filled and t not in self.expired]
+
+    def get_order_state(self, ticket):
+        return "EXPIRED" if ticket in self.expired else "FILLED"
+
+
+class FakeRisk:
+    def __init__(self):
+        self.realized = []
+        self.unrealized = None
+
+    def on_realized_pnl(self, pnl, ts):
+        self.realized.append(pnl)
+
+    def update_unrealized(self, pnl, ts):
+        self.unrealized = pnl
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingJournal:
+    """Proxy del diario que 'mata el proceso' en la escritura número 'at' (antes o después de aplicarla)"""
+
+    def __init__(self, journal, at, after):
+        self._journal = journal
+        self._writes = 0
+        self.at, self.after = at, after
+
+    def __getattr__(self, name):
+        attr = getattr(self._journal, name)
+        if name not in ("update_trade", "set_meta_many"):
+            return attr
+
+        def write(*args, **kwargs):
+            self._writes += 1
+            if self._writes == self.at and not self.after:
+                raise Crash()
+            result = attr(*args, **kwargs)
+            if self._writes == self.at:
+                raise Crash()
+            return result
+
+        return write
+
+
+def scenario(rng, n_trades=12):
+    """
+    Trades con fills parciales, cierres parciales/totales, órdenes que expiran
+    y deals ajenos, intercalados en el tiempo (varios por segundo).
+    Devuelve (tickets, deals, expirados, estado final esperado).
+    """
+    per_trade, expected, expired = [], {}, []
+    tickets = [5000 + i for i in range(n_trades)]
+    for ticket in tickets:
+        if rng.random() < 0.2:
+            expired.append(ticket)
+            expected[ticket] = {"status": "EXPIRED"}
+            continue
+        events, volume, notional, pnl = [], 0.0, 0.0, 0.0
+        for _ in range(rng.randint(1, 3)):  # Fill total o en partes
+            lots, price = rng.choice((0.1, 0.2, 0.5)), round(rng.uniform(17990, 18010), 2)
+            commission = -round(lots * 3, 2)
+            events.append(
+                dict(order=ticket, position_id=ticket, entry=DEAL_ENTRY_IN, volume=lots, price=price, profit=0.0, commission=commission)
+            )
+            volume += lots
+            notional += lots * price
+            pnl += commission
+        remaining = round(volume, 8)
+        closes = rng.choice((0, 1, 2, 3))  # 0 = sigue abierta; el último cierre es total
+        for k in range(closes):
+            lots = remaining if k == closes - 1 else round(remaining / 2, 8)
+            profit = round(rng.uniform(-200, 200), 2)
+            events.append(
+                dict(
+                    order=ticket + 90000,
+                    position_id=ticket,
+                    entry=DEAL_ENTRY_OUT,
+                    volume=lots,
+                    price=18000.0,
+                    profit=profit,
+                    commission=0.0,
+                )
+            )
+            remaining = round(remaining - lots, 8)
+            pnl += profit
+        per_trade.append(events)
+        expected[ticket] = {
+            "status": "CLOSED" if remaining <= 0 else "OPEN",
+            "volume": volume if closes == 0 else remaining,
+            "price": notional / volume,
+            "pnl": pnl,
+        }
+    # Deals ajenos (otra estrategia / manual): solo avanzan la marca de agua
+    per_trade.append(
+        [dict(order=1, position_id=1, entry=DEAL_ENTRY_IN, volume=1.0, price=1.0, profit=0.0, commission=0.0)]
+    )
+
+    # Intercalar respetando el orden de cada trade; varios deals en el mismo segundo
+    deals, queues, msc = [], [list(ev) for ev in per_trade if ev], T0 * 1000
+    while queues:
+        queue = rng.choice(queues)
+        msc += rng.choice((1, 250, 1000))
+        fields = queue.pop(0)
+        deals.append(
+            SimpleNamespace(ticket=len(deals) + 1, time=msc // 1000, time_msc=msc, swap=0.0, fee=0.0, **fields)
+        )
+        if not queue:
+            queues.remove(queue)
+    return tickets, deals, expired, expected
+
+
+def run(seed, crash_at=None, crash_after=False):
+    rng = random.Random(seed)
+    tickets, deals, expired, expected = scenario(rng)
+    journal = TradeJournal(":memory:")
+    for ticket in tickets:
+        journal.record_trade(
+            {"ticket": ticket, "symbol": "USTEC", "type": "BUY_LIMIT", "price": 18000.0, "status": "PENDING"}
+        )
+    terminal = FakeTerminal(deals, expired)
+    terminal.orders = tickets
+    risk = FakeRisk()
+    store = CrashingJournal(journal, crash_at, crash_after)
+    recon = DealReconciler(terminal, store, risk_manager=risk)
+    while True:
+        terminal.reveal(rng.randint(0, 4))
+        try:
+            recon.poll()
+        except Crash:
+            # Reinicio: nuevo proceso, misma base; la marca de agua sale del diario
+            recon = DealReconciler(terminal, journal, risk_manager=risk)
+            continue
+        if terminal.visible == len(deals):
+            break
+    recon.poll()  # Un poll extra con todo visto no cambia nada
+    return journal, expected, risk, deals, store._writes
+
+
+def final_state(journal):
+    return {
+        t["ticket"]: (t["status"], t["volume"], t["price"], t["pnl"], t["close_time"])
+        for t in journal.get_by_status("PENDING", "OPEN", "CLOSED", "EXPIRED")
+    }
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_partial_fills_and_closes_match_expected(seed):
+    journal, expected, risk, deals, _ = run(seed)
+    for ticket, exp in expected.items():
+        trade = journal.get_trade(ticket)
+        assert trade["status"] == exp["status"], ticket
+        if exp["status"] in ("OPEN", "CLOSED"):
+            assert trade["price"] == pytest.approx(exp["price"])
+            assert trade["pnl"] == pytest.approx(exp["pnl"], abs=0.01)
+        if exp["status"] == "OPEN":
+            assert trade["volume"] == pytest.approx(exp["volume"])
+    # El guard diario recibió cada realizado propio exactamente una vez
+    own = sum(d.profit + d.commission for d in deals if d.position_id != 1)
+    assert sum(risk.realized) == pytest.approx(own)
+    assert journal.get_statistics()["total_trades"] == sum(e["status"] == "CLOSED" for e in expected.values())
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_restart_mid_poll_is_idempotent(seed):
+    reference, _, _, _, writes = run(seed)
+    crash_at = random.Random(seed).randint(1, writes)
+    for after in (False, True):
+        journal, _, _, _, _ = run(seed, crash_at=crash_at, crash_after=after)
+        assert final_state(journal) == final_state(reference)
+        assert journal.get_statistics() == reference.get_statistics()
+        assert journal.get_meta(DealReconciler.HWM_TICKET_KEY) == reference.get_meta(DealReconciler.HWM_TICKET_KEY)
+
+
+def test_cold_start_skips_deals_already_applied():
+    journal, _, _, deals, _ = run(3)
+    before = final_state(journal)
+    terminal = FakeTerminal(deals, [])
+    terminal.orders = []
+    terminal.visible = len(deals)
+    summary = DealReconciler(terminal, journal).poll()
+    assert summary["deals"] == 0
+    assert final_state(journal) == before
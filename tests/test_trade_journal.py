@@ -0,0 +1,124 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from execution_engine.trade_journal import TradeJournal
+
+T0 = datetime(2025, 3, 3, 14, 30)
+
+
+def naive_stats(journal):
+    """Agregados recorriendo todo el historial: la referencia de los incrementales"""
+    rows = journal._conn.execute(
+        "SELECT pnl FROM trades WHERE status = 'CLOSED' ORDER BY close_time, ticket"
+    ).fetchall()
+    keys = ("closed_trades", "wins", "gross_profit", "gross_loss", "total_pnl", "peak_pnl", "max_drawdown")
+    s = dict.fromkeys(keys, 0.0)
+    for (pnl,) in rows:
+        s["closed_trades"] += 1
+        s["total_pnl"] += pnl
+        if pnl > 0:
+            s["wins"] += 1
+            s["gross_profit"] += pnl
+        else:
+            s["gross_loss"] += abs(pnl)
+        s["peak_pnl"] = max(s["peak_pnl"], s["total_pnl"])
+        s["max_drawdown"] = max(s["max_drawdown"], s["peak_pnl"] - s["total_pnl"])
+    return s
+
+
+def assert_stats_match(journal):
+    expected = naive_stats(journal)
+    for key, value in expected.items():
+        assert journal._stats[key] == pytest.approx(value, abs=1e-9), key
+
+
+def trade(ticket, minute, status="OPEN", pnl=0.0, close_minute=None):
+    return {
+        "ticket": ticket,
+        "symbol": "USTEC",
+        "type": "BUY_LIMIT",
+        "price": 18000.0,
+        "volume": 1.0,
+        "time": T0 + timedelta(minutes=minute),
+        "close_time": (T0 + timedelta(minutes=close_minute)).strftime("%Y-%m-%d %H:%M:%S") if close_minute else None,
+        "status": status,
+        "pnl": pnl,
+    }
+
+
+def random_ops(journal, rng, n_ops=40):
+    """Aperturas, cierres, re-cierres, correcciones de PnL, reaperturas y trades que llegan cerrados"""
+    tickets = []
+    for step in range(n_ops):
+        op = rng.random()
+        pnl = round(rng.uniform(-300, 300), 2)
+        if op < 0.25 or not tickets:
+            ticket = 1000 + len(tickets)
+            tickets.append(ticket)
+            journal.record_trade(trade(ticket, step))
+        elif op < 0.5:
+            journal.update_trade(rng.choice(tickets), status="CLOSED", pnl=pnl, close_time=T0 + timedelta(minutes=step))
+        elif op < 0.65:
+            # Re-cierre idéntico (el reconciliador reprocesa un deal): no debe contar dos veces
+            t = journal.get_trade(rng.choice(tickets))
+            if t["status"] == "CLOSED":
+                journal.update_trade(t["ticket"], status="CLOSED", pnl=t["pnl"], close_time=t["close_time"])
+        elif op < 0.8:
+            # Corrección de PnL (comisión / swap que llega después)
+            t = journal.get_trade(rng.choice(tickets))
+            journal.update_trade(t["ticket"], pnl=round(t["pnl"] + rng.uniform(-20, 20), 2))
+        elif op < 0.9:
+            journal.update_trade(rng.choice(tickets), status="OPEN", close_time=None)
+        else:
+            ticket = 1000 + len(tickets)
+            tickets.append(ticket)
+            journal.record_trade(trade(ticket, step, status="CLOSED", pnl=pnl, close_minute=step))
+        assert_stats_match(journal)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_aggregates_match_full_recompute(seed):
+    journal = TradeJournal(":memory:")
+    random_ops(journal, random.Random(seed))
+    journal.close()
+
+
+def test_reclose_is_idempotent():
+    journal = TradeJournal(":memory:")
+    journal.record_trade(trade(1, 0))
+    journal.update_trade(1, status="CLOSED", pnl=120.0, close_time=T0)
+    before = journal.get_statistics()
+    journal.update_trade(1, status="CLOSED", pnl=120.0, close_time=T0)
+    assert journal.get_statistics() == before
+    assert before["total_trades"] == 1 and before["total_pnl"] == 120.0
+
+
+def test_pnl_correction_rebuilds_drawdown_in_close_order():
+    journal = TradeJournal(":memory:")
+    for ticket, pnl in ((1, 100.0), (2, -50.0), (3, 80.0)):
+        journal.record_trade(trade(ticket, ticket))
+        journal.update_trade(ticket, status="CLOSED", pnl=pnl, close_time=T0 + timedelta(minutes=ticket))
+    assert journal.get_statistics()["max_drawdown"] == 50.0
+    journal.update_trade(2, pnl=-150.0)
+    stats = journal.get_statistics()
+    assert stats["max_drawdown"] == 150.0
+    assert stats["total_pnl"] == 30.0
+    assert_stats_match(journal)
+
+
+def test_aggregates_survive_reopen(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = TradeJournal(path)
+    random_ops(journal, random.Random(7), n_ops=80)
+    expected = journal.get_statistics()
+    journal.close()
+
+    reopened = TradeJournal(path)
+    assert reopened.get_statistics() == expected
+    assert_stats_match(reopened)
+    reopened.close()